@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.core import checks
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import db  # noqa: F401
+        from . import ratelimit
+
+        checks.register(ratelimit.check_shared_cache, deploy=True)
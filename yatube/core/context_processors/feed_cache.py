@@ -0,0 +1,8 @@
+from django.conf import settings
+
+
+def feed_cache(request):
+    return {
+        'FEED_CACHE_TTL': settings.FEED_CACHE_TTL,
+        'FEED_CACHE_ALIAS': settings.FEED_CACHE_ALIAS,
+    }
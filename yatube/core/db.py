@@ -0,0 +1,35 @@
+"""Настройка соединений с базой: прагмы SQLite и проверка живости.
+
+Соединение живет CONN_MAX_AGE секунд и переиспользуется запросами
+одного потока, поэтому прагмы выполняются один раз при подключении.
+WAL позволяет читателям не ждать писателя, synchronous=NORMAL в этом
+режиме сбрасывает данные на диск только при контрольной точке.
+"""
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    """Закрывает оборванные постоянные соединения до первого запроса.
+
+    Следующее обращение к базе откроет новое соединение, и запрос
+    не упадет на соединении, которое сервер базы уже закрыл.
+    """
+    if not settings.DATABASE_HEALTH_CHECKS:
+        return
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
@@ -0,0 +1,254 @@
+"""Метрики текущего запроса: SQL, шаблоны, фрагменты кэша, миниатюры.
+
+Метрики живут в threading.local и собираются для каждого запроса
+RequestMetricsMiddleware, а в лог пишутся для его выборки. Вне запроса
+(в фоновых потоках, командах, тестах) все хуки ничего не делают.
+
+Здесь же ловятся N+1 — один и тот же вид запроса больше
+N_PLUS_ONE_THRESHOLD раз за запрос — и медленные запросы дольше
+SLOW_QUERY_MS, которые пишутся в лог core.sql вместе с планом. Эти
+проверки от выборки не зависят.
+"""
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template.base import Template
+
+FRAGMENT_PREFIX = 'template.cache.'
+CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sql_logger = logging.getLogger('core.sql')
+
+_state = threading.local()
+_installed = False
+
+
+class NPlusOneError(Exception):
+    """Запрос повторил один и тот же SQL больше N_PLUS_ONE_THRESHOLD раз."""
+
+
+def query_shape(sql):
+    """Вид запроса без значений: списки IN и числа сворачиваются."""
+    sql = re.sub(r'IN \((?:%s, )*%s\)', 'IN (...)', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    return ' '.join(sql.split())
+
+
+def call_site():
+    """Место в шаблоне и в коде проекта, откуда пришел запрос."""
+    site = {'template': None, 'code': None}
+    frame = sys._getframe(1)
+    while frame is not None and not all(site.values()):
+        code = frame.f_code
+        node = frame.f_locals.get('self')
+        if (site['template'] is None and code.co_name == 'render_annotated'
+                and getattr(node, 'origin', None) is not None):
+            site['template'] = (
+                f'{node.origin.template_name or node.origin.name}:'
+                f'{node.token.lineno}')
+        filename = os.path.abspath(code.co_filename)
+        if (site['code'] is None
+                and filename.startswith(str(settings.BASE_DIR))
+                and not filename.startswith(CORE_DIR)):
+            site['code'] = (
+                f'{os.path.relpath(filename, settings.BASE_DIR)}:'
+                f'{frame.f_lineno} in {code.co_name}')
+        frame = frame.f_back
+    return site
+
+
+def explain(connection, sql, params):
+    if not connection.features.supports_explaining_query_execution:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{connection.ops.explain_query_prefix()} {sql}', params)
+        return [' '.join(map(str, row)) for row in cursor.fetchall()]
+
+
+class RequestMetrics:
+    def __init__(self, path=''):
+        self.path = path
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+        # Имя -> [число вызовов, суммарное время]
+        self.timers = {}
+        # Вид запроса -> число повторов; для N+1 еще и место вызова
+        self.shapes = {}
+        self.repeated = {}
+        self.explaining = False
+
+    def add(self, name, duration):
+        timer = self.timers.setdefault(name, [0, 0.0])
+        timer[0] += 1
+        timer[1] += duration
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.sql_time += elapsed
+            self.inspect(sql, params, many, context['connection'], elapsed)
+
+    def inspect(self, sql, params, many, connection, elapsed):
+        shape = query_shape(sql)
+        count = self.shapes.get(shape, 0) + 1
+        self.shapes[shape] = count
+        if count == settings.N_PLUS_ONE_THRESHOLD + 1:
+            # Стек разбираем один раз, когда вид запроса стал подозрительным
+            self.repeated[shape] = call_site()
+        if (elapsed * 1000 >= settings.SLOW_QUERY_MS and not many
+                and sql.lstrip().upper().startswith('SELECT')):
+            self.log_slow_query(sql, params, connection, elapsed)
+
+    def log_slow_query(self, sql, params, connection, elapsed):
+        self.explaining = True
+        try:
+            plan = explain(connection, sql, params)
+        except Exception:
+            plan = None
+        finally:
+            self.explaining = False
+        sql_logger.warning(json.dumps({
+            'path': self.path,
+            'ms': round(elapsed * 1000, 3),
+            'sql': sql,
+            'params': [str(param) for param in params or ()],
+            'plan': plan,
+            'site': call_site(),
+        }, ensure_ascii=False))
+
+    def n_plus_one(self):
+        return [
+            dict(site, sql=shape, count=self.shapes[shape])
+            for shape, site in self.repeated.items()
+        ]
+
+    def as_dict(self):
+        data = {
+            'db_queries': self.queries,
+            'db_ms': round(self.sql_time * 1000, 3),
+            'template_ms': round(self.template_time * 1000, 3),
+            'fragment_hits': self.fragment_hits,
+            'fragment_misses': self.fragment_misses,
+        }
+        for name, (count, duration) in self.timers.items():
+            data[f'{name}_count'] = count
+            data[f'{name}_ms'] = round(duration * 1000, 3)
+        if self.repeated:
+            data['n_plus_one'] = self.n_plus_one()
+        return data
+
+    def server_timing(self, total):
+        """Значение заголовка Server-Timing, длительности в миллисекундах."""
+        entries = [
+            f'db;dur={self.sql_time * 1000:.2f};desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.2f}',
+            f'cache;desc="fragments hit={self.fragment_hits} '
+            f'miss={self.fragment_misses}"',
+        ]
+        entries += [
+            f'{name};dur={duration * 1000:.2f};desc="{count} calls"'
+            for name, (count, duration) in self.timers.items()
+        ]
+        if self.repeated:
+            entries.append(f'nplusone;desc="{len(self.repeated)} shapes"')
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+def current():
+    return getattr(_state, 'metrics', None)
+
+
+@contextmanager
+def collect(path=''):
+    metrics = RequestMetrics(path)
+    _state.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _state.metrics = None
+
+
+@contextmanager
+def timed(name):
+    """Добавляет длительность блока к метрике name текущего запроса."""
+    metrics = current()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - started)
+
+
+@contextmanager
+def count_fragments(cache, metrics):
+    """Считает попадания и промахи {% cache %} в кэше этого потока.
+
+    caches[alias] отдает каждому потоку свой экземпляр, поэтому методы
+    можно подменить на время запроса без блокировок.
+    """
+    original_get = cache.get
+
+    def get(key, *args, **kwargs):
+        value = original_get(key, *args, **kwargs)
+        if isinstance(key, str) and key.startswith(FRAGMENT_PREFIX):
+            if value is None:
+                metrics.fragment_misses += 1
+            else:
+                metrics.fragment_hits += 1
+        return value
+
+    cache.get = get
+    try:
+        yield
+    finally:
+        del cache.get
+
+
+def install():
+    """Оборачивает Template.render, чтобы мерить время шаблонов.
+
+    Время считается только у внешних шаблонов: include и extends
+    рендерятся внутри них и не учитываются дважды.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    original_render = Template.render
+
+    def render(self, context):
+        metrics = current()
+        if metrics is None:
+            return original_render(self, context)
+        metrics.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            metrics.template_depth -= 1
+            if not metrics.template_depth:
+                metrics.template_time += time.perf_counter() - started
+
+    Template.render = render
@@ -0,0 +1,61 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger('core.metrics')
+
+
+class RequestMetricsMiddleware:
+    """Метрики по запросу: SQL, шаблоны, фрагменты кэша, миниатюры.
+
+    SQL проверяется в каждом запросе: медленные запросы пишутся в лог
+    core.sql, а запрос с N+1 пишется в core.metrics с уровнем WARNING и
+    при N_PLUS_ONE_RAISE падает с ошибкой. Полные метрики — строкой JSON
+    в core.metrics и, если включено, в заголовке Server-Timing — пишутся
+    для доли запросов REQUEST_METRICS_SAMPLE_RATE.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        metrics.install()
+
+    def __call__(self, request):
+        sampled = random.random() < settings.REQUEST_METRICS_SAMPLE_RATE
+        with ExitStack() as stack:
+            collected = stack.enter_context(metrics.collect(request.path))
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(collected.sql_wrapper))
+            if sampled:
+                stack.enter_context(metrics.count_fragments(
+                    caches[settings.FEED_CACHE_ALIAS], collected))
+            started = time.perf_counter()
+            response = self.get_response(request)
+            total = time.perf_counter() - started
+        if not sampled and not collected.repeated:
+            return response
+        if sampled and settings.REQUEST_METRICS_SERVER_TIMING:
+            response['Server-Timing'] = collected.server_timing(total)
+        match = request.resolver_match
+        data = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 3),
+        }
+        data.update(collected.as_dict())
+        level = logging.WARNING if collected.repeated else logging.INFO
+        logger.log(level, json.dumps(data, ensure_ascii=False))
+        if collected.repeated and settings.N_PLUS_ONE_RAISE:
+            raise metrics.NPlusOneError(json.dumps(
+                collected.n_plus_one(), ensure_ascii=False, indent=2))
+        return response
@@ -0,0 +1,13 @@
+"""Плагин pytest: тест падает, если страница, которую он открыл, делает N+1.
+
+Подключается импортом фикстуры в conftest.py. Каждый запрос тестового
+клиента проходит через RequestMetricsMiddleware, а N+1 превращается в
+NPlusOneError, который клиент пробрасывает в тест.
+"""
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def n_plus_one_guard(settings):
+    settings.REQUEST_METRICS_SAMPLE_RATE = 1.0
+    settings.N_PLUS_ONE_RAISE = True
@@ -0,0 +1,132 @@
+"""Ограничение частоты записи: корзина токенов в кэше.
+
+У каждого пользователя и у каждого IP своя корзина на представление.
+За обратным прокси REMOTE_ADDR у всех один, поэтому для адресов из
+RATE_LIMIT_TRUSTED_PROXIES IP клиента берется из X-Forwarded-For.
+Корзина вмещает limit токенов и полностью наполняется за period секунд;
+запрос тратит один токен из обеих корзин. Состояние хранится в кэше
+RATE_LIMIT_CACHE_ALIAS, так что при memcached или redis оно общее для
+всех процессов, а база данных не участвует вовсе. В locmem у каждого
+воркера свои корзины и лимит умножается на их число: об этом
+предупреждает manage.py check --deploy (core.W001).
+
+Чтение и запись состояния не атомарны: при одновременных запросах
+одного пользователя в разных процессах может пройти на несколько
+запросов больше лимита. Для защиты от флуда этого достаточно.
+"""
+import math
+import time
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.http import HttpResponse
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def shared_cache_error():
+    """Текст предупреждения, если корзины лежат в памяти одного процесса."""
+    alias = settings.RATE_LIMIT_CACHE_ALIAS
+    if (not settings.RATE_LIMITS
+            or settings.CACHES[alias]['BACKEND'] not in LOCAL_BACKENDS):
+        return None
+    return (f'Кэш RATE_LIMIT_CACHE_ALIAS ({alias}) хранится в памяти '
+            'процесса: у каждого воркера свои корзины. Нужен общий кэш, '
+            'например CACHE_BACKEND=file, memcached или redis.')
+
+
+def check_shared_cache(app_configs=None, **kwargs):
+    error = shared_cache_error()
+    return [checks.Warning(error, id='core.W001')] if error else []
+
+
+def client_ip(request):
+    """IP клиента с учетом доверенных прокси.
+
+    X-Forwarded-For читается справа налево, пока адреса принадлежат
+    доверенным прокси: все, что левее первого чужого адреса, клиент мог
+    написать сам.
+    """
+    trusted = settings.RATE_LIMIT_TRUSTED_PROXIES
+    address = request.META.get('REMOTE_ADDR', '')
+    if address not in trusted:
+        return address
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    for hop in reversed(forwarded.split(',')):
+        hop = hop.strip()
+        if not hop:
+            continue
+        address = hop
+        if hop not in trusted:
+            break
+    return address
+
+
+def bucket_keys(request, name):
+    keys = [f'ratelimit:{name}:ip:{client_ip(request)}']
+    if request.user.is_authenticated:
+        keys.append(f'ratelimit:{name}:user:{request.user.pk}')
+    return keys
+
+
+def take(state, capacity, rate, now):
+    """Новое состояние корзины и сколько ждать, если токена нет."""
+    tokens, updated = state or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) / rate
+
+
+def check(request, name, limit, period):
+    """Тратит токен из корзин запроса; возвращает 0 или секунды ожидания."""
+    cache = caches[settings.RATE_LIMIT_CACHE_ALIAS]
+    keys = bucket_keys(request, name)
+    states = cache.get_many(keys)
+    now = time.time()
+    updated, wait = {}, 0
+    for key in keys:
+        # Через один IP ходит много людей, поэтому его корзина больше
+        capacity = limit * (
+            settings.RATE_LIMIT_IP_MULTIPLIER if ':ip:' in key else 1)
+        updated[key], key_wait = take(
+            states.get(key), capacity, capacity / period, now)
+        wait = max(wait, key_wait)
+    if wait:
+        return wait
+    cache.set_many(updated, timeout=math.ceil(period))
+    return 0
+
+
+def too_many_requests():
+    return HttpResponse(
+        'Слишком много запросов, попробуйте позже.',
+        status=HTTPStatus.TOO_MANY_REQUESTS,
+        content_type='text/plain; charset=utf-8')
+
+
+def rate_limit(name, methods=WRITE_METHODS, response=too_many_requests):
+    """Отвечает 429 с Retry-After, если запись идет чаще RATE_LIMITS[name].
+
+    Лимит задается парой (число запросов, период в секундах). Считаются
+    только запросы с методами из methods: показ формы токен не тратит.
+    Представления без записи в RATE_LIMITS не ограничиваются. Ответ 429
+    строит response: API отвечает JSON, а не текстом.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method in methods
+                    and name in settings.RATE_LIMITS):
+                wait = check(request, name, *settings.RATE_LIMITS[name])
+                if wait:
+                    limited = response()
+                    limited['Retry-After'] = str(math.ceil(wait))
+                    return limited
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
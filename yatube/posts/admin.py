@@ -1,7 +1,29 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.db import connection
+from django.db.models.expressions import RawSQL
 
+from . import search
 from .models import Group, Post, Comment, Follow
 
+# Сколько лучших совпадений поиска показывать в админке: id уходят
+# в IN (...), а SQLite принимает не больше 999 параметров
+SEARCH_LIMIT = 500
+
+
+def search_rank(post_ids):
+    """Место поста в выдаче поиска как выражение CASE.
+
+    id — числа из индекса, поэтому пишутся в SQL как есть, без параметров.
+    """
+    column = '{}.{}'.format(
+        connection.ops.quote_name(Post._meta.db_table),
+        connection.ops.quote_name('id'))
+    cases = ' '.join(
+        f'WHEN {int(pk)} THEN {position}'
+        for position, pk in enumerate(post_ids))
+    return RawSQL(f'CASE {column} {cases} END', [])
+
 
 class PostAdmin(admin.ModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
@@ -10,6 +32,22 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Ищем по полнотекстовому индексу, а не LIKE по search_fields
+        if not search_term:
+            return queryset, False
+        post_ids = search.search_ids(search_term, limit=SEARCH_LIMIT)
+        if not post_ids:
+            return queryset.none(), False
+        return queryset.filter(id__in=post_ids).annotate(
+            search_rank=search_rank(post_ids)), False
+
+    def get_ordering(self, request):
+        # Выдача поиска идет в порядке BM25, а не по дате
+        if request.GET.get(SEARCH_VAR):
+            return ['search_rank']
+        return super().get_ordering(request)
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
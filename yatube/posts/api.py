@@ -0,0 +1,215 @@
+"""JSON API: те же ленты, что и в HTML-страницах, и пакетная подписка.
+
+Посты выбираются через .values(), поэтому не собираются объекты моделей
+и не работает шаблонизатор. Страницы всегда курсорные: ?after=, ?before=.
+"""
+import json
+from functools import partial
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.views.decorators.http import require_POST
+
+from core.ratelimit import rate_limit
+from yatube.replicas import primary_write, replica_read
+from yatube.settings import NUMBER_Of_POSTS
+
+from . import conditional, counters, feed, follows, groups
+from .models import Comment, Post, User
+from .utils import CursorPaginator, decode_cursor, get_comments_page
+
+COMMENT_FIELDS = ('id', 'text', 'created', 'author__username')
+
+
+def dumps(data):
+    """Компактный JSON; даты — в формате DjangoJSONEncoder."""
+    return json.dumps(
+        data, cls=DjangoJSONEncoder, ensure_ascii=False,
+        separators=(',', ':')).encode()
+
+
+def json_response(data, status=HTTPStatus.OK):
+    return HttpResponse(
+        dumps(data), status=status, content_type='application/json')
+
+
+def serialize_post(row):
+    group = None
+    if row['group__slug']:
+        group = {'slug': row['group__slug'], 'title': row['group__title']}
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'],
+        'author': row['author__username'],
+        'group': group,
+        'image': default_storage.url(row['image']) if row['image'] else None,
+    }
+
+
+def page_data(queryset, request, count=None):
+    paginator = CursorPaginator(queryset.api(), NUMBER_Of_POSTS, count=count)
+    page_obj = paginator.cursor_page(
+        after=decode_cursor(request.GET.get('after')),
+        before=decode_cursor(request.GET.get('before')),
+    )
+    return {
+        'count': paginator.count,
+        'next': page_obj.next_cursor,
+        'previous': page_obj.previous_cursor,
+        'results': [serialize_post(row) for row in page_obj],
+    }
+
+
+def serialize_comment(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'created': row['created'],
+        'author': row['author__username'],
+    }
+
+
+def comments_data(post_id, request):
+    page_obj = get_comments_page(
+        Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS),
+        request.GET.get('after'))
+    return {
+        'next': page_obj.next_cursor,
+        'results': [serialize_comment(row) for row in page_obj],
+    }
+
+
+def not_found(message):
+    return json_response({'detail': message}, HTTPStatus.NOT_FOUND)
+
+
+def too_many_requests():
+    return json_response(
+        {'detail': 'Слишком много запросов, попробуйте позже.'},
+        HTTPStatus.TOO_MANY_REQUESTS)
+
+
+def unauthorized():
+    return json_response(
+        {'detail': 'Нужна авторизация.'}, HTTPStatus.UNAUTHORIZED)
+
+
+def requested_usernames(request):
+    """Имена из JSON {"usernames": [...]} или полей формы usernames."""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return None
+        usernames = data.get('usernames') if isinstance(data, dict) else None
+    else:
+        usernames = request.POST.getlist('usernames')
+    if not isinstance(usernames, list) or not all(
+            isinstance(username, str) for username in usernames):
+        return None
+    return usernames
+
+
+def change_follows(request, change):
+    if not request.user.is_authenticated:
+        return unauthorized()
+    usernames = requested_usernames(request)
+    if not usernames:
+        return json_response(
+            {'detail': 'Нужен непустой список usernames.'},
+            HTTPStatus.BAD_REQUEST)
+    if len(set(usernames)) > settings.FOLLOW_BATCH_LIMIT:
+        return json_response(
+            {'detail': f'Не больше {settings.FOLLOW_BATCH_LIMIT} '
+                       f'авторов за запрос.'},
+            HTTPStatus.BAD_REQUEST)
+    return json_response(change(request.user, usernames))
+
+
+@replica_read
+@conditional.conditional_feed(conditional.index_scopes)
+def index(request):
+    return json_response(page_data(
+        Post.objects.all(), request, count=counters.total_posts))
+
+
+@replica_read
+@conditional.conditional_feed(conditional.group_scopes)
+def group_posts(request, slug):
+    group = groups.get_by_slug(slug)
+    if group is None:
+        return not_found('Группа не найдена.')
+    data = page_data(
+        Post.objects.filter(group_id=group.id), request,
+        count=partial(counters.group_posts, group.id))
+    data['group'] = {
+        'slug': group.slug,
+        'title': group.title,
+        'description': group.description,
+    }
+    return json_response(data)
+
+
+@replica_read
+@conditional.conditional_feed(conditional.profile_scopes)
+def profile(request, username):
+    author = User.objects.filter(username=username).values(
+        'id', 'username', 'first_name', 'last_name').first()
+    if author is None:
+        return not_found('Автор не найден.')
+    data = page_data(
+        Post.objects.filter(author_id=author['id']), request,
+        count=partial(counters.author_posts, author['id']))
+    author.pop('id')
+    data['author'] = author
+    return json_response(data)
+
+
+@replica_read
+@conditional.conditional_feed(conditional.post_scopes)
+def post_detail(request, post_id):
+    row = Post.objects.filter(id=post_id).api('author_id').first()
+    if row is None:
+        return not_found('Пост не найден.')
+    data = serialize_post(row)
+    data['author_posts'] = counters.author_posts(row['author_id'])
+    data['comments_count'] = counters.post_comments(post_id)
+    comments = comments_data(post_id, request)
+    data['comments'] = comments['results']
+    data['comments_next'] = comments['next']
+    return json_response(data)
+
+
+@replica_read
+@conditional.conditional_feed(conditional.post_scopes)
+def post_comments(request, post_id):
+    if not Post.objects.filter(id=post_id).exists():
+        return not_found('Пост не найден.')
+    return json_response(comments_data(post_id, request))
+
+
+@replica_read
+def follow_index(request):
+    if not request.user.is_authenticated:
+        return unauthorized()
+    return json_response(page_data(
+        feed.followed_posts(request.user), request,
+        count=partial(counters.followed_posts, request.user)))
+
+
+@primary_write
+@require_POST
+@rate_limit('api_follow_many', response=too_many_requests)
+def follow_many(request):
+    return change_follows(request, follows.follow_many)
+
+
+@primary_write
+@require_POST
+@rate_limit('api_unfollow_many', response=too_many_requests)
+def unfollow_many(request):
+    return change_follows(request, follows.unfollow_many)
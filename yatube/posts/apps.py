@@ -1,5 +1,12 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        if settings.COMMENT_QUEUE_ENABLED:
+            from . import comment_queue
+            comment_queue.start()
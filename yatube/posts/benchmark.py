@@ -0,0 +1,251 @@
+"""Нагрузочный прогон всех страниц posts, users и about.
+
+Данные генерируются mixer и Faker в отдельной тестовой базе, страницы
+запрашиваются тестовым клиентом. Для каждого маршрута считаются
+перцентили задержки, число SQL-запросов и размер ответа.
+
+Прогон идет внутри isolated(): каждый алиас CACHES подменяется своим
+locmem-кэшем, а чтение из реплик отключается, поэтому засев и --cold
+не трогают общие memcached, redis или файловый кэш.
+"""
+import math
+import platform
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from importlib import import_module
+from statistics import mean
+
+import django
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from mixer.backend.django import Mixer
+
+from . import signals, transfer
+from .models import Comment, Follow, Group, Post, User
+
+URL_MODULES = ('posts.urls', 'users.urls', 'about.urls')
+PERCENTILES = (50, 90, 95, 99)
+# Страницы, которые разлогинивают клиента: после них входим заново
+LOGOUT_ROUTES = {'users:logout'}
+LOCMEM_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def isolated_caches():
+    """Свой locmem-кэш на место каждого алиаса settings.CACHES."""
+    return {
+        alias: {
+            'BACKEND': LOCMEM_BACKEND,
+            'LOCATION': f'benchmark-{alias}',
+            'TIMEOUT': config.get('TIMEOUT', 300),
+        }
+        for alias, config in settings.CACHES.items()
+    }
+
+
+@contextmanager
+def isolated():
+    """Кэши процесса вместо настроенных и чтение только из основной базы.
+
+    Основная база подменяется тестовой снаружи, см. команду benchmark.
+    """
+    with override_settings(CACHES=isolated_caches(), DATABASE_REPLICAS=[]):
+        yield
+
+
+def seed(users=50, groups=5, posts=1000, comments=2000, follows=200,
+         random_seed=0, batch_size=transfer.BATCH_SIZE):
+    """Заполняет базу синтетическими данными одним bulk_create на модель.
+
+    Сигналы отключены, счетчики, ленты и поиск пересобираются в конце.
+    """
+    rng = random.Random(random_seed)
+    mixer = Mixer(commit=False, locale='ru_RU')
+    mixer.faker.seed_instance(random_seed)
+    now = timezone.now()
+
+    def moment():
+        return now - timedelta(seconds=rng.randrange(365 * 24 * 3600))
+
+    with transaction.atomic(), signals.muted():
+        User.objects.bulk_create(
+            (mixer.blend(
+                User, username=f'user{number}', password='!')
+             for number in range(users)),
+            batch_size=batch_size)
+        user_ids = list(User.objects.values_list('id', flat=True))
+        Group.objects.bulk_create(
+            (mixer.blend(Group, slug=f'group-{number}')
+             for number in range(groups)),
+            batch_size=batch_size)
+        group_ids = list(Group.objects.values_list('id', flat=True)) + [None]
+        with transfer.keep_timestamps(Post):
+            Post.objects.bulk_create(
+                (Post(
+                    author_id=rng.choice(user_ids),
+                    group_id=rng.choice(group_ids),
+                    text=mixer.faker.text(),
+                    pub_date=moment())
+                 for _ in range(posts)),
+                batch_size=batch_size)
+        post_ids = list(Post.objects.values_list('id', flat=True))
+        with transfer.keep_timestamps(Comment):
+            Comment.objects.bulk_create(
+                (Comment(
+                    post_id=rng.choice(post_ids),
+                    author_id=rng.choice(user_ids),
+                    text=mixer.faker.sentence(),
+                    created=moment())
+                 for _ in range(comments if post_ids else 0)),
+                batch_size=batch_size)
+        pairs = {
+            tuple(rng.sample(user_ids, 2))
+            for _ in range(follows if len(user_ids) > 1 else 0)
+        }
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs),
+            batch_size=batch_size)
+    transfer.rebuild_derived()
+    return {
+        'users': users,
+        'groups': groups,
+        'posts': posts,
+        'comments': comments,
+        'follows': len(pairs),
+    }
+
+
+def sample_kwargs():
+    """Значения параметров маршрутов из засеянных данных."""
+    post = Post.objects.select_related('author', 'group').filter(
+        group__isnull=False).first() or Post.objects.first()
+    user = post.author if post else User.objects.first()
+    kwargs = {
+        'username': user.username,
+        'uidb64': urlsafe_base64_encode(force_bytes(user.pk)),
+        'token': default_token_generator.make_token(user),
+    }
+    if post is not None:
+        kwargs['post_id'] = post.id
+    if post is not None and post.group is not None:
+        kwargs['slug'] = post.group.slug
+    return user, kwargs
+
+
+def iter_routes(kwargs):
+    """(имя, url) для каждого маршрута из URL_MODULES."""
+    for module_name in URL_MODULES:
+        module = import_module(module_name)
+        for pattern in module.urlpatterns:
+            name = f'{module.app_name}:{pattern.name}'
+            params = pattern.pattern.converters.keys()
+            if not set(params) <= set(kwargs):
+                continue
+            yield name, reverse(
+                name, kwargs={param: kwargs[param] for param in params})
+
+
+def percentile(values, rank):
+    """Перцентиль с линейной интерполяцией по отсортированным values."""
+    position = (len(values) - 1) * rank / 100
+    low, high = math.floor(position), math.ceil(position)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def response_size(response):
+    if response.streaming:
+        return sum(len(chunk) for chunk in response.streaming_content)
+    return len(response.content)
+
+
+def measure(client, url, iterations, warmup=1, cold=False, after=None):
+    timings, queries, sizes, statuses = [], [], [], set()
+    for number in range(warmup + iterations):
+        if cold:
+            for alias in settings.CACHES:
+                caches[alias].clear()
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            response = client.get(url)
+            size = response_size(response)
+            elapsed = time.perf_counter() - started
+        if after is not None:
+            after()
+        if number < warmup:
+            continue
+        timings.append(elapsed * 1000)
+        queries.append(len(context.captured_queries))
+        sizes.append(size)
+        statuses.add(response.status_code)
+    timings.sort()
+    result = {f'p{rank}_ms': percentile(timings, rank) for rank in PERCENTILES}
+    result.update({
+        'mean_ms': mean(timings),
+        'max_ms': timings[-1],
+        'queries': mean(queries),
+        'max_queries': max(queries),
+        'bytes': mean(sizes),
+        'statuses': sorted(statuses),
+    })
+    return result
+
+
+def run(iterations=20, warmup=1, cold=False):
+    """Прогоняет все маршруты анонимно и от имени автора."""
+    user, kwargs = sample_kwargs()
+    anonymous = Client()
+    authorized = Client()
+    authorized.force_login(user)
+    results = []
+    for name, url in iter_routes(kwargs):
+        for client_name, client in (
+                ('anonymous', anonymous), ('authorized', authorized)):
+            after = None
+            if client is authorized and name in LOGOUT_ROUTES:
+                def after():
+                    authorized.force_login(user)
+            result = measure(client, url, iterations, warmup, cold, after)
+            result.update({'route': name, 'url': url, 'client': client_name})
+            results.append(result)
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'cache_backends': sorted(
+            {config['BACKEND'] for config in settings.CACHES.values()}),
+    }
+
+
+def compare(old, new):
+    """Строки сравнения p50 и p95 двух прогонов по общим маршрутам."""
+    previous = {
+        (item['route'], item['client']): item for item in old['results']}
+    lines = []
+    for item in new['results']:
+        before = previous.get((item['route'], item['client']))
+        if before is None:
+            continue
+        deltas = []
+        for key in ('p50_ms', 'p95_ms'):
+            change = (
+                (item[key] - before[key]) / before[key] * 100
+                if before[key] else 0.0)
+            deltas.append(f'{key} {before[key]:.2f} -> {item[key]:.2f} '
+                          f'({change:+.1f}%)')
+        lines.append(
+            f'{item["route"]} [{item["client"]}]: ' + ', '.join(deltas))
+    return lines
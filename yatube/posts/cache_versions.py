@@ -0,0 +1,115 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from yatube import replicas
+
+INDEX = 'index'
+# Индекс поиска в памяти процессов, см. posts/search.py
+SEARCH = 'search'
+# Неявно входит в каждый набор scopes: reset() сбрасывает все ленты разом
+ALL = 'all'
+
+
+def group_scope(group_id):
+    return f'group:{group_id}'
+
+
+def author_scope(author_id):
+    return f'author:{author_id}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def comments_scope(post_id):
+    return f'comments:{post_id}'
+
+
+def follows_scope(user_id):
+    return f'follows:{user_id}'
+
+
+def _key(scope):
+    return f'posts:version:{scope}'
+
+
+def _changed_key(scope):
+    return f'posts:changed:{scope}'
+
+
+def _bumped_key(scope):
+    # Живет REPLICA_PIN_SECONDS после правки: пока он есть, реплика
+    # может ее еще не получить
+    return f'posts:bumped:{scope}'
+
+
+def _cache():
+    return caches[settings.FEED_CACHE_ALIAS]
+
+
+def _initial():
+    # Версия с отметкой времени не совпадет с версией, вытесненной из кэша
+    return int(time.time() * 1000)
+
+
+def get_version(*scopes):
+    """Версия содержимого лент: меняется при любой правке в scopes.
+
+    Если правка была меньше REPLICA_PIN_SECONDS назад, реплика могла ее
+    еще не получить, и чтение до конца запроса идет в основную базу.
+    """
+    cache = _cache()
+    scopes = (ALL, *scopes)
+    keys = [_key(scope) for scope in scopes]
+    bumped_keys = (
+        [_bumped_key(scope) for scope in scopes]
+        if settings.DATABASE_REPLICAS else [])
+    versions = cache.get_many(keys + bumped_keys)
+    if any(key in versions for key in bumped_keys):
+        replicas.read_primary()
+    for scope, key in zip(scopes, keys):
+        if key not in versions:
+            if cache.add(key, _initial(), None):
+                cache.set(_changed_key(scope), timezone.now(), None)
+            versions[key] = cache.get(key)
+    return '.'.join(str(versions[key]) for key in keys)
+
+
+def last_modified(*scopes):
+    """Время последней правки в scopes или None, если оно неизвестно."""
+    keys = [_changed_key(scope) for scope in (ALL, *scopes)]
+    changed = _cache().get_many(keys)
+    if len(changed) < len(keys):
+        return None
+    return max(changed.values())
+
+
+def bump(*scopes):
+    """Меняет версии scopes и возвращает новые: {scope: версия}."""
+    cache = _cache()
+    now = timezone.now()
+    versions = {}
+    for scope in scopes:
+        try:
+            versions[scope] = cache.incr(_key(scope))
+        except ValueError:
+            versions[scope] = _initial()
+            cache.set(_key(scope), versions[scope], None)
+        cache.set(_changed_key(scope), now, None)
+        if settings.DATABASE_REPLICAS:
+            cache.set(_bumped_key(scope), True,
+                      settings.REPLICA_PIN_SECONDS)
+    return versions
+
+
+def reset():
+    """Сбрасывает все версии лент разом.
+
+    Без clear(): на общем сервере он стер бы и чужие ключи. Старые
+    фрагменты просто больше не читаются и уходят по TTL.
+    """
+    bump(ALL)
@@ -0,0 +1,357 @@
+"""Отложенная запись комментариев пачками.
+
+При COMMENT_QUEUE_ENABLED add_comment не пишет в базу сам: проверенный
+комментарий дописывается строкой JSON в файл-спул процесса и встает в
+очередь в памяти. Очередь уходит в базу одним bulk_create, когда в ней
+набралось COMMENT_QUEUE_BATCH_SIZE комментариев или прошло
+COMMENT_QUEUE_FLUSH_MS миллисекунд с первого из них: на SQLite это один
+коммит и одна блокировка записи на пачку, а не на каждый комментарий.
+
+Спул переживает падение процесса. Перед записью он переименовывается в
+файл пачки, а удаляется только после коммита. Живой процесс держит
+flock на своем файле-замке, поэтому файлы упавших процессов легко
+отличить; они дописываются в базу при старте нового процесса и
+командой replay_comments. Уже записанные комментарии
+узнаются по queue_id.
+
+Пока комментарий в очереди, автор видит его из своей сессии, см. overlay.
+"""
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, DateTimeField, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache_versions, counters, recommendations, search
+from .models import Comment, Post, User
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = 'queued_comments'
+# Сколько ждать появления комментария в базе, прежде чем забыть о нем
+OVERLAY_TTL = timedelta(minutes=10)
+OVERLAY_LIMIT = 20
+
+_lock = threading.Lock()
+_pending = []
+_in_flight = set()
+_timer = None
+_batches = 0
+# (pid, каталог спула, метка, файл-замок) текущего процесса
+_owner = None
+
+
+def _path(name):
+    return os.path.join(settings.COMMENT_QUEUE_SPOOL_DIR, name)
+
+
+def _token():
+    """Метка этого процесса в именах его файлов спула.
+
+    Пока процесс жив, он держит flock на файле <метка>.lock, и replay
+    по замку отличает живых владельцев от упавших. pid для этого не
+    годится: после перезапуска контейнера он достается другому процессу.
+    После fork метка и замок заводятся заново. Вызывается под _lock.
+    """
+    global _owner
+    directory = settings.COMMENT_QUEUE_SPOOL_DIR
+    if _owner is None or _owner[:2] != (os.getpid(), directory):
+        token = uuid.uuid4().hex
+        os.makedirs(directory, exist_ok=True)
+        handle = open(_path(f'{token}.lock'), 'w')
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        _owner = (os.getpid(), directory, token, handle)
+    return _owner[2]
+
+
+def _spool_name():
+    return f'spool-{_token()}.jsonl'
+
+
+def _file_owner(name):
+    """Метка процесса, чей это спул или пачка; None для прочих файлов."""
+    parts = name[:-len('.jsonl')].split('-')
+    if (not name.endswith('.jsonl') or len(parts) < 2
+            or parts[0] not in ('spool', 'batch')):
+        return None
+    return parts[1]
+
+
+def _lock_dead(token):
+    """Замок упавшего владельца; None, если владелец еще жив."""
+    handle = open(_path(f'{token}.lock'), 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        return None
+    return handle
+
+
+def _claim(name):
+    """Переименовывает файл в пачку этого процесса; None, если опередили.
+
+    Вызывается под _lock.
+    """
+    global _batches
+    _batches += 1
+    path = _path(f'batch-{_token()}-{_batches}.jsonl')
+    try:
+        os.replace(_path(name), path)
+    except FileNotFoundError:
+        return None
+    _in_flight.add(path)
+    return path
+
+
+def _read(path):
+    items = []
+    with open(path, encoding='utf-8') as spool:
+        for line in spool:
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                # Недописанная строка: процесс упал посреди записи
+                logger.warning('Пропущена битая строка спула %s', path)
+    return items
+
+
+def _comments_added(items):
+    """То же, что comment_saved в signals, но по разу на пост пачки."""
+    post_ids = [item['post_id'] for item in items]
+    for post_id, count in Counter(post_ids).items():
+        counters.incr(counters.post_comments_key(post_id), count)
+    # bulk_create на SQLite не возвращает id, их нужно дочитать
+    search.index_comments(Comment.objects.filter(
+        queue_id__in=[item['id'] for item in items]).values_list(
+        'id', 'post_id', 'text'))
+    recommendations.comments_changed(*{
+        (item['author_id'], item['post_id']) for item in items})
+    cache_versions.bump(*{
+        cache_versions.comments_scope(post_id) for post_id in post_ids})
+
+
+def save(items, keep_dates=False):
+    """Записывает комментарии одной транзакцией; возвращает число новых.
+
+    Комментарии к удаленным постам и от удаленных авторов отбрасываются.
+    Дата комментария — время записи; keep_dates возвращает время из
+    очереди, это нужно при дозаписи спула после сбоя.
+    """
+    post_ids = set(Post.objects.filter(
+        id__in={item['post_id'] for item in items}).values_list(
+        'id', flat=True))
+    author_ids = set(User.objects.filter(
+        id__in={item['author_id'] for item in items}).values_list(
+        'id', flat=True))
+    with transaction.atomic():
+        written = set(Comment.objects.filter(
+            queue_id__in=[item['id'] for item in items]).values_list(
+            'queue_id', flat=True))
+        fresh = [
+            item for item in items
+            if uuid.UUID(item['id']) not in written
+            and item['post_id'] in post_ids
+            and item['author_id'] in author_ids
+        ]
+        if not fresh:
+            return 0
+        Comment.objects.bulk_create(
+            (Comment(
+                queue_id=item['id'],
+                post_id=item['post_id'],
+                author_id=item['author_id'],
+                text=item['text'])
+             for item in fresh),
+            ignore_conflicts=True)
+        if keep_dates:
+            Comment.objects.filter(
+                queue_id__in=[item['id'] for item in fresh]).update(
+                created=Case(
+                    *(When(queue_id=item['id'],
+                           then=parse_datetime(item['created']))
+                      for item in fresh),
+                    output_field=DateTimeField()))
+        _comments_added(fresh)
+    return len(fresh)
+
+
+def _write_batch(path, keep_dates=False):
+    try:
+        written = save(_read(path), keep_dates)
+        os.remove(path)
+    except Exception:
+        # Файл остается на диске, его подберет следующий replay
+        logger.exception('Не удалось записать комментарии из %s', path)
+        written = 0
+    finally:
+        with _lock:
+            _in_flight.discard(path)
+    return written
+
+
+def flush():
+    """Записывает очередь процесса в базу; возвращает число комментариев."""
+    global _timer
+    with _lock:
+        if _timer is not None:
+            _timer.cancel()
+            _timer = None
+        if not _pending:
+            return 0
+        del _pending[:]
+        path = _claim(_spool_name())
+    if path is None:
+        return 0
+    return _write_batch(path)
+
+
+def _flush_in_worker():
+    try:
+        flush()
+    finally:
+        close_old_connections()
+
+
+def _take_over(name, owners):
+    """Путь пачки, которую replay должен дописать, или None."""
+    owner = _file_owner(name)
+    if owner is None:
+        return None
+    with _lock:
+        if owner == _token():
+            # Своя пачка, которую не удалось записать раньше
+            path = _path(name)
+            if name.startswith('spool-') or path in _in_flight:
+                return None
+            _in_flight.add(path)
+            return path
+    if owner not in owners:
+        owners[owner] = _lock_dead(owner)
+    if owners[owner] is None:
+        return None
+    with _lock:
+        return _claim(name)
+
+
+def replay():
+    """Дописывает в базу спулы умерших процессов и свои неудачные пачки."""
+    try:
+        names = sorted(os.listdir(settings.COMMENT_QUEUE_SPOOL_DIR))
+    except FileNotFoundError:
+        return 0
+    total = 0
+    # Метка владельца -> его замок, если он упал, или None, если жив
+    owners = {}
+    try:
+        for name in names:
+            path = _take_over(name, owners)
+            if path is not None:
+                total += _write_batch(path, keep_dates=True)
+    finally:
+        for handle in filter(None, owners.values()):
+            # Файлы упавшего процесса стали нашими, его замок больше не нужен
+            os.remove(handle.name)
+            handle.close()
+    return total
+
+
+def _replay_in_worker():
+    try:
+        replay()
+    finally:
+        close_old_connections()
+
+
+def start():
+    """Дописывает спулы упавших процессов в фоне при старте процесса.
+
+    Вызывается из PostsConfig.ready, если очередь включена. Если база еще
+    не готова (идет migrate), пачки остаются на диске до следующего
+    запуска или replay_comments.
+    """
+    threading.Thread(
+        target=_replay_in_worker, name='comment-replay', daemon=True).start()
+
+
+def enqueue(post_id, author_id, text):
+    """Ставит комментарий в очередь и возвращает его запись."""
+    global _timer
+    item = {
+        'id': uuid.uuid4().hex,
+        'post_id': post_id,
+        'author_id': author_id,
+        'text': text,
+        'created': timezone.now().isoformat(),
+    }
+    line = json.dumps(item, ensure_ascii=False) + '\n'
+    with _lock:
+        with open(_path(_spool_name()), 'a', encoding='utf-8') as spool:
+            spool.write(line)
+            spool.flush()
+            os.fsync(spool.fileno())
+        _pending.append(item)
+        full = len(_pending) >= settings.COMMENT_QUEUE_BATCH_SIZE
+        delay = settings.COMMENT_QUEUE_FLUSH_MS
+        if not full and _timer is None and delay > 0:
+            _timer = threading.Timer(delay / 1000, _flush_in_worker)
+            _timer.daemon = True
+            _timer.start()
+    if full:
+        flush()
+    return item
+
+
+def add(request, post_id, text):
+    """Комментарий из запроса: в очередь и в сессию автора."""
+    item = enqueue(post_id, request.user.id, text)
+    queued = request.session.get(SESSION_KEY, [])
+    queued.append(item)
+    request.session[SESSION_KEY] = queued[-OVERLAY_LIMIT:]
+    return item
+
+
+def overlay(request, post_id):
+    """Свои комментарии к посту, которые еще не видны в базе.
+
+    Пока в сессии ничего нет, запросов к базе не делает.
+    """
+    queued = request.session.get(SESSION_KEY)
+    if not queued:
+        return []
+    written = {
+        queue_id.hex for queue_id in Comment.objects.filter(
+            queue_id__in=[item['id'] for item in queued]).values_list(
+            'queue_id', flat=True)
+    }
+    deadline = timezone.now() - OVERLAY_TTL
+    left = [
+        item for item in queued
+        if item['id'] not in written
+        and parse_datetime(item['created']) > deadline
+    ]
+    if not left:
+        del request.session[SESSION_KEY]
+    elif len(left) != len(queued):
+        request.session[SESSION_KEY] = left
+    return [
+        Comment(
+            post_id=item['post_id'],
+            author=request.user,
+            text=item['text'],
+            created=parse_datetime(item['created']))
+        for item in reversed(left) if item['post_id'] == post_id
+    ]
+
+
+atexit.register(flush)
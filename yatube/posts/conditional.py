@@ -0,0 +1,98 @@
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from . import cache_versions, groups
+from .models import Post, User
+
+
+def index_scopes():
+    return [cache_versions.INDEX]
+
+
+def group_scopes(slug):
+    group = groups.get_by_slug(slug)
+    if group is None:
+        return None
+    return [cache_versions.group_scope(group.id)]
+
+
+def profile_scopes(username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True).first()
+    if author_id is None:
+        return None
+    return [cache_versions.author_scope(author_id)]
+
+
+def post_scopes(post_id):
+    ids = Post.objects.filter(id=post_id).values_list(
+        'author_id', 'group_id').first()
+    if ids is None:
+        return None
+    author_id, group_id = ids
+    scopes = [
+        cache_versions.post_scope(post_id),
+        cache_versions.comments_scope(post_id),
+        cache_versions.author_scope(author_id),
+    ]
+    if group_id:
+        scopes.append(cache_versions.group_scope(group_id))
+    return scopes
+
+
+def conditional_feed(scopes_func):
+    """ETag/Last-Modified и кэш целого ответа для анонимных читателей.
+
+    Валидаторы строятся из версий cache_versions, поэтому для ответа 304
+    не нужно ни выполнять запросы ленты, ни рендерить шаблон. С репликами
+    версии читаются до представления и для вошедших пользователей: после
+    свежей правки представление читает основную базу, а не реплику.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            anonymous = not request.user.is_authenticated
+            if (request.method not in ('GET', 'HEAD')
+                    or not (anonymous or settings.DATABASE_REPLICAS)):
+                return view(request, *args, **kwargs)
+            scopes = scopes_func(*args, **kwargs)
+            if scopes is None:
+                return view(request, *args, **kwargs)
+            version = cache_versions.get_version(*scopes)
+            if not anonymous:
+                return view(request, *args, **kwargs)
+            etag = quote_etag(hashlib.md5(
+                f'{version}|{request.get_full_path()}'.encode()).hexdigest())
+            changed = cache_versions.last_modified(*scopes)
+            last_modified = (
+                timegm(changed.utctimetuple()) if changed else None)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is not None:
+                return response
+            cache = caches[settings.FEED_CACHE_ALIAS]
+            key = f'posts:response:{etag}'
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(
+                        key,
+                        (response.content, response['Content-Type']),
+                        settings.FEED_CACHE_TTL)
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,135 @@
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Comment, Counter, Follow, Post
+
+POSTS = 'posts'
+
+
+def author_posts_key(author_id):
+    return f'posts:author:{author_id}'
+
+
+def group_posts_key(group_id):
+    return f'posts:group:{group_id}'
+
+
+def post_comments_key(post_id):
+    return f'comments:post:{post_id}'
+
+
+def author_followers_key(author_id):
+    return f'followers:author:{author_id}'
+
+
+def incr(key, delta=1):
+    """Сдвигает счетчик, если он уже заведен.
+
+    Незаведенный счетчик не трогаем: get_count посчитает его с нуля
+    при первом чтении, и это значение уже учтет текущее изменение.
+    """
+    Counter.objects.filter(key=key).update(value=F('value') + delta)
+
+
+def incr_many(keys, delta=1):
+    """Сдвигает сразу несколько заведенных счетчиков одним UPDATE."""
+    Counter.objects.filter(key__in=keys).update(value=F('value') + delta)
+
+
+def forget(key):
+    Counter.objects.filter(key=key).delete()
+
+
+def get_count(key, queryset):
+    """Значение счетчика; незаведенный считается по queryset.
+
+    Строка заводится до точного подсчета, а пересчет идет под
+    select_for_update: incr, пришедший во время подсчета, либо уже виден
+    в queryset, либо ждет блокировки и сдвигает готовое значение.
+    """
+    value = Counter.objects.filter(key=key).values_list(
+        'value', flat=True).first()
+    if value is not None:
+        return value
+    Counter.objects.get_or_create(
+        key=key, defaults={'value': queryset.count()})
+    with transaction.atomic():
+        list(Counter.objects.select_for_update().filter(
+            key=key).values_list('id'))
+        value = queryset.count()
+        Counter.objects.filter(key=key).update(value=value)
+    return value
+
+
+def get_counts(keys_querysets):
+    """Пакетное чтение: один запрос на все заведенные счетчики."""
+    stored = dict(Counter.objects.filter(
+        key__in=keys_querysets).values_list('key', 'value'))
+    return {
+        key: stored[key] if key in stored else get_count(key, queryset)
+        for key, queryset in keys_querysets.items()
+    }
+
+
+def total_posts():
+    return get_count(POSTS, Post.objects.all())
+
+
+def author_posts(author_id):
+    return get_count(
+        author_posts_key(author_id), Post.objects.filter(author=author_id))
+
+
+def group_posts(group_id):
+    return get_count(
+        group_posts_key(group_id), Post.objects.filter(group=group_id))
+
+
+def post_comments(post_id):
+    return get_count(
+        post_comments_key(post_id), Comment.objects.filter(post=post_id))
+
+
+def author_followers(author_id):
+    return get_count(
+        author_followers_key(author_id), Follow.objects.filter(
+            author=author_id))
+
+
+def followed_posts(user):
+    author_ids = Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True)
+    counts = get_counts({
+        author_posts_key(author_id): Post.objects.filter(author=author_id)
+        for author_id in author_ids
+    })
+    return sum(counts.values())
+
+
+def rebuild():
+    """Пересчитывает все счетчики одним проходом по таблицам."""
+    rows = [Counter(key=POSTS, value=Post.objects.count())]
+    rows += [
+        Counter(key=author_posts_key(author_id), value=value)
+        for author_id, value in Post.objects.order_by().values_list(
+            'author').annotate(Count('id'))
+    ]
+    rows += [
+        Counter(key=group_posts_key(group_id), value=value)
+        for group_id, value in Post.objects.order_by().filter(
+            group__isnull=False).values_list('group').annotate(Count('id'))
+    ]
+    rows += [
+        Counter(key=post_comments_key(post_id), value=value)
+        for post_id, value in Comment.objects.order_by().values_list(
+            'post').annotate(Count('id'))
+    ]
+    rows += [
+        Counter(key=author_followers_key(author_id), value=value)
+        for author_id, value in Follow.objects.order_by().values_list(
+            'author').annotate(Count('id'))
+    ]
+    with transaction.atomic():
+        Counter.objects.all().delete()
+        Counter.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
@@ -0,0 +1,211 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, F, Q
+
+from . import counters
+from .models import FeedEntry, Follow, Post
+
+BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _bulk_insert(entries, batch_size=BATCH_SIZE):
+    entries = iter(entries)
+    total = 0
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return total
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        total += len(batch)
+
+
+def is_celebrity(author_id):
+    return (counters.author_followers(author_id)
+            > settings.FEED_CELEBRITY_THRESHOLD)
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not settings.FEED_INBOX_ENABLED or is_celebrity(post.author_id):
+        return
+    follower_ids = Follow.objects.filter(
+        author=post.author_id).values_list('user_id', flat=True)
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in follower_ids.iterator()
+    )
+
+
+def _followers(author_ids):
+    counts = counters.get_counts({
+        counters.author_followers_key(author_id):
+            Follow.objects.filter(author=author_id)
+        for author_id in author_ids
+    })
+    return {
+        author_id: counts[counters.author_followers_key(author_id)]
+        for author_id in author_ids
+    }
+
+
+def celebrities(author_ids):
+    """Популярные авторы из author_ids: их посты не раскладываются."""
+    followers = _followers(author_ids)
+    return [
+        author_id for author_id in author_ids
+        if followers[author_id] > settings.FEED_CELEBRITY_THRESHOLD
+    ]
+
+
+def _run_in_worker(task, *args):
+    try:
+        task(*args)
+    except Exception:
+        logger.exception('Не удалось разложить посты авторов %s', args)
+    finally:
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.FEED_BACKFILL_WORKERS,
+                thread_name_prefix='feed-backfill')
+        return _executor
+
+
+def _in_background():
+    # Общую базу SQLite в памяти (тестовую) другой поток застает
+    # заблокированной, поэтому с ней работаем в текущем потоке
+    return bool(settings.FEED_BACKFILL_WORKERS) and not (
+        connection.vendor == 'sqlite' and connection.is_in_memory_db())
+
+
+def _submit(task, *args):
+    if not _in_background():
+        task(*args)
+        return
+    _get_executor().submit(_run_in_worker, task, *args)
+
+
+def _follower_entries(posts, batch_size=BATCH_SIZE):
+    """FeedEntry для каждой пары (подписчик автора, пост) из posts.
+
+    Пары приходят одним запросом с JOIN потоком, без списков id в памяти.
+    """
+    rows = posts.order_by().values_list(
+        'author__following__user', 'id', 'pub_date')
+    return (
+        FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for user_id, post_id, pub_date in rows.iterator(
+            chunk_size=batch_size)
+        if user_id is not None
+    )
+
+
+def fan_out_authors(author_ids, batch_size=BATCH_SIZE):
+    """Раскладывает все посты авторов по лентам их подписчиков.
+
+    Каждая пачка пишется своим INSERT вне общей транзакции: повторный
+    запуск после сбоя ничего не дублирует благодаря ignore_conflicts.
+    """
+    total = 0
+    for author_id in author_ids:
+        total += _bulk_insert(_follower_entries(
+            Post.objects.filter(author=author_id), batch_size), batch_size)
+    return total
+
+
+def followers_dropped(*author_ids):
+    """Раскладывает посты авторов, переставших быть популярными.
+
+    Вызывается после уменьшения счетчиков подписчиков. Посты, написанные,
+    пока автор был выше порога, не раскладывались; без этого они пропали
+    бы из лент, как только их перестанут подтягивать при чтении. Это
+    подписчики × посты строк, поэтому они пишутся после коммита в
+    фоновом потоке (FEED_BACKFILL_WORKERS), а не в запросе отписки.
+    """
+    if not settings.FEED_INBOX_ENABLED:
+        return
+    followers = _followers(author_ids)
+    dropped = [
+        author_id for author_id in author_ids
+        if followers[author_id] == settings.FEED_CELEBRITY_THRESHOLD
+    ]
+    if dropped:
+        transaction.on_commit(lambda: _submit(fan_out_authors, dropped))
+
+
+def backfill(user_id, *author_ids):
+    """Добавляет в ленту читателя уже написанные посты авторов."""
+    if not settings.FEED_INBOX_ENABLED:
+        return
+    skipped = set(celebrities(author_ids))
+    author_ids = [
+        author_id for author_id in author_ids if author_id not in skipped]
+    if not author_ids:
+        return
+    posts = Post.objects.filter(author__in=author_ids).values_list(
+        'id', 'pub_date')
+    _bulk_insert(
+        FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+    )
+
+
+def prune(user_id, *author_ids):
+    if settings.FEED_INBOX_ENABLED:
+        FeedEntry.objects.filter(
+            user=user_id, post__author__in=author_ids).delete()
+
+
+def followed_celebrities(user):
+    return celebrities(list(Follow.objects.filter(user=user).values_list(
+        'author_id', flat=True)))
+
+
+def followed_posts(user):
+    """Посты авторов, на которых подписан читатель.
+
+    С материализованной лентой посты берутся из FeedEntry и сортируются
+    по его индексу (user, -pub_date, -post): пагинатор берет ключ курсора
+    из явной сортировки. Посты популярных авторов в ленту не попадают,
+    их приходится подтягивать при чтении по дате поста.
+    """
+    if not settings.FEED_INBOX_ENABLED:
+        return Post.objects.filter(author__following__user=user)
+    celebrities = followed_celebrities(user)
+    if celebrities:
+        return Post.objects.filter(
+            Q(id__in=FeedEntry.objects.filter(user=user).values('post_id'))
+            | Q(author_id__in=celebrities))
+    return Post.objects.filter(feed_entries__user=user).annotate(
+        feed_date=F('feed_entries__pub_date'),
+        feed_post=F('feed_entries__post'),
+    ).order_by('-feed_date', '-feed_post')
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    """Заполняет материализованные ленты с нуля."""
+    if not settings.FEED_INBOX_ENABLED:
+        return 0
+    celebrities = Follow.objects.order_by().values('author').annotate(
+        followers=Count('id')).filter(
+        followers__gt=settings.FEED_CELEBRITY_THRESHOLD).values('author')
+    posts = Post.objects.exclude(author__in=celebrities)
+    with transaction.atomic():
+        FeedEntry.objects.all().delete()
+        return _bulk_insert(
+            _follower_entries(posts, batch_size), batch_size)
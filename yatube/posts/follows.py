@@ -0,0 +1,104 @@
+"""Подписка и отписка сразу на много авторов.
+
+Подписки пишутся одним bulk_create(ignore_conflicts=True) по ограничению
+unique_follower, отписки — одним DELETE мимо сигналов: на Follow висят
+обработчики, и обычный delete() удалял бы строки по одной. Счетчики
+подписчиков и ленты правятся здесь же пачкой; версия кэша лент читателя
+меняется один раз на всю пачку.
+
+Подписки читателя меняются под блокировкой его строки в auth_user
+(lock_reader), в том числе в profile_follow и profile_unfollow: иначе
+два параллельных запроса оба сочли бы одну подписку новой и дважды
+сдвинули счетчик.
+"""
+from django.db import connection, transaction
+
+from . import cache_versions, counters, feed, recommendations
+from .models import Follow, User
+
+
+def resolve(user, usernames):
+    """{имя: id} найденных авторов и список ненайденных имен.
+
+    Сам читатель в авторы не попадает, как и в profile_follow.
+    """
+    usernames = list(dict.fromkeys(usernames))
+    found = dict(User.objects.filter(username__in=usernames).values_list(
+        'username', 'id'))
+    missing = [username for username in usernames if username not in found]
+    found.pop(user.username, None)
+    return found, missing
+
+
+def lock_reader(user):
+    """Блокирует строку читателя до конца транзакции."""
+    list(User.objects.select_for_update().filter(
+        id=user.id).values_list('id'))
+
+
+def delete_follows(user, author_ids):
+    """Удаляет подписки одним DELETE, без сигналов и выборки строк."""
+    table = connection.ops.quote_name(Follow._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE user_id = %s '
+            f'AND author_id IN ({placeholders})',
+            [user.id, *author_ids])
+
+
+def followed_ids(user, author_ids):
+    return set(Follow.objects.filter(
+        user=user, author__in=author_ids).values_list('author_id', flat=True))
+
+
+def state(authors, missing, following):
+    """Итоговое состояние подписок на запрошенных авторов."""
+    return {
+        'following': sorted(
+            username for username, author_id in authors.items()
+            if author_id in following),
+        'not_following': sorted(
+            username for username, author_id in authors.items()
+            if author_id not in following),
+        'not_found': missing,
+    }
+
+
+def follow_many(user, usernames):
+    authors, missing = resolve(user, usernames)
+    with transaction.atomic():
+        lock_reader(user)
+        existing = followed_ids(user, authors.values())
+        Follow.objects.bulk_create(
+            [Follow(user=user, author_id=author_id)
+             for author_id in authors.values() if author_id not in existing],
+            ignore_conflicts=True)
+        # Новые — те, что есть в базе после вставки и не было до нее
+        added = sorted(followed_ids(user, authors.values()) - existing)
+        if added:
+            counters.incr_many(
+                [counters.author_followers_key(pk) for pk in added])
+            feed.backfill(user.id, *added)
+            recommendations.follows_changed(user.id)
+    if added:
+        cache_versions.bump(cache_versions.follows_scope(user.id))
+    return state(authors, missing, existing.union(added))
+
+
+def unfollow_many(user, usernames):
+    authors, missing = resolve(user, usernames)
+    with transaction.atomic():
+        lock_reader(user)
+        removed = sorted(followed_ids(user, authors.values()))
+        if removed:
+            # На Follow никто не ссылается, каскадов и сигналов не нужно
+            delete_follows(user, removed)
+            counters.incr_many(
+                [counters.author_followers_key(pk) for pk in removed], -1)
+            feed.prune(user.id, *removed)
+            feed.followers_dropped(*removed)
+            recommendations.follows_changed(user.id)
+    if removed:
+        cache_versions.bump(cache_versions.follows_scope(user.id))
+    return state(authors, missing, following=set())
@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from . import images
 from .models import Post, Comment
 
 
@@ -8,6 +10,13 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        # Проверяем только новую загрузку, а не уже сохраненный файл
+        if isinstance(image, UploadedFile):
+            images.validate_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,94 @@
+"""Группы: LRU по slug в памяти процесса и список групп со счетчиками.
+
+Групп немного, а меняются они редко, поэтому страница группы берет
+объект из LRU, а не из базы. Сигналы сбрасывают запись при сохранении
+и удалении группы в своем процессе; другие процессы увидят правку не
+позже чем через GROUP_CACHE_TTL секунд.
+
+Список групп не считает посты при запросе: число постов берется из
+counters, а дата последнего поста хранится в Group.last_post_at и
+обновляется сигналами при создании, переносе и удалении постов.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F, OuterRef, Q, Subquery
+
+from . import counters
+from .models import Group, Post
+
+_lock = threading.Lock()
+# slug -> (когда истекает, группа)
+_groups = OrderedDict()
+
+
+def get_by_slug(slug):
+    """Группа по slug или None; отсутствие группы не запоминается."""
+    now = time.monotonic()
+    with _lock:
+        entry = _groups.get(slug)
+        if entry is not None and entry[0] > now:
+            _groups.move_to_end(slug)
+            return entry[1]
+    group = Group.objects.filter(slug=slug).first()
+    if group is None:
+        return None
+    with _lock:
+        _groups[slug] = (now + settings.GROUP_CACHE_TTL, group)
+        _groups.move_to_end(slug)
+        while len(_groups) > settings.GROUP_CACHE_SIZE:
+            _groups.popitem(last=False)
+    return group
+
+
+def forget(group):
+    """Сбрасывает группу из LRU: и по slug, и под прежним slug."""
+    with _lock:
+        for slug, (_, cached) in list(_groups.items()):
+            if slug == group.slug or cached.id == group.id:
+                del _groups[slug]
+
+
+def clear():
+    with _lock:
+        _groups.clear()
+
+
+def post_added(group_id, pub_date):
+    Group.objects.filter(id=group_id).filter(
+        Q(last_post_at__isnull=True) | Q(last_post_at__lt=pub_date)).update(
+        last_post_at=pub_date)
+
+
+def refresh_last_post(*group_ids):
+    """Пересчитывает last_post_at одним UPDATE по индексу group, -pub_date.
+
+    Без аргументов — для всех групп.
+    """
+    groups = Group.objects.all()
+    if group_ids:
+        groups = groups.filter(id__in=group_ids)
+    groups.update(last_post_at=Subquery(
+        Post.objects.filter(group=OuterRef('pk')).order_by(
+            '-pub_date').values('pub_date')[:1]))
+
+
+def rebuild():
+    refresh_last_post()
+    clear()
+
+
+def listing():
+    """Группы со свежими постами сверху, с числом постов из counters."""
+    groups = list(Group.objects.order_by(
+        F('last_post_at').desc(nulls_last=True), 'title'))
+    counts = counters.get_counts({
+        counters.group_posts_key(group.id): Post.objects.filter(
+            group=group.id)
+        for group in groups
+    })
+    for group in groups:
+        group.post_count = counts[counters.group_posts_key(group.id)]
+    return groups
@@ -0,0 +1,149 @@
+import os
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageFile
+
+# Запас на текстовые поля формы и границы multipart сверх размера картинки
+FORM_OVERHEAD = 64 * 1024
+# Сколько байт начала файла читать в поисках заголовка с размерами
+HEADER_BYTES = 1024 * 1024
+
+REENCODE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True, 'progressive': True},
+    'WEBP': {'quality': 80, 'method': 4},
+}
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+
+
+def size_error(size):
+    max_bytes = settings.POST_IMAGE_MAX_BYTES
+    if size > max_bytes:
+        return f'Файл весит больше {max_bytes // 1024} КБ.'
+    return None
+
+
+def dimensions_error(width, height):
+    max_width, max_height = settings.POST_IMAGE_MAX_DIMENSIONS
+    if width > max_width or height > max_height:
+        return f'Картинка больше {max_width}×{max_height} пикселей.'
+    return None
+
+
+def validate_image(image):
+    """Проверяет вес и размеры загруженной картинки по ее заголовку."""
+    error = size_error(image.size)
+    header = getattr(image, 'image', None)
+    if error is None and header is not None:
+        error = dimensions_error(*header.size)
+    if error:
+        raise ValidationError(error)
+
+
+class ImageLimitUploadHandler(FileUploadHandler):
+    """Обрывает загрузку файла, как только он выходит за лимиты.
+
+    Байты считаются по мере чтения потока, а размеры в пикселях берутся
+    из заголовка, разобранного ImageFile.Parser по первым чанкам. Файл
+    дальше не буферизуется, а ошибка сохраняется в request.upload_errors.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.parser = ImageFile.Parser()
+
+    def reject(self, error):
+        self.request.upload_errors[self.field_name] = error
+        raise SkipFile()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        error = size_error(self.received)
+        if error:
+            self.reject(error)
+        if self.parser is not None:
+            self.check_header(raw_data)
+        return raw_data
+
+    def check_header(self, raw_data):
+        try:
+            self.parser.feed(raw_data)
+        except Exception:
+            # Битые файлы отсеет ImageField при валидации формы
+            self.parser = None
+            return
+        if self.parser.image is not None:
+            error = dimensions_error(*self.parser.image.size)
+            self.parser = None
+            if error:
+                self.reject(error)
+        elif self.received >= HEADER_BYTES:
+            self.parser = None
+
+    def file_complete(self, file_size):
+        return None
+
+
+def too_large(error):
+    return HttpResponse(error, status=413, content_type='text/plain')
+
+
+def limit_image_upload(view):
+    """Отклоняет слишком большие картинки до разбора всего тела запроса.
+
+    CSRF проверяется уже после установки обработчика загрузки, иначе
+    CsrfViewMiddleware прочитает request.POST раньше времени.
+    """
+    @wraps(view)
+    def checked(request, *args, **kwargs):
+        # Разбираем тело, если проверка CSRF его еще не прочитала
+        request.FILES
+        if request.upload_errors:
+            return too_large(' '.join(request.upload_errors.values()))
+        return view(request, *args, **kwargs)
+
+    protected = csrf_protect(checked)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_errors = {}
+        if request.method == 'POST':
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+            error = size_error(length - FORM_OVERHEAD)
+            if error:
+                return too_large(error)
+            request.upload_handlers.insert(
+                0, ImageLimitUploadHandler(request))
+        return protected(request, *args, **kwargs)
+    return wrapper
+
+
+def reencode(field_file):
+    """Пережимает картинку в settings.POST_IMAGE_REENCODE.
+
+    Возвращает имя нового файла или None, если пережимать нечего:
+    картинка анимирована, уже в нужном формате или не стала меньше.
+    """
+    target = settings.POST_IMAGE_REENCODE
+    with field_file.open('rb'):
+        source = Image.open(field_file)
+        if source.format == target or getattr(source, 'is_animated', False):
+            return None
+        image = source.convert(
+            'RGBA' if target == 'WEBP' and 'A' in source.getbands()
+            else 'RGB')
+    buffer = BytesIO()
+    image.save(buffer, target, **REENCODE_OPTIONS.get(target, {}))
+    if buffer.tell() >= field_file.size:
+        return None
+    name = os.path.splitext(field_file.name)[0] + EXTENSIONS.get(
+        target, f'.{target.lower()}')
+    return field_file.storage.save(name, ContentFile(buffer.getvalue()))
@@ -0,0 +1,89 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+from django.utils import timezone
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Засевает тестовую базу синтетическими данными, прогоняет '
+            'все страницы и сохраняет задержки, запросы и размеры в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--groups', type=int, default=5)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=200)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора, чтобы прогоны были воспроизводимы')
+        parser.add_argument(
+            '--iterations', type=int, default=20,
+            help='Сколько раз запрашивать каждую страницу')
+        parser.add_argument(
+            '--warmup', type=int, default=1,
+            help='Сколько первых запросов не учитывать')
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэши прогона перед каждым запросом')
+        parser.add_argument(
+            '--output', default='benchmark.json',
+            help='Файл для результатов')
+        parser.add_argument(
+            '--compare', help='Файл прошлого прогона для сравнения')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations должен быть больше нуля')
+        if options['users'] < 1:
+            raise CommandError('--users должен быть больше нуля')
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with benchmark.isolated():
+                dataset = benchmark.seed(
+                    users=options['users'],
+                    groups=options['groups'],
+                    posts=options['posts'],
+                    comments=options['comments'],
+                    follows=options['follows'],
+                    random_seed=options['seed'],
+                )
+                results = benchmark.run(
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    cold=options['cold'],
+                )
+                environment = benchmark.environment()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        report = {
+            'created': timezone.now().isoformat(),
+            'environment': environment,
+            'dataset': dataset,
+            'options': {
+                key: options[key]
+                for key in ('seed', 'iterations', 'warmup', 'cold')
+            },
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as stream:
+            json.dump(report, stream, ensure_ascii=False, indent=2)
+        for item in results:
+            self.stdout.write(
+                f'{item["route"]:32} {item["client"]:10} '
+                f'p50 {item["p50_ms"]:7.2f} ms  p95 {item["p95_ms"]:7.2f} ms '
+                f'{item["queries"]:5.1f} q  {item["bytes"]:8.0f} B')
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as stream:
+                previous = json.load(stream)
+            for line in benchmark.compare(previous, report):
+                self.stdout.write(line)
+        self.stdout.write(f'Результаты сохранены в {options["output"]}')
@@ -0,0 +1,108 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from posts import feed
+from posts.models import Group, Post, User
+from posts.utils import CountedPaginator, CursorPaginator
+from yatube.settings import NUMBER_Of_POSTS
+
+FULL_SCAN = {
+    'sqlite': re.compile(r'\bSCAN (TABLE )?\w+$', re.MULTILINE),
+    'postgresql': re.compile(r'\bSeq Scan\b'),
+    'mysql': re.compile(r'\bALL\b'),
+}
+SORT = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': re.compile(r'\bSort\b'),
+    'mysql': re.compile(r'Using filesort'),
+}
+# Временное дерево SQLite строится на весь результат до LIMIT
+TEMP_SORT = {
+    'sqlite': re.compile(r'\bTEMP B-TREE\b'),
+}
+# Известные сортировки во временном дереве, которые не роняют проверку.
+# Лента подписок без FEED_INBOX_ENABLED собирается из постов всех авторов
+# читателя, и один индекс не дает ее порядок; дерево строится только по
+# постам подписок. Полный проход с сортировкой не допускается нигде.
+PULLED_FEED_VIEWS = ('follow_index',)
+
+
+def page_querysets(name, queryset, date_field='pub_date',
+                   per_page=NUMBER_Of_POSTS, numbered=True):
+    """Запросы страниц, как их строят пагинаторы get_page_context."""
+    cursor = (timezone.now(), 1)
+    paginator = CursorPaginator(queryset, per_page, date_field=date_field)
+    querysets = {
+        f'{name}?cursor': paginator.page_queryset(),
+        f'{name}?after': paginator.page_queryset(after=cursor),
+        f'{name}?before': paginator.page_queryset(before=cursor),
+    }
+    if numbered:
+        querysets[f'{name}?page'] = CountedPaginator(
+            queryset, per_page, count=lambda: per_page).page(1).object_list
+    return querysets
+
+
+def view_querysets(user, group, post):
+    """Запросы, которые выполняют представления posts.views."""
+    querysets = {}
+    querysets.update(page_querysets('index', Post.objects.feed()))
+    querysets.update(page_querysets('group_posts', group.posts.feed()))
+    querysets.update(page_querysets('profile', user.posts.feed()))
+    querysets.update(page_querysets(
+        'post_detail', post.comments.select_related('author'),
+        date_field='created', per_page=settings.COMMENTS_PER_PAGE,
+        numbered=False))
+    querysets.update(page_querysets(
+        'follow_index', feed.followed_posts(user).feed()))
+    return querysets
+
+
+def is_full_scan_with_sort(plan, vendor=None):
+    vendor = vendor or connection.vendor
+    if vendor not in FULL_SCAN:
+        return False
+    return bool(FULL_SCAN[vendor].search(plan) and SORT[vendor].search(plan))
+
+
+def uses_temp_sort(plan, vendor=None):
+    vendor = vendor or connection.vendor
+    return vendor in TEMP_SORT and bool(TEMP_SORT[vendor].search(plan))
+
+
+def allowed_temp_sort(name):
+    view = name.split('?')[0]
+    return not settings.FEED_INBOX_ENABLED and view in PULLED_FEED_VIEWS
+
+
+class Command(BaseCommand):
+    help = ('Выполняет EXPLAIN для запросов лент и падает, если какой-то '
+            'из них читает таблицу целиком и сортирует результат или '
+            'сортирует во временном дереве, кроме известных случаев '
+            'из PULLED_FEED_VIEWS')
+
+    def handle(self, *args, **options):
+        user = User.objects.first() or User(id=1)
+        group = Group.objects.first() or Group(id=1)
+        post = Post.objects.first() or Post(id=1)
+        failed = []
+        for name, queryset in view_querysets(user, group, post).items():
+            plan = queryset.explain()
+            self.stdout.write(f'{name}:\n{plan}\n')
+            if is_full_scan_with_sort(plan):
+                failed.append(name)
+            elif uses_temp_sort(plan):
+                if not allowed_temp_sort(name):
+                    failed.append(name)
+                else:
+                    self.stdout.write(
+                        f'{name}: известная сортировка ленты без '
+                        f'FEED_INBOX_ENABLED\n')
+        if failed:
+            raise CommandError(
+                'Сортировка без индекса: ' + ', '.join(failed))
+        self.stdout.write('Все запросы используют индексы')
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, группы, посты, комментарии '
+            'и подписки в каталог в формате NDJSON или CSV')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог для файлов выгрузки')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='ndjson',
+            help='Формат файлов')
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE,
+            help='Сколько строк читать из базы за раз')
+        parser.add_argument(
+            '--skip-passwords', action='store_true',
+            help='Не выгружать хэши паролей пользователей')
+
+    def handle(self, *args, **options):
+        totals = transfer.export_data(
+            options['directory'],
+            fmt=options['format'],
+            batch_size=options['batch_size'],
+            skip_passwords=options['skip_passwords'],
+        )
+        for name, total in totals.items():
+            self.stdout.write(f'{name}: {total}')
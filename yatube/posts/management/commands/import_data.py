@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Загружает выгрузку export_data пачками bulk_create и '
+            'пересобирает счетчики, ленты, поиск и кэш; после сбоя '
+            'повторный запуск продолжает с последней пачки')
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Каталог с файлами выгрузки')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS, default='ndjson',
+            help='Формат файлов')
+        parser.add_argument(
+            '--batch-size', type=int, default=transfer.BATCH_SIZE,
+            help='Размер пачки для bulk_create')
+        parser.add_argument(
+            '--ignore-conflicts', action='store_true',
+            help='Пропускать строки, которые уже есть в базе')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        totals = transfer.import_data(
+            options['directory'],
+            fmt=options['format'],
+            batch_size=options['batch_size'],
+            ignore_conflicts=options['ignore_conflicts'],
+        )
+        if not totals:
+            raise CommandError(
+                f'В каталоге {options["directory"]} нет файлов выгрузки')
+        for name, total in totals.items():
+            self.stdout.write(f'{name}: {total}')
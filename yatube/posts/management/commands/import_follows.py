@@ -0,0 +1,62 @@
+import csv
+from collections import defaultdict
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import follows
+from posts.models import User
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Подписывает читателей на авторов по CSV со строками '
+            '"читатель,автор": файл читается пачками по --batch-size строк, '
+            'в каждой пачке одна пачка подписок на читателя')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV-файл без заголовка')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько строк файла держать в памяти')
+
+    def follow_batch(self, rows, readers_seen):
+        authors = defaultdict(list)
+        for row in rows:
+            if len(row) >= 2 and row[0].strip():
+                authors[row[0].strip()].append(row[1].strip())
+        readers = User.objects.in_bulk(list(authors), field_name='username')
+        following = not_found = 0
+        for username, usernames in authors.items():
+            reader = readers.get(username)
+            if reader is None:
+                self.stderr.write(f'Нет пользователя {username}')
+                continue
+            readers_seen.add(reader.id)
+            state = follows.follow_many(reader, usernames)
+            following += len(state['following'])
+            not_found += len(state['not_found'])
+        return following, not_found
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        readers_seen = set()
+        following = not_found = 0
+        try:
+            with open(options['path'], encoding='utf-8', newline='') as file:
+                rows = csv.reader(file)
+                while True:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    batch_following, batch_not_found = self.follow_batch(
+                        batch, readers_seen)
+                    following += batch_following
+                    not_found += batch_not_found
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать файл: {error}')
+        self.stdout.write(
+            f'Читателей: {len(readers_seen)}, подписок: {following}, '
+            f'неизвестных авторов: {not_found}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики постов и комментариев'
+
+    def handle(self, *args, **options):
+        total = counters.rebuild()
+        self.stdout.write(f'Пересчитано счетчиков: {total}')
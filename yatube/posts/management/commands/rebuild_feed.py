@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = 'Заполняет материализованные ленты подписок с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=feed.BATCH_SIZE,
+            help='Размер пачки для bulk_create')
+
+    def handle(self, *args, **options):
+        if not settings.FEED_INBOX_ENABLED:
+            raise CommandError('Ленты не материализуются: FEED_INBOX_ENABLED')
+        total = feed.rebuild(options['batch_size'])
+        self.stdout.write(f'Записей в лентах: {total}')
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Заполняет поисковый индекс постов и комментариев с нуля'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=search.BATCH_SIZE,
+            help='Сколько постов загружать в индекс за раз')
+
+    def handle(self, *args, **options):
+        total = search.rebuild(options['batch_size'])
+        self.stdout.write(f'Постов в поисковом индексе: {total}')
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import recommendations
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации «кого почитать» для помеченных '
+            'пользователей или, с --full, для всех')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать всех пользователей, а не только помеченных')
+        parser.add_argument(
+            '--batch-size', type=int, default=recommendations.BATCH_SIZE,
+            help='Сколько пользователей считать за один проход')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля')
+        total = recommendations.refresh(
+            full=options['full'], batch_size=options['batch_size'])
+        self.stdout.write(f'Пересчитано пользователей: {total}')
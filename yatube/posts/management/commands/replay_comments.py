@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import comment_queue
+
+
+class Command(BaseCommand):
+    help = ('Дописывает в базу комментарии из спулов отложенной очереди, '
+            'оставшихся от упавших процессов')
+
+    def handle(self, *args, **options):
+        total = comment_queue.replay()
+        self.stdout.write(f'Записано комментариев: {total}')
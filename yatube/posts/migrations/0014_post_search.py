@@ -0,0 +1,42 @@
+from django.db import DatabaseError, migrations
+
+CREATE_SEARCH_TABLE = """
+CREATE VIRTUAL TABLE posts_search USING fts5(
+    text, comments, tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+FILL_SEARCH_TABLE = """
+INSERT INTO posts_search (rowid, text, comments)
+SELECT post.id, post.text, COALESCE((
+    SELECT group_concat(comment.text, char(10))
+    FROM posts_comment AS comment WHERE comment.post_id = post.id
+), '')
+FROM posts_post AS post
+"""
+
+
+def create_search_table(apps, schema_editor):
+    # Таблица нужна только на SQLite; без FTS5 поиск работает в памяти
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(CREATE_SEARCH_TABLE)
+    except DatabaseError:
+        return
+    schema_editor.execute(FILL_SEARCH_TABLE)
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2'"
+CREATE_POSTS_TABLE = f"""
+CREATE VIRTUAL TABLE posts_search USING fts5(text, {TOKENIZE})
+"""
+CREATE_COMMENTS_TABLE = f"""
+CREATE VIRTUAL TABLE posts_search_comments USING fts5(
+    text, post_id UNINDEXED, {TOKENIZE}
+)
+"""
+FILL_POSTS_TABLE = """
+INSERT INTO posts_search (rowid, text) SELECT id, text FROM posts_post
+"""
+FILL_COMMENTS_TABLE = """
+INSERT INTO posts_search_comments (rowid, post_id, text)
+SELECT id, post_id, text FROM posts_comment
+"""
+CREATE_OLD_TABLE = f"""
+CREATE VIRTUAL TABLE posts_search USING fts5(text, comments, {TOKENIZE})
+"""
+FILL_OLD_TABLE = """
+INSERT INTO posts_search (rowid, text, comments)
+SELECT post.id, post.text, COALESCE((
+    SELECT group_concat(comment.text, char(10))
+    FROM posts_comment AS comment WHERE comment.post_id = post.id
+), '')
+FROM posts_post AS post
+"""
+
+
+def table_exists(schema_editor, name):
+    return name in schema_editor.connection.introspection.table_names()
+
+
+def split_search_table(apps, schema_editor):
+    # Комментарии становятся отдельными строками своей таблицы
+    if not table_exists(schema_editor, 'posts_search'):
+        return
+    schema_editor.execute('DROP TABLE posts_search')
+    schema_editor.execute(CREATE_POSTS_TABLE)
+    schema_editor.execute(FILL_POSTS_TABLE)
+    schema_editor.execute(CREATE_COMMENTS_TABLE)
+    schema_editor.execute(FILL_COMMENTS_TABLE)
+
+
+def join_search_table(apps, schema_editor):
+    if not table_exists(schema_editor, 'posts_search'):
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search_comments')
+    schema_editor.execute('DROP TABLE posts_search')
+    schema_editor.execute(CREATE_OLD_TABLE)
+    schema_editor.execute(FILL_OLD_TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_group_last_post_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(split_search_table, join_search_table),
+    ]
@@ -3,5 +3,9 @@ from .post import Post
 from .user import User
 from .follow import Follow
 from .comment import Comment
+from .counter import Counter
+from .feed import FeedEntry
+from .recommendation import Recommendation, StaleRecommendation
 
-__all__ = [Post, Group, User, Comment, Follow]
+__all__ = [Post, Group, User, Comment, Follow, Counter,
+           FeedEntry, Recommendation, StaleRecommendation]
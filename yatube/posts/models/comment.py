@@ -20,6 +20,15 @@ class Comment (models.Model):
         verbose_name='Текст нового комментария'
     )
     created = models.DateTimeField(auto_now_add=True)
+    # Метка комментария из отложенной очереди: повторная запись пачки
+    # после сбоя не создает дублей
+    queue_id = models.UUIDField(
+        null=True, blank=True, unique=True, editable=False)
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created', '-id'],
+                name='comment_post_created_idx'),
+        ]
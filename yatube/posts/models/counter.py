@@ -0,0 +1,10 @@
+from django.db import models
+
+
+class Counter(models.Model):
+    """Денормализованный счетчик: число постов автора, группы и т.п."""
+    key = models.CharField(max_length=100, unique=True)
+    value = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.key}={self.value}'
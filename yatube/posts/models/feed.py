@@ -0,0 +1,30 @@
+from django.db import models
+
+from .post import Post
+from .user import User
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок читателя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    # Копия Post.pub_date: лента сортируется и листается по индексу
+    # читателя, не заглядывая в таблицу постов
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'post'],
+                       name='unique_feed_entry')]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx'),
+        ]
@@ -5,6 +5,9 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    # Дата последнего поста для списка групп, ведется в posts/groups.py
+    last_post_at = models.DateTimeField(
+        null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.title
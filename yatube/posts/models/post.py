@@ -4,6 +4,30 @@ from .group import Group
 from .user import User
 
 
+class PostQuerySet(models.QuerySet):
+    # Колонки, которые читают шаблоны лент
+    FEED_FIELDS = (
+        'text', 'pub_date', 'image',
+        'author__username', 'author__first_name', 'author__last_name',
+        'group__title', 'group__slug',
+    )
+
+    # Колонки, которые отдает JSON API
+    API_FIELDS = (
+        'id', 'text', 'pub_date', 'image',
+        'author__username', 'group__title', 'group__slug',
+    )
+
+    def feed(self):
+        """Посты для лент: автор и группа одним запросом."""
+        return self.select_related('author', 'group').only(
+            *self.FEED_FIELDS)
+
+    def api(self, *extra):
+        """Посты для API: словари из JOIN без сборки моделей."""
+        return self.values(*self.API_FIELDS, *extra)
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -31,8 +55,20 @@ class Post(models.Model):
         blank=True
     )
 
+    objects = PostQuerySet.as_manager()
+
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text
@@ -0,0 +1,36 @@
+from django.db import models
+
+from .user import User
+
+
+class Recommendation(models.Model):
+    """Автор, которого стоит почитать пользователю, и вес совета."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommended_to'
+    )
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['user', 'author'],
+                       name='unique_recommendation')]
+        indexes = [
+            models.Index(
+                fields=['user', '-score'], name='recommendation_user_idx'),
+        ]
+
+
+class StaleRecommendation(models.Model):
+    """Очередь пользователей, чьи рекомендации нужно пересчитать."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+'
+    )
@@ -0,0 +1,251 @@
+"""Рекомендации «кого почитать» по графу подписок и комментариям.
+
+Считаются пакетной командой refresh_recommendations и хранятся в
+Recommendation. Оценка складывается из трех разреженных произведений:
+
+* друзья друзей: F·F, где F — матрица подписок читатель × автор;
+* собеседники: C·Cᵀ, где C — матрица комментариев пользователь × пост;
+* популярные авторы групп, которые читает пользователь: R·P, где R —
+  доля постов каждой группы в его подписках и комментариях, а P —
+  самые читаемые авторы каждой группы.
+
+Матрицы — словари {строка: {столбец: значение}}, и умножаются только
+строки очередной пачки пользователей, поэтому память зависит от размера
+пачки, а не от числа подписок. Подписки и комментарии помечают
+затронутых пользователей в StaleRecommendation, и обычный прогон
+пересчитывает только их.
+"""
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count
+
+from .models import (Comment, Follow, Post, Recommendation,
+                     StaleRecommendation, User)
+
+BATCH_SIZE = 500
+# Сколько рекомендаций хранить на пользователя
+LIMIT = 10
+# Сколько самых читаемых авторов каждой группы участвует в оценке
+GROUP_AUTHORS = 20
+# Вклад каждой составляющей: друзья друзей, собеседники, группы
+WEIGHTS = {'follows': 1.0, 'comments': 0.5, 'groups': 0.3}
+
+
+def sparse(rows):
+    """Матрица из строк (строка, столбец) или (строка, столбец, значение)."""
+    matrix = defaultdict(lambda: defaultdict(float))
+    for row in rows:
+        matrix[row[0]][row[1]] += row[2] if len(row) > 2 else 1.0
+    return matrix
+
+
+def columns(matrix):
+    return {column for row in matrix.values() for column in row}
+
+
+def multiply(left, right):
+    """Произведение разреженных матриц: складываются только ненулевые."""
+    product = defaultdict(lambda: defaultdict(float))
+    for row, values in left.items():
+        target = product[row]
+        for middle, value in values.items():
+            for column, other in right.get(middle, {}).items():
+                target[column] += value * other
+    return product
+
+
+def normalized(matrix, norm=max):
+    """Каждая строка делится на norm своих значений."""
+    result = {}
+    for row, values in matrix.items():
+        total = norm(values.values()) if values else 0
+        if total:
+            result[row] = {
+                column: value / total for column, value in values.items()}
+    return result
+
+
+def popular_in_groups(limit=GROUP_AUTHORS):
+    """P: группа -> самые читаемые авторы, писавшие в нее, с долей от 1."""
+    followers = dict(Follow.objects.order_by().values_list(
+        'author').annotate(Count('id')))
+    authors = defaultdict(dict)
+    for group_id, author_id in Post.objects.order_by().filter(
+            group__isnull=False).values_list(
+            'group_id', 'author_id').distinct().iterator():
+        authors[group_id][author_id] = followers.get(author_id, 0)
+    popular = {}
+    for group_id, counts in authors.items():
+        top = sorted(
+            counts.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        popular[group_id] = {author_id: count for author_id, count in top}
+    return normalized(popular)
+
+
+def chunks(ids, size):
+    """Режет множество id на списки, которые влезут в один IN (...)."""
+    ids = iter(sorted(ids))
+    return iter(lambda: list(islice(ids, size)), [])
+
+
+def compute(user_ids, popular):
+    """{пользователь: [(автор, вес), ...]} для пачки пользователей.
+
+    Авторы из подписок и посты из комментариев пачки не перечисляются
+    списком, а передаются в запросы подзапросами: у популярного автора
+    или поста их больше, чем SQLite примет переменных.
+    """
+    follows = sparse(Follow.objects.filter(
+        user__in=user_ids).values_list('user_id', 'author_id'))
+    followed = Follow.objects.filter(user__in=user_ids).values('author_id')
+    second = sparse(Follow.objects.filter(
+        user__in=followed).values_list('user_id', 'author_id'))
+    commented = sparse(Comment.objects.filter(
+        author__in=user_ids).values_list('author_id', 'post_id'))
+    post_ids = Comment.objects.filter(author__in=user_ids).values('post_id')
+    commenters = sparse(Comment.objects.filter(
+        post__in=post_ids).values_list('post_id', 'author_id'))
+    reads = multiply(follows, sparse(
+        Post.objects.order_by().filter(
+            author__in=followed, group__isnull=False).values_list(
+            'author_id', 'group_id').annotate(Count('id'))))
+    for user_id, groups in multiply(commented, sparse(
+            Post.objects.filter(
+                id__in=post_ids, group__isnull=False).values_list(
+                'id', 'group_id'))).items():
+        for group_id, value in groups.items():
+            reads[user_id][group_id] += value
+    parts = {
+        'follows': normalized(multiply(follows, second)),
+        'comments': normalized(multiply(commented, commenters)),
+        'groups': normalized(
+            multiply(normalized(reads, norm=sum), popular)),
+    }
+    scores = defaultdict(lambda: defaultdict(float))
+    for name, matrix in parts.items():
+        for user_id, values in matrix.items():
+            for author_id, value in values.items():
+                scores[user_id][author_id] += WEIGHTS[name] * value
+    writers = set()
+    for batch in chunks(columns(scores), BATCH_SIZE):
+        writers.update(Post.objects.order_by().filter(
+            author__in=batch).values_list('author_id', flat=True).distinct())
+    result = {}
+    for user_id in user_ids:
+        skip = set(follows.get(user_id, ())) | {user_id}
+        candidates = [
+            (author_id, score)
+            for author_id, score in scores.get(user_id, {}).items()
+            if author_id in writers and author_id not in skip
+        ]
+        candidates.sort(key=lambda item: (-item[1], item[0]))
+        result[user_id] = candidates[:LIMIT]
+    return result
+
+
+def cache_key(user_id):
+    return f'posts:recommendations:{user_id}'
+
+
+def store(results):
+    with transaction.atomic():
+        Recommendation.objects.filter(user__in=list(results)).delete()
+        Recommendation.objects.bulk_create(
+            Recommendation(user_id=user_id, author_id=author_id, score=score)
+            for user_id, candidates in results.items()
+            for author_id, score in candidates
+        )
+    caches['default'].delete_many([cache_key(pk) for pk in results])
+
+
+def claim_stale(batch_size):
+    """Забирает из очереди пачку пользователей."""
+    with transaction.atomic():
+        user_ids = list(StaleRecommendation.objects.order_by(
+            'user_id').values_list('user_id', flat=True)[:batch_size])
+        StaleRecommendation.objects.filter(user__in=user_ids).delete()
+    return user_ids
+
+
+def refresh(full=False, batch_size=BATCH_SIZE):
+    """Пересчитывает рекомендации помеченных или всех пользователей.
+
+    Возвращает число пересчитанных пользователей.
+    """
+    popular = popular_in_groups()
+    total = 0
+    if full:
+        StaleRecommendation.objects.all().delete()
+        user_ids = User.objects.order_by('id').values_list(
+            'id', flat=True).iterator(chunk_size=batch_size)
+        batches = iter(lambda: list(islice(user_ids, batch_size)), [])
+    else:
+        batches = iter(lambda: claim_stale(batch_size), [])
+    for batch in batches:
+        store(compute(batch, popular))
+        total += len(batch)
+    return total
+
+
+def mark_stale(*user_ids):
+    StaleRecommendation.objects.bulk_create(
+        [StaleRecommendation(user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True)
+
+
+def follows_changed(user_id):
+    """Подписки читателя изменились.
+
+    Его подписки — второй шаг для его подписчиков, поэтому они тоже
+    помечаются, но после коммита и не больше
+    RECOMMENDATIONS_STALE_FOLLOWERS: подписчиков популярного автора
+    обновит полный прогон.
+    """
+    caches['default'].delete(cache_key(user_id))
+    mark_stale(user_id)
+    transaction.on_commit(lambda: mark_followers_stale(user_id))
+
+
+def mark_followers_stale(author_id):
+    limit = settings.RECOMMENDATIONS_STALE_FOLLOWERS
+    follower_ids = list(Follow.objects.filter(
+        author=author_id).values_list('user_id', flat=True)[:limit + 1])
+    if len(follower_ids) <= limit:
+        mark_stale(*follower_ids)
+
+
+def comments_changed(*comments):
+    """Добавлены или удалены комментарии: пары (автор, пост).
+
+    Помечаются авторы комментариев и авторы постов. Остальных собеседников
+    поста обновит полный прогон: иначе каждый комментарий к популярному
+    посту помечал бы сотни пользователей.
+    """
+    post_authors = Post.objects.filter(
+        id__in={post_id for _, post_id in comments}).values_list(
+        'author_id', flat=True)
+    mark_stale(*{author_id for author_id, _ in comments}.union(post_authors))
+
+
+def for_user(user):
+    """Рекомендованные авторы для страницы: из кэша или одним запросом."""
+    if not user.is_authenticated:
+        return []
+    cache = caches['default']
+    key = cache_key(user.id)
+    authors = cache.get(key)
+    if authors is None:
+        authors = [
+            {'username': username, 'full_name': f'{first} {last}'.strip()}
+            for username, first, last in Recommendation.objects.filter(
+                user=user).exclude(author__following__user=user).order_by(
+                '-score').values_list(
+                'author__username', 'author__first_name',
+                'author__last_name')[:LIMIT]
+        ]
+        cache.set(key, authors, settings.RECOMMENDATIONS_CACHE_TTL)
+    return authors
@@ -0,0 +1,411 @@
+"""Полнотекстовый поиск по постам и комментариям к ним.
+
+На SQLite индекс хранится в виртуальных таблицах FTS5 posts_search и
+posts_search_comments (миграции 0014 и 0018), на остальных базах или без
+FTS5 — в памяти процесса. Чужие правки индекс в памяти узнает по версии
+cache_versions.SEARCH: после коммита каждая запись меняет ее, и
+процессы с устаревшей версией перечитывают индекс из базы при следующем
+поиске. Пост и каждый его комментарий — отдельные
+документы: запись комментария не трогает ни пост, ни другие комментарии.
+Оба индекса ранжируют по BM25: score поста — сумма по терминам запроса
+BM25 его текста и его комментариев, текст поста весит вдвое больше.
+Меньший score — лучшее совпадение.
+"""
+import base64
+import math
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import islice, takewhile
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import cache_versions
+from .models import Comment, Post
+from .utils import CursorPage
+
+TABLE = 'posts_search'
+COMMENTS_TABLE = 'posts_search_comments'
+BATCH_SIZE = 1000
+# Вес текста поста и комментариев в BM25
+TEXT_WEIGHT = 2.0
+COMMENTS_WEIGHT = 1.0
+
+_index = None
+_lock = threading.Lock()
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text.lower())
+
+
+def encode_cursor(score, pk):
+    raw = f'{score!r}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора (score, id), для битого возвращает None."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        score, pk = raw.decode().rsplit('|', 1)
+        return float(score), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+class Fts5Index:
+    """Индекс в таблицах FTS5, меняется в той же транзакции, что и посты.
+
+    Тексты постов лежат в TABLE (rowid — id поста), комментарии — в
+    COMMENTS_TABLE (rowid — id комментария), поэтому комментарий
+    добавляется и удаляется одной строкой, не трогая остальные.
+    """
+
+    def index_posts(self, rows):
+        rows = list(rows)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {TABLE} WHERE rowid = %s',
+                [(pk,) for pk, _ in rows])
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (rowid, text) VALUES (%s, %s)', rows)
+
+    def index_comments(self, rows):
+        rows = list(rows)
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {COMMENTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk, _, _ in rows])
+            cursor.executemany(
+                f'INSERT INTO {COMMENTS_TABLE} (rowid, post_id, text) '
+                f'VALUES (%s, %s, %s)', rows)
+
+    def remove_comments(self, comment_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {COMMENTS_TABLE} WHERE rowid = %s',
+                [(pk,) for pk in comment_ids])
+
+    def remove(self, post_id, comment_ids=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [post_id])
+        if comment_ids:
+            self.remove_comments(comment_ids)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+            cursor.execute(f'DELETE FROM {COMMENTS_TABLE}')
+
+    def query(self, terms, after=None, limit=None):
+        # Каждый термин ищется и в постах, и в комментариях; пост
+        # подходит, если нашлись все термины, score — сумма BM25
+        parts, params = [], []
+        for number, term in enumerate(terms):
+            match = f'"{term}"*'
+            parts.append(
+                f'SELECT rowid AS post_id, {number} AS term, '
+                f'bm25({TABLE}) * %s AS score '
+                f'FROM {TABLE} WHERE {TABLE} MATCH %s')
+            parts.append(
+                f'SELECT post_id, {number}, bm25({COMMENTS_TABLE}) * %s '
+                f'FROM {COMMENTS_TABLE} WHERE {COMMENTS_TABLE} MATCH %s')
+            params += [TEXT_WEIGHT, match, COMMENTS_WEIGHT, match]
+        sql = (
+            f'SELECT post_id, score FROM ('
+            f'SELECT post_id, SUM(score) AS score '
+            f'FROM ({" UNION ALL ".join(parts)}) '
+            f'GROUP BY post_id HAVING COUNT(DISTINCT term) = %s)'
+        )
+        params.append(len(terms))
+        if after is not None:
+            sql += ' WHERE score > %s OR (score = %s AND post_id > %s)'
+            params += [after[0], after[0], after[1]]
+        sql += ' ORDER BY score, post_id'
+        if limit is not None:
+            sql += ' LIMIT %s'
+            params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class Documents:
+    """Документы одного вида в MemoryIndex: посты или комментарии."""
+
+    def __init__(self, weight):
+        self.weight = weight
+        # id -> (id поста, длина, {токен: частота})
+        self.items = {}
+        self.postings = defaultdict(set)
+        self.total_length = 0
+
+
+class MemoryIndex:
+    """Обратный индекс в памяти процесса с тем же ранжированием, что FTS5.
+
+    Заполняется из базы при первом запросе и дальше обновляется сигналами
+    этого процесса. Если версия SEARCH в кэше ушла вперед не из-за этого
+    процесса, индекс перечитывается целиком. Посты, которых уже нет в
+    базе, отсеиваются при выборке.
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.loaded = False
+            # Версия SEARCH, с которой индекс совпадает
+            self.version = None
+            self.posts = Documents(TEXT_WEIGHT)
+            self.comments = Documents(COMMENTS_WEIGHT)
+            # Отсортированный словарь обоих видов для поиска по префиксу;
+            # поддерживается вставкой, а не сортировкой на каждую запись
+            self.vocabulary = []
+
+    def ensure_loaded(self):
+        version = cache_versions.get_version(cache_versions.SEARCH)
+        with self.lock:
+            if self.loaded and self.version != version:
+                self.clear()
+            if not self.loaded:
+                self.loaded = True
+                self.version = version
+                load(self)
+
+    def advance(self, counter):
+        """Своя запись уже в индексе: версия сдвигается без перечитывания.
+
+        counter — новое значение SEARCH; если до него была чужая запись,
+        версия не совпадет, и следующий поиск перечитает индекс.
+        """
+        with self.lock:
+            head, _, current = (self.version or '').rpartition('.')
+            if self.loaded and current == str(counter - 1):
+                self.version = f'{head}.{counter}'
+
+    def _known(self, token):
+        return token in self.posts.postings or token in self.comments.postings
+
+    def _add(self, documents, pk, post_id, text):
+        self._discard(documents, pk)
+        frequencies = Counter(tokenize(text))
+        length = sum(frequencies.values())
+        documents.items[pk] = (post_id, length, frequencies)
+        documents.total_length += length
+        for token in frequencies:
+            if not self._known(token):
+                insort(self.vocabulary, token)
+            documents.postings[token].add(pk)
+
+    def _discard(self, documents, pk):
+        document = documents.items.pop(pk, None)
+        if document is None:
+            return
+        _, length, frequencies = document
+        documents.total_length -= length
+        for token in frequencies:
+            documents.postings[token].discard(pk)
+            if not documents.postings[token]:
+                del documents.postings[token]
+                if not self._known(token):
+                    del self.vocabulary[bisect_left(self.vocabulary, token)]
+
+    def index_posts(self, rows):
+        with self.lock:
+            for pk, text in rows:
+                self._add(self.posts, pk, pk, text)
+
+    def index_comments(self, rows):
+        with self.lock:
+            for pk, post_id, text in rows:
+                self._add(self.comments, pk, post_id, text)
+
+    def remove_comments(self, comment_ids):
+        with self.lock:
+            for pk in comment_ids:
+                self._discard(self.comments, pk)
+
+    def remove(self, post_id, comment_ids=()):
+        with self.lock:
+            self._discard(self.posts, post_id)
+            for pk in comment_ids:
+                self._discard(self.comments, pk)
+
+    def expand(self, term):
+        """Токены словаря, начинающиеся с term, как "term"* в FTS5."""
+        start = bisect_left(self.vocabulary, term)
+        return list(takewhile(
+            lambda token: token.startswith(term),
+            islice(self.vocabulary, start, None)))
+
+    def query(self, terms, after=None, limit=None):
+        with self.lock:
+            self.ensure_loaded()
+            return self._query(terms, after, limit)
+
+    def _score(self, documents, token, scores):
+        """Добавляет к scores взвешенный BM25 токена по документам вида."""
+        posting = documents.postings.get(token)
+        if not posting:
+            return
+        count = len(documents.items)
+        average = documents.total_length / count
+        idf = math.log(
+            (count - len(posting) + 0.5) / (len(posting) + 0.5) + 1)
+        for pk in posting:
+            post_id, length, frequencies = documents.items[pk]
+            frequency = frequencies[token]
+            scores[post_id] -= documents.weight * idf * frequency * (
+                self.k1 + 1) / (frequency + self.k1 * (
+                    1 - self.b + self.b * length / average))
+
+    def _query(self, terms, after, limit):
+        scores = None
+        for term in terms:
+            term_scores = defaultdict(float)
+            for token in self.expand(term):
+                self._score(self.posts, token, term_scores)
+                self._score(self.comments, token, term_scores)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    pk: score + term_scores[pk]
+                    for pk, score in scores.items() if pk in term_scores
+                }
+        hits = sorted(
+            (scores or {}).items(), key=lambda hit: (hit[1], hit[0]))
+        if after is not None:
+            hits = [hit for hit in hits if (hit[1], hit[0]) > after]
+        return hits[:limit] if limit is not None else hits
+
+
+def fts5_available():
+    return (connection.vendor == 'sqlite'
+            and TABLE in connection.introspection.table_names())
+
+
+def get_index():
+    """Индекс по настройке POSTS_SEARCH_BACKEND: auto, fts5 или python."""
+    global _index
+    backend = settings.POSTS_SEARCH_BACKEND
+    with _lock:
+        if _index is None or _index[0] != backend:
+            use_fts5 = backend == 'fts5' or (
+                backend == 'auto' and fts5_available())
+            _index = (backend, Fts5Index() if use_fts5 else MemoryIndex())
+        return _index[1]
+
+
+def batches(queryset, batch_size=BATCH_SIZE):
+    rows = queryset.order_by('id').iterator(chunk_size=batch_size)
+    return iter(lambda: list(islice(rows, batch_size)), [])
+
+
+def load(index, batch_size=BATCH_SIZE):
+    """Загружает в пустой индекс все посты и комментарии пачками."""
+    total = 0
+    for batch in batches(
+            Post.objects.values_list('id', 'text'), batch_size):
+        index.index_posts(batch)
+        total += len(batch)
+    for batch in batches(
+            Comment.objects.values_list('id', 'post_id', 'text'),
+            batch_size):
+        index.index_comments(batch)
+    return total
+
+
+def changed(index):
+    """После коммита сообщает другим процессам о правке индекса в памяти.
+
+    Таблицы FTS5 общие и меняются в транзакции, им это не нужно.
+    """
+    if isinstance(index, MemoryIndex):
+        transaction.on_commit(lambda: index.advance(
+            cache_versions.bump(
+                cache_versions.SEARCH)[cache_versions.SEARCH]))
+
+
+def index_post(post_id):
+    """Переиндексирует текст поста; комментарии не перечитываются."""
+    index = get_index()
+    index.index_posts(
+        Post.objects.filter(id=post_id).values_list('id', 'text'))
+    changed(index)
+
+
+def index_comments(rows):
+    """Добавляет строки (id, id поста, текст) комментариев."""
+    index = get_index()
+    index.index_comments(rows)
+    changed(index)
+
+
+def remove_comments(comment_ids):
+    index = get_index()
+    index.remove_comments(comment_ids)
+    changed(index)
+
+
+def remove_post(post_id, comment_ids=()):
+    index = get_index()
+    index.remove(post_id, comment_ids)
+    changed(index)
+
+
+def rebuild(batch_size=BATCH_SIZE):
+    index = get_index()
+    index.clear()
+    if isinstance(index, MemoryIndex):
+        # Остальные процессы перечитают индекс при следующем поиске
+        cache_versions.bump(cache_versions.SEARCH)
+        index.version = cache_versions.get_version(cache_versions.SEARCH)
+    total = load(index, batch_size)
+    if isinstance(index, MemoryIndex):
+        index.loaded = True
+    return total
+
+
+def search_ids(text, limit=None):
+    """id постов по запросу, от лучшего совпадения к худшему."""
+    terms = tokenize(text)
+    if not terms:
+        return []
+    return [pk for pk, _ in get_index().query(terms, limit=limit)]
+
+
+class SearchPaginator:
+    """Курсорные страницы выдачи поиска по ключу (score, id)."""
+
+    def __init__(self, text, per_page):
+        self.terms = tokenize(text)
+        self.per_page = per_page
+
+    def cursor_for(self, post):
+        return encode_cursor(post.search_score, post.id)
+
+    def cursor_page(self, after=None):
+        hits = []
+        if self.terms:
+            hits = get_index().query(self.terms, after, self.per_page + 1)
+        has_more = len(hits) > self.per_page
+        hits = hits[:self.per_page]
+        posts = Post.objects.feed().in_bulk([pk for pk, _ in hits])
+        items = []
+        for pk, score in hits:
+            post = posts.get(pk)
+            if post is not None:
+                post.search_score = score
+                items.append(post)
+        return CursorPage(items, self, has_more, after is not None)
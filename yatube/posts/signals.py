@@ -0,0 +1,172 @@
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+
+from . import (cache_versions, counters, feed, groups, recommendations,
+               search)
+from .models import Comment, Follow, Group, Post, User
+
+_state = threading.local()
+
+
+@contextmanager
+def muted():
+    """Отключает обработчики этого модуля в текущем потоке.
+
+    Нужно для массовой загрузки: счетчики, ленты, поиск и версии кэша
+    пересобираются один раз в конце, а не на каждую строку. Вложенный
+    вызов на выходе возвращает прежнее состояние.
+    """
+    previous = getattr(_state, 'muted', False)
+    _state.muted = True
+    try:
+        yield
+    finally:
+        _state.muted = previous
+
+
+def receiver(signal, sender):
+    """Как django.dispatch.receiver, но молчит внутри muted()."""
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(*args, **kwargs):
+            if not getattr(_state, 'muted', False):
+                handler(*args, **kwargs)
+        signal.connect(wrapper, sender=sender, weak=False)
+        return handler
+    return decorator
+
+
+def _bump_post_versions(post, *group_ids):
+    scopes = [
+        cache_versions.INDEX,
+        cache_versions.author_scope(post.author_id),
+        cache_versions.post_scope(post.id),
+    ]
+    scopes += [
+        cache_versions.group_scope(group_id)
+        for group_id in set(group_ids) if group_id
+    ]
+    cache_versions.bump(*scopes)
+
+
+@receiver(post_init, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    instance._saved_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    old_group_id = instance._saved_group_id
+    instance._saved_group_id = instance.group_id
+    if created:
+        counters.incr(counters.POSTS)
+        counters.incr(counters.author_posts_key(instance.author_id))
+        if instance.group_id:
+            counters.incr(counters.group_posts_key(instance.group_id))
+            groups.post_added(instance.group_id, instance.pub_date)
+        feed.fan_out(instance)
+    elif old_group_id != instance.group_id:
+        if old_group_id:
+            counters.incr(counters.group_posts_key(old_group_id), -1)
+            groups.refresh_last_post(old_group_id)
+        if instance.group_id:
+            counters.incr(counters.group_posts_key(instance.group_id))
+            groups.post_added(instance.group_id, instance.pub_date)
+    search.index_post(instance.id)
+    _bump_post_versions(instance, old_group_id, instance.group_id)
+
+
+def _deleting_posts():
+    """id удаляемых в этом потоке постов -> id их удаленных комментариев."""
+    if not hasattr(_state, 'deleting_posts'):
+        _state.deleting_posts = {}
+    return _state.deleting_posts
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    # Каскад удаляет комментарии раньше поста; их обработчики только
+    # запоминают id, а счетчик и поиск post_deleted чистит один раз
+    _deleting_posts()[instance.id] = []
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    comment_ids = _deleting_posts().pop(instance.id, ())
+    counters.incr(counters.POSTS, -1)
+    counters.incr(counters.author_posts_key(instance.author_id), -1)
+    if instance.group_id:
+        counters.incr(counters.group_posts_key(instance.group_id), -1)
+        groups.refresh_last_post(instance.group_id)
+    counters.forget(counters.post_comments_key(instance.id))
+    search.remove_post(instance.id, comment_ids)
+    _bump_post_versions(instance, instance.group_id)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    groups.forget(instance)
+    cache_versions.bump(
+        cache_versions.INDEX, cache_versions.group_scope(instance.id))
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    groups.forget(instance)
+    counters.forget(counters.group_posts_key(instance.id))
+    cache_versions.bump(
+        cache_versions.INDEX, cache_versions.group_scope(instance.id))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.incr(counters.post_comments_key(instance.post_id))
+        recommendations.comments_changed(
+            (instance.author_id, instance.post_id))
+    search.index_comments(
+        [(instance.id, instance.post_id, instance.text)])
+    cache_versions.bump(cache_versions.comments_scope(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    deleted = _deleting_posts().get(instance.post_id)
+    if deleted is not None:
+        deleted.append(instance.id)
+        return
+    counters.incr(counters.post_comments_key(instance.post_id), -1)
+    recommendations.comments_changed((instance.author_id, instance.post_id))
+    search.remove_comments([instance.id])
+    cache_versions.bump(cache_versions.comments_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.incr(counters.author_followers_key(instance.author_id))
+        feed.backfill(instance.user_id, instance.author_id)
+        recommendations.follows_changed(instance.user_id)
+    cache_versions.bump(cache_versions.follows_scope(instance.user_id))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.incr(counters.author_followers_key(instance.author_id), -1)
+    feed.prune(instance.user_id, instance.author_id)
+    feed.followers_dropped(instance.author_id)
+    recommendations.follows_changed(instance.user_id)
+    cache_versions.bump(cache_versions.follows_scope(instance.user_id))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, update_fields=None, **kwargs):
+    # Вход на сайт обновляет только last_login, ленты от этого не меняются
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    cache_versions.bump(
+        cache_versions.INDEX, cache_versions.author_scope(instance.id))
@@ -0,0 +1,24 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail_url(image, geometry):
+    """Адрес готовой миниатюры, а пока ее нет — адрес оригинала."""
+    if not image:
+        return ''
+    thumbnail = thumbnails.cached_thumbnail(image, geometry)
+    if thumbnail is None:
+        thumbnails.schedule_image(image.name)
+        return image.url
+    return thumbnail.url
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts, geometry):
+    """Готовит миниатюры всех постов страницы одним запросом к kvstore."""
+    thumbnails.prefetch([post.image for post in posts], geometry)
+    return ''
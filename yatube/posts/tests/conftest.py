@@ -0,0 +1 @@
+from core.pytest_plugin import n_plus_one_guard  # noqa: F401
@@ -0,0 +1,123 @@
+import json
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import counters
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiViewsTest(TestCase):
+    """Проверка JSON API лент."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='VasyaVasyev')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for number in range(13):
+            cls.post = Post.objects.create(
+                author=cls.author,
+                text=f'Тестовый пост {number}',
+                group=cls.group,
+            )
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        counters.rebuild()
+
+    def setUp(self):
+        caches['fragments'].clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get_json(self, url, client=None, **params):
+        response = (client or self.client).get(url, params)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response, json.loads(response.content)
+
+    def test_feeds(self):
+        """Ленты отдают посты, счетчик и курсор следующей страницы"""
+        urls = (
+            reverse('posts:api_home'),
+            reverse('posts:api_group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:api_profile', kwargs={'username': 'VasyaVasyev'}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response, data = self.get_json(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(data['count'], 13)
+                self.assertEqual(len(data['results']), 10)
+                self.assertIsNone(data['previous'])
+                self.assertEqual(data['results'][0], {
+                    'id': self.post.id,
+                    'text': self.post.text,
+                    'pub_date': data['results'][0]['pub_date'],
+                    'author': 'VasyaVasyev',
+                    'group': {'slug': 'test-slug', 'title': 'Тестовая группа'},
+                    'image': None,
+                })
+                _, data = self.get_json(url, after=data['next'])
+                self.assertEqual(len(data['results']), 3)
+                self.assertIsNone(data['next'])
+
+    def test_post_detail(self):
+        """Пост отдается вместе с комментариями и счетчиками"""
+        _, data = self.get_json(
+            reverse('posts:api_post_detail', kwargs={'post_id': self.post.id}))
+        self.assertEqual(data['text'], self.post.text)
+        self.assertEqual(data['author_posts'], 13)
+        self.assertEqual(data['comments_count'], 1)
+        self.assertEqual(data['comments'][0]['author'], 'Reader')
+
+    def test_json_format(self):
+        """Компактный JSON с датами DjangoJSONEncoder"""
+        response = self.client.get(
+            reverse('posts:api_post_detail', kwargs={'post_id': self.post.id}))
+        self.assertIn(b'"id":', response.content)
+        self.assertNotIn(b'": ', response.content)
+        self.assertEqual(
+            json.loads(response.content)['pub_date'],
+            DjangoJSONEncoder().default(self.post.pub_date))
+
+    def test_follow_index(self):
+        """Лента подписок требует авторизации"""
+        url = reverse('posts:api_follow_index')
+        response, data = self.get_json(url)
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        response, data = self.get_json(url, client=self.reader_client)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(data['results'][0]['id'], self.post.id)
+
+    def test_not_found(self):
+        """Несуществующие группа, автор и пост дают 404 в JSON"""
+        urls = (
+            reverse('posts:api_group_list', kwargs={'slug': 'no-group'}),
+            reverse('posts:api_profile', kwargs={'username': 'nobody'}),
+            reverse('posts:api_post_detail', kwargs={'post_id': 0}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response, data = self.get_json(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertIn('detail', data)
+
+    def test_num_queries(self):
+        """Лента API — выборка и счетчик, повтор отдается из кэша"""
+        url = reverse('posts:api_home')
+        with self.assertNumQueries(2):
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'application/json')
@@ -0,0 +1,56 @@
+from django.core.cache import caches
+from django.test import TestCase
+
+from .. import benchmark
+from ..models import Comment, Follow, Group, Post, User
+
+
+class BenchmarkTest(TestCase):
+    """Проверка генерации данных и прогона страниц."""
+
+    def test_seed(self):
+        """Засев создает заданное число строк и пересобирает счетчики"""
+        dataset = benchmark.seed(
+            users=5, groups=2, posts=30, comments=20, follows=6)
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 20)
+        self.assertEqual(Follow.objects.count(), dataset['follows'])
+
+    def test_run_covers_all_routes(self):
+        """Прогон меряет каждый маршрут posts, users и about"""
+        benchmark.seed(users=3, groups=1, posts=5, comments=5, follows=2)
+        results = benchmark.run(iterations=2, warmup=0)
+        routes = {item['route'] for item in results}
+        for route in ('posts:home', 'posts:post_edit', 'posts:api_home',
+                      'users:password_reset_confirm', 'about:tech'):
+            with self.subTest(route=route):
+                self.assertIn(route, routes)
+        home = next(
+            item for item in results
+            if item['route'] == 'posts:home' and item['client'] == 'anonymous')
+        self.assertEqual(home['statuses'], [200])
+        self.assertGreater(home['bytes'], 0)
+        self.assertLessEqual(home['p50_ms'], home['max_ms'])
+
+    def test_isolated_keeps_configured_caches(self):
+        """Засев и --cold чистят только свои кэши, настроенные не трогают"""
+        for alias in ('default', 'fragments'):
+            caches[alias].set('production-key', alias)
+        with benchmark.isolated():
+            for alias in ('default', 'fragments'):
+                self.assertEqual(
+                    caches[alias].__class__.__name__, 'LocMemCache')
+                self.assertIsNone(caches[alias].get('production-key'))
+            benchmark.seed(users=2, groups=1, posts=3, comments=2, follows=1)
+            benchmark.run(iterations=1, warmup=0, cold=True)
+        for alias in ('default', 'fragments'):
+            with self.subTest(alias=alias):
+                self.assertEqual(caches[alias].get('production-key'), alias)
+
+    def test_percentile(self):
+        """Перцентили считаются с интерполяцией"""
+        values = [1.0, 2.0, 3.0, 4.0]
+        self.assertEqual(benchmark.percentile(values, 50), 2.5)
+        self.assertEqual(benchmark.percentile(values, 100), 4.0)
@@ -1,34 +1,48 @@
+from http import HTTPStatus
+
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
-from django.test import Client, TestCase
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Post
+from ..models import Comment, Group, Post
 
 User = get_user_model()
 
 
 class CacheViewsTest(TestCase):
-    """Проверка хранения и очищения кэша для index."""
+    """Проверка хранения и сброса кэша лент по версиям."""
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
         cls.user = User.objects.create_user(username='VasyaVasyev')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
 
     def setUp(self):
+        caches['fragments'].clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
         self.post = Post.objects.create(
             author=self.user,
-            text='Тестовый пост')
+            text='Тестовый пост',
+            group=self.group)
+        self.urls = (
+            reverse('posts:home'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        )
 
     def test_cache_index(self):
+        """Фрагмент отдается из кэша, пока версия ленты не сменилась"""
         response = self.authorized_client.get(reverse('posts:home'))
         posts = response.content
-        Post.objects.create(
-            text='Тестовый пост 2',
-            author=self.user,
-        )
+        Post.objects.filter(id=self.post.id).update(text='Без сигналов')
         response_old = self.authorized_client.get(
             reverse('posts:home')
         )
@@ -38,7 +52,134 @@ class CacheViewsTest(TestCase):
             posts,
             'Не возвращает кэшированную страницу.'
         )
-        cache.clear()
+        caches['fragments'].clear()
         response_new = self.authorized_client.get(reverse('posts:home'))
         new_posts = response_new.content
         self.assertNotEqual(old_posts, new_posts, 'Нет сброса кэша.')
+
+    def test_cache_hit_skips_feed_query(self):
+        """При попадании в кэш фрагмента посты ленты не читаются"""
+        for cursor in (False, True):
+            with self.subTest(cursor=cursor), override_settings(
+                    POSTS_CURSOR_PAGINATION=cursor):
+                for url in self.urls:
+                    self.authorized_client.get(url)
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.authorized_client.get(url)
+                    self.assertContains(response, 'Тестовый пост')
+                    self.assertFalse([
+                        query['sql'] for query in queries
+                        if 'FROM "posts_post"' in query['sql']
+                    ])
+
+    def test_new_post_bumps_feeds(self):
+        """Новый пост сразу виден в общей ленте, группе и профиле"""
+        for url in self.urls:
+            self.authorized_client.get(url)
+        Post.objects.create(
+            text='Тестовый пост 2',
+            author=self.user,
+            group=self.group,
+        )
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Тестовый пост 2')
+
+    def test_edit_and_delete_bump_feeds(self):
+        """Правка и удаление поста сбрасывают фрагменты лент"""
+        for url in self.urls:
+            self.authorized_client.get(url)
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Исправленный пост')
+        self.post.delete()
+        for url in self.urls[::2]:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertNotContains(response, 'Исправленный пост')
+
+    def test_comment_does_not_bump_feeds(self):
+        """Комментарий не сбрасывает кэш общей ленты"""
+        self.authorized_client.get(reverse('posts:home'))
+        Post.objects.filter(id=self.post.id).update(text='Без сигналов')
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        response = self.authorized_client.get(reverse('posts:home'))
+        self.assertContains(response, 'Тестовый пост')
+
+    def test_post_detail_fragments(self):
+        """Тело поста и комментарии кэшируются и сбрасываются отдельно"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.authorized_client.get(url)
+        with self.assertNumQueries(2):
+            self.authorized_client.get(url)
+        Post.objects.filter(id=self.post.id).update(text='Без сигналов')
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Новый комментарий')
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Тестовый пост')
+        self.assertContains(response, 'Новый комментарий')
+        self.post.text = 'Исправленный пост'
+        self.post.save()
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Исправленный пост')
+
+
+class ConditionalGetTest(TestCase):
+    """Проверка ETag/Last-Modified для анонимных читателей."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='VasyaVasyev')
+
+    def setUp(self):
+        caches['fragments'].clear()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тестовый пост')
+        self.urls = (
+            reverse('posts:home'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+        )
+
+    def test_not_modified(self):
+        """Повторный запрос с валидаторами получает 304"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                self.assertTrue(response.has_header('Last-Modified'))
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_change_updates_etag(self):
+        """После правки поста ETag меняется и страница отдается целиком"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                self.post.text = f'Исправлено для {url}'
+                self.post.save()
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertContains(response, f'Исправлено для {url}')
+
+    def test_cached_response_skips_feed_queries(self):
+        """Неизменная страница отдается из кэша без запросов ленты"""
+        self.client.get(self.urls[0])
+        with self.assertNumQueries(0):
+            response = self.client.get(self.urls[0])
+        self.assertContains(response, 'Тестовый пост')
+
+    def test_authorized_user_gets_no_etag(self):
+        """Авторизованный пользователь получает страницу без валидаторов"""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(self.urls[0])
+        self.assertFalse(response.has_header('ETag'))
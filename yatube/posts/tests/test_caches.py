@@ -0,0 +1,149 @@
+import socketserver
+import tempfile
+import threading
+import unittest
+
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.memcached import MemcachedCache
+from django.test import SimpleTestCase, TestCase
+
+from yatube.caches import CACHE_ALIASES, build_caches
+
+from .. import cache_versions
+
+try:
+    import memcache
+except ImportError:
+    memcache = None
+
+
+class MemcachedStandIn(socketserver.StreamRequestHandler):
+    """Текстовый протокол memcached в объеме, нужном MemcachedCache."""
+
+    def handle(self):
+        data = self.server.data
+        for line in self.rfile:
+            command, *args = line.decode().split()
+            if command in ('set', 'add'):
+                key, flags, _, size = args[:4]
+                value = self.rfile.read(int(size) + 2)[:-2]
+                if command == 'add' and key in data:
+                    self.wfile.write(b'NOT_STORED\r\n')
+                    continue
+                data[key] = (flags, value)
+                self.wfile.write(b'STORED\r\n')
+            elif command == 'get':
+                for key in args:
+                    if key in data:
+                        flags, value = data[key]
+                        self.wfile.write(
+                            f'VALUE {key} {flags} {len(value)}\r\n'.encode()
+                            + value + b'\r\n')
+                self.wfile.write(b'END\r\n')
+            elif command == 'delete':
+                found = data.pop(args[0], None) is not None
+                self.wfile.write(b'DELETED\r\n' if found
+                                 else b'NOT_FOUND\r\n')
+            elif command == 'flush_all':
+                data.clear()
+                self.wfile.write(b'OK\r\n')
+            else:
+                self.wfile.write(b'ERROR\r\n')
+
+
+def start_memcached():
+    server = socketserver.ThreadingTCPServer(
+        ('127.0.0.1', 0), MemcachedStandIn)
+    server.daemon_threads = True
+    server.data = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class CacheSettingsTest(SimpleTestCase):
+    def test_default_backend_is_separate_locmem(self):
+        """По умолчанию у каждого псевдонима свой LocMemCache"""
+        caches = build_caches('/srv', environ={})
+        self.assertEqual(set(caches), set(CACHE_ALIASES))
+        locations = {config['LOCATION'] for config in caches.values()}
+        self.assertEqual(len(locations), len(CACHE_ALIASES))
+
+    def test_memcached_aliases_share_server(self):
+        """Все псевдонимы на сервере CACHE_LOCATION, ключи не пересекаются"""
+        caches = build_caches('/srv', environ={
+            'CACHE_BACKEND': 'memcached',
+            'CACHE_LOCATION': '10.0.0.1:11211',
+            'CACHE_LOCATION_FRAGMENTS': '10.0.0.2:11211',
+        })
+        self.assertEqual(caches['default']['LOCATION'], '10.0.0.1:11211')
+        self.assertEqual(caches['sessions']['LOCATION'], '10.0.0.1:11211')
+        self.assertEqual(caches['fragments']['LOCATION'], '10.0.0.2:11211')
+        keys = {
+            BaseCache(config).make_key('page') for config in caches.values()}
+        self.assertEqual(len(keys), len(CACHE_ALIASES))
+
+    def test_redis_database_per_alias(self):
+        """Базы Redis отсчитываются от номера из CACHE_LOCATION"""
+        for location, first in (('redis://:secret@10.0.0.1:6380/5', 5),
+                                ('redis://10.0.0.1:6380', 0)):
+            caches = build_caches('/srv', environ={
+                'CACHE_BACKEND': 'redis',
+                'CACHE_LOCATION': location,
+            })
+            host = location.rsplit('/', 1)[0] if first else location
+            with self.subTest(location=location):
+                self.assertEqual(
+                    [caches[alias]['LOCATION'] for alias in CACHE_ALIASES], [
+                        f'{host}/{first + number}'
+                        for number in range(len(CACHE_ALIASES))
+                    ])
+
+    @unittest.skipIf(memcache is None, 'нужен python-memcached')
+    def test_memcached_aliases_on_one_server(self):
+        """Псевдонимы на одном memcached не перетирают ключи друг друга"""
+        server = start_memcached()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        config = build_caches('/srv', environ={
+            'CACHE_BACKEND': 'memcached',
+            'CACHE_LOCATION': '%s:%s' % server.server_address,
+        })
+        sessions, fragments = (
+            MemcachedCache(config[alias]['LOCATION'], config[alias])
+            for alias in ('sessions', 'fragments'))
+        sessions.set('page', 'session')
+        fragments.set('page', 'html')
+        self.assertEqual(sessions.get('page'), 'session')
+        self.assertEqual(fragments.get('page'), 'html')
+
+    def test_unknown_backend(self):
+        """Неизвестное хранилище сразу дает ошибку"""
+        with self.assertRaises(ValueError):
+            build_caches('/srv', environ={'CACHE_BACKEND': 'nosuch'})
+
+    def test_file_backend_is_shared_between_processes(self):
+        """Файловый кэш виден всем процессам одной машины"""
+        with tempfile.TemporaryDirectory() as directory:
+            config = build_caches('/srv', environ={
+                'CACHE_BACKEND': 'file',
+                'CACHE_LOCATION': directory,
+            })['fragments']
+            params = {'KEY_PREFIX': config['KEY_PREFIX']}
+            first_worker = FileBasedCache(config['LOCATION'], params)
+            second_worker = FileBasedCache(config['LOCATION'], params)
+            first_worker.set('index_page', 'html')
+            self.assertEqual(second_worker.get('index_page'), 'html')
+
+
+class CacheVersionsResetTest(TestCase):
+    def test_reset_keeps_other_keys(self):
+        """Сброс версий лент не чистит хранилище целиком"""
+        cache = caches['fragments']
+        version = cache_versions.get_version(cache_versions.INDEX)
+        cache.set('not-a-feed-key', 'value')
+        cache_versions.reset()
+        self.assertNotEqual(
+            cache_versions.get_version(cache_versions.INDEX), version)
+        self.assertEqual(cache.get('not-a-feed-key'), 'value')
@@ -0,0 +1,149 @@
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import comment_queue, counters
+from ..models import Comment, Post
+
+User = get_user_model()
+
+SPOOL_DIR = tempfile.mkdtemp()
+
+
+@override_settings(
+    COMMENT_QUEUE_ENABLED=True, COMMENT_QUEUE_BATCH_SIZE=3,
+    COMMENT_QUEUE_FLUSH_MS=0, COMMENT_QUEUE_SPOOL_DIR=SPOOL_DIR)
+class CommentQueueTest(TestCase):
+    """Отложенная запись комментариев пачками."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(SPOOL_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        caches['fragments'].clear()
+        comment_queue.flush()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def comment(self, text):
+        return self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': text})
+
+    def spool_files(self):
+        return sorted(
+            name for name in os.listdir(SPOOL_DIR) if name.endswith('.jsonl'))
+
+    def test_comments_wait_for_batch(self):
+        """Комментарии копятся в спуле и пишутся одной пачкой."""
+        counters.post_comments(self.post.id)
+        self.comment('Первый')
+        self.comment('Второй')
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(len(self.spool_files()), 1)
+        self.comment('Третий')
+        self.assertEqual(
+            set(Comment.objects.values_list('text', flat=True)),
+            {'Первый', 'Второй', 'Третий'})
+        self.assertEqual(counters.post_comments(self.post.id), 3)
+        self.assertEqual(self.spool_files(), [])
+
+    def test_author_sees_queued_comment(self):
+        """Автор видит свой комментарий до записи, другие — после."""
+        self.comment('Еще в очереди')
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.id})
+        self.assertContains(self.client.get(url), 'Еще в очереди')
+        self.assertNotContains(Client().get(url), 'Еще в очереди')
+        comment_queue.flush()
+        self.assertContains(Client().get(url), 'Еще в очереди')
+        response = self.client.get(url)
+        self.assertEqual(response.context['queued_comments'], [])
+        self.assertContains(response, 'Еще в очереди', count=1)
+        self.assertNotIn(comment_queue.SESSION_KEY, self.client.session)
+
+    def test_replay_spool_of_dead_process(self):
+        """Спул упавшего процесса дописывается один раз и с его датами."""
+        created = timezone.now() - timedelta(hours=1)
+        item = {
+            'id': uuid.uuid4().hex,
+            'post_id': self.post.id,
+            'author_id': self.reader.id,
+            'text': 'Из спула',
+            'created': created.isoformat(),
+        }
+        path = os.path.join(SPOOL_DIR, 'spool-deadbeef.jsonl')
+        with open(path, 'w', encoding='utf-8') as spool:
+            spool.write(json.dumps(item) + '\n')
+            spool.write('{"id": "недописан')
+        out = StringIO()
+        with self.assertLogs('posts.comment_queue', 'WARNING'):
+            call_command('replay_comments', stdout=out)
+        self.assertIn('Записано комментариев: 1', out.getvalue())
+        comment = Comment.objects.get()
+        self.assertEqual(comment.text, 'Из спула')
+        self.assertEqual(comment.created, created)
+        self.assertEqual(self.spool_files(), [])
+        self.assertEqual(comment_queue.save([item]), 0)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_replay_skips_live_owner(self):
+        """Спул процесса, который держит свой замок, не трогается."""
+        item = {
+            'id': uuid.uuid4().hex,
+            'post_id': self.post.id,
+            'author_id': self.reader.id,
+            'text': 'Чужой спул',
+            'created': timezone.now().isoformat(),
+        }
+        with open(os.path.join(SPOOL_DIR, 'spool-alive.jsonl'), 'w') as f:
+            f.write(json.dumps(item) + '\n')
+        with open(os.path.join(SPOOL_DIR, 'alive.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self.assertEqual(comment_queue.replay(), 0)
+            self.assertIn('spool-alive.jsonl', self.spool_files())
+        self.assertEqual(comment_queue.replay(), 1)
+        self.assertFalse(os.path.exists(os.path.join(SPOOL_DIR, 'alive.lock')))
+
+    def test_replay_starts_with_app(self):
+        """Спулы дописываются при старте приложения, а не с комментарием."""
+        with mock.patch.object(comment_queue.threading, 'Thread') as thread:
+            apps.get_app_config('posts').ready()
+            with override_settings(COMMENT_QUEUE_ENABLED=False):
+                apps.get_app_config('posts').ready()
+        thread.assert_called_once_with(
+            target=comment_queue._replay_in_worker, name='comment-replay',
+            daemon=True)
+        thread.return_value.start.assert_called_once_with()
+
+    def test_comments_to_deleted_post_are_dropped(self):
+        """Пачка не падает, если пост успели удалить."""
+        post = Post.objects.create(author=self.author, text='Удалю')
+        comment_queue.enqueue(post.id, self.reader.id, 'Пропадет')
+        comment_queue.enqueue(self.post.id, self.reader.id, 'Останется')
+        post.delete()
+        self.assertEqual(comment_queue.flush(), 1)
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['Останется'])
@@ -0,0 +1,83 @@
+import json
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PER_PAGE=10)
+class CommentPagesTest(TestCase):
+    """Комментарии к посту выдаются курсорными пачками."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='VasyaVasyev')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.author, text=f'Комментарий {n}')
+            for n in range(25))
+        cls.ids = list(Comment.objects.order_by(
+            '-created', '-id').values_list('id', flat=True))
+
+    def setUp(self):
+        caches['fragments'].clear()
+
+    def test_post_detail_shows_first_page(self):
+        """На странице поста — только свежие комментарии и ссылка дальше"""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id]))
+        comments = response.context['comments']
+        self.assertEqual([comment.id for comment in comments], self.ids[:10])
+        self.assertContains(response, 'js-more-comments')
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id]),
+            {'after': comments.next_cursor})
+        self.assertEqual(
+            [comment.id for comment in response.context['comments']],
+            self.ids[10:20])
+
+    def test_fragment_walks_all_comments(self):
+        """Фрагменты по очереди отдают все комментарии ровно один раз"""
+        url = reverse('posts:post_comments', args=[self.post.id])
+        seen, after = [], ''
+        while True:
+            with self.assertNumQueries(3):
+                response = self.client.get(url, {'after': after})
+            self.assertTemplateUsed(response, 'posts/includes/comments.html')
+            page = response.context['comments']
+            seen += [comment.id for comment in page]
+            if not page.next_cursor:
+                self.assertNotContains(response, 'js-more-comments')
+                break
+            after = page.next_cursor
+        self.assertEqual(seen, self.ids)
+
+    def test_fragment_for_missing_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.id + 1]))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_api_comments(self):
+        """JSON-версия отдает те же пачки с курсором следующей"""
+        detail = json.loads(self.client.get(
+            reverse('posts:api_post_detail', args=[self.post.id])).content)
+        self.assertEqual(
+            [comment['id'] for comment in detail['comments']],
+            self.ids[:10])
+        data = json.loads(self.client.get(
+            reverse('posts:api_post_comments', args=[self.post.id]),
+            {'after': detail['comments_next']}).content)
+        self.assertEqual(
+            [comment['id'] for comment in data['results']], self.ids[10:20])
+        self.assertEqual(data['results'][0]['author'], 'VasyaVasyev')
+        last = json.loads(self.client.get(
+            reverse('posts:api_post_comments', args=[self.post.id]),
+            {'after': data['next']}).content)
+        self.assertEqual(len(last['results']), 5)
+        self.assertIsNone(last['next'])
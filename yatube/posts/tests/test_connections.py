@@ -0,0 +1,45 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.db import check_connections
+from yatube.databases import build_databases
+
+
+class ConnectionSettingsTest(SimpleTestCase):
+    def test_conn_max_age(self):
+        """Время жизни соединения задается окружением для всех баз"""
+        databases = build_databases('/srv', environ={
+            'DATABASE_CONN_MAX_AGE': '300',
+            'DATABASE_REPLICAS': '/srv/replica.sqlite3',
+        })
+        self.assertEqual(databases['default']['CONN_MAX_AGE'], 300)
+        self.assertEqual(databases['replica1']['CONN_MAX_AGE'], 300)
+
+    def test_persistent_by_default(self):
+        databases = build_databases('/srv', environ={})
+        self.assertGreater(databases['default']['CONN_MAX_AGE'], 0)
+
+
+class ConnectionSetupTest(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_sqlite_pragmas(self):
+        """Прагмы выставлены при подключении"""
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('cache_size'), -20000)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+
+    def test_unusable_connection_is_closed(self):
+        """Оборванное соединение закрывается в начале запроса"""
+        connection.ensure_connection()
+        with mock.patch.object(connection, 'is_usable', return_value=False):
+            with mock.patch.object(connection, 'close') as close:
+                check_connections(sender=None)
+                with override_settings(DATABASE_HEALTH_CHECKS=False):
+                    check_connections(sender=None)
+        close.assert_called_once_with()
@@ -0,0 +1,96 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import counters
+from ..models import Comment, Counter, Group, Post
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='CounterUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тестовый пост',
+            group=self.group,
+        )
+
+    def test_incr_during_first_count_is_kept(self):
+        """Пост, созданный во время первого подсчета, не теряется"""
+        posts = Post.objects.filter(author=self.user)
+        stale = posts.count()
+
+        def count():
+            # Первый подсчет: пост появляется, когда строки еще нет
+            if not Post.objects.filter(text='Гонка').exists():
+                Post.objects.create(author=self.user, text='Гонка')
+                return stale
+            return posts.count()
+
+        key = counters.author_posts_key(self.user.id)
+        counters.get_count(key, mock.Mock(count=count))
+        self.assertEqual(counters.author_posts(self.user.id), stale + 1)
+        self.assertEqual(Counter.objects.get(key=key).value, stale + 1)
+
+    def test_counters_follow_posts(self):
+        """Счетчики меняются при создании, переносе и удалении поста"""
+        self.assertEqual(counters.total_posts(), 1)
+        self.assertEqual(counters.author_posts(self.user.id), 1)
+        self.assertEqual(counters.group_posts(self.group.id), 1)
+        Post.objects.create(author=self.user, text='Второй пост')
+        self.assertEqual(counters.total_posts(), 2)
+        self.assertEqual(counters.author_posts(self.user.id), 2)
+        self.post.group = self.other_group
+        self.post.save()
+        self.assertEqual(counters.group_posts(self.group.id), 0)
+        self.assertEqual(counters.group_posts(self.other_group.id), 1)
+        self.post.delete()
+        self.assertEqual(counters.total_posts(), 1)
+        self.assertEqual(counters.group_posts(self.other_group.id), 0)
+
+    def test_counters_follow_comments(self):
+        """Счетчик комментариев поста меняется при добавлении и удалении"""
+        self.assertEqual(counters.post_comments(self.post.id), 0)
+        comment = Comment.objects.create(
+            post=self.post, author=self.user, text='Комментарий')
+        self.assertEqual(counters.post_comments(self.post.id), 1)
+        comment.delete()
+        self.assertEqual(counters.post_comments(self.post.id), 0)
+
+    def test_paginator_reads_counter(self):
+        """Пагинатор берет число постов из счетчика, а не из COUNT(*)"""
+        counters.total_posts()
+        Counter.objects.filter(key=counters.POSTS).update(value=42)
+        response = Client().get(reverse('posts:home'))
+        self.assertEqual(response.context['page_obj'].paginator.count, 42)
+
+    def test_rebuild_counters(self):
+        """Команда rebuild_counters чинит разъехавшиеся счетчики"""
+        counters.total_posts()
+        Post.objects.bulk_create([
+            Post(author=self.user, text='Без сигналов'),
+        ])
+        self.assertEqual(counters.total_posts(), 1)
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(counters.total_posts(), 2)
+        self.assertEqual(counters.author_posts(self.user.id), 2)
@@ -0,0 +1,124 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import feed
+from ..models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+@override_settings(FEED_INBOX_ENABLED=True, FEED_CELEBRITY_THRESHOLD=1)
+class FeedInboxTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.other_reader = User.objects.create_user(username='OtherReader')
+        cls.author = User.objects.create_user(username='Author')
+        cls.celebrity = User.objects.create_user(username='Celebrity')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.old_post = Post.objects.create(
+            author=self.author, text='Старый пост')
+
+    def follow_page(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка добавляет старые посты в ленту, отписка убирает"""
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.assertEqual(self.follow_page(), [self.old_post])
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username]))
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.follow_page(), [])
+
+    def test_new_post_fans_out(self):
+        """Новый пост раскладывается по лентам подписчиков"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.follow_page(), [post, self.old_post])
+
+    def test_celebrity_posts_are_pulled(self):
+        """Посты популярного автора не раскладываются, но видны в ленте"""
+        Follow.objects.create(user=self.reader, author=self.celebrity)
+        Follow.objects.create(user=self.other_reader, author=self.celebrity)
+        post = Post.objects.create(author=self.celebrity, text='Пост звезды')
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.follow_page(), [post])
+
+    def test_rebuild_feed(self):
+        """Команда rebuild_feed заполняет ленты с нуля"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feed', stdout=StringIO())
+        self.assertEqual(self.follow_page(), [self.old_post])
+        with override_settings(FEED_INBOX_ENABLED=False):
+            with self.assertRaises(CommandError):
+                call_command('rebuild_feed', stdout=StringIO())
+
+    @override_settings(POSTS_CURSOR_PAGINATION=True)
+    def test_pages_are_read_from_inbox(self):
+        """Лента листается по дате из FeedEntry, без сортировки постов"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [self.old_post] + [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(11)
+        ]
+        entry = FeedEntry.objects.get(user=self.reader, post=self.old_post)
+        self.assertEqual(entry.pub_date, self.old_post.pub_date)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), posts[:1:-1])
+        response = self.client.get(reverse('posts:follow_index'), {
+            'after': response.context['page_obj'].next_cursor})
+        self.assertEqual(list(response.context['page_obj']), posts[1::-1])
+
+    def test_posts_fan_out_when_author_drops_below_threshold(self):
+        """Посты звезды попадают в ленты, когда подписчиков становится мало"""
+        Follow.objects.create(user=self.reader, author=self.celebrity)
+        follow = Follow.objects.create(
+            user=self.other_reader, author=self.celebrity)
+        post = Post.objects.create(author=self.celebrity, text='Пост звезды')
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        callbacks = []
+        with mock.patch('posts.feed.transaction.on_commit',
+                        callbacks.append):
+            follow.delete()
+        # Раскладка идет после коммита, а не в запросе отписки
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        for callback in callbacks:
+            callback()
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.follow_page(), [post])
+
+    def test_rebuild_does_not_send_id_lists(self):
+        """Пересборка не передает в SQL списки id авторов"""
+        for number in range(3):
+            author = User.objects.create_user(username=f'Writer{number}')
+            Follow.objects.create(user=self.reader, author=author)
+            Post.objects.create(author=author, text='Пост')
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(feed.rebuild(), 3)
+        selects = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertIn('IN (SELECT', selects[0])
@@ -0,0 +1,140 @@
+import json
+import tempfile
+from http import HTTPStatus
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import cache_versions, counters, follows, signals
+from ..models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+@override_settings(FEED_INBOX_ENABLED=True, FOLLOW_BATCH_LIMIT=5)
+class BatchFollowTest(TestCase):
+    """Пакетная подписка и отписка через API."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.authors = [
+            User.objects.create_user(username=f'Author{number}')
+            for number in range(3)
+        ]
+        for author in cls.authors:
+            Post.objects.create(author=author, text='Тестовый пост')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def post_json(self, name, usernames):
+        response = self.client.post(
+            reverse(f'posts:{name}'),
+            json.dumps({'usernames': usernames}),
+            content_type='application/json')
+        return response, json.loads(response.content)
+
+    def test_follow_many(self):
+        """Подписка на всех одной пачкой, с лентой и счетчиками"""
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        follower_counts = [
+            counters.author_followers(author.id) for author in self.authors]
+        version = cache_versions.get_version(
+            cache_versions.follows_scope(self.reader.id))
+        response, data = self.post_json('api_follow_many', [
+            'Author0', 'Author1', 'Author2', 'Author1', 'Reader', 'Nobody'])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(data, {
+            'following': ['Author0', 'Author1', 'Author2'],
+            'not_following': [],
+            'not_found': ['Nobody'],
+        })
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader).count(), 3)
+        self.assertFalse(
+            Follow.objects.filter(user=self.reader, author=self.reader))
+        self.assertEqual(
+            [counters.author_followers(author.id) for author in self.authors],
+            [follower_counts[0], follower_counts[1] + 1,
+             follower_counts[2] + 1])
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 3)
+        self.assertNotEqual(version, cache_versions.get_version(
+            cache_versions.follows_scope(self.reader.id)))
+
+    def test_unfollow_many(self):
+        for author in self.authors[:2]:
+            self.client.get(
+                reverse('posts:profile_follow', args=[author.username]))
+        response = self.client.post(
+            reverse('posts:api_unfollow_many'),
+            {'usernames': ['Author0', 'Author1', 'Author2']})
+        data = json.loads(response.content)
+        self.assertEqual(
+            data['not_following'], ['Author0', 'Author1', 'Author2'])
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(counters.author_followers(self.authors[0].id), 0)
+
+    def test_unfollow_many_is_one_delete(self):
+        """Отписка от пачки авторов — один DELETE, без чтения строк"""
+        follows.follow_many(self.reader, ['Author0', 'Author1', 'Author2'])
+        with CaptureQueriesContext(connection) as context:
+            follows.unfollow_many(
+                self.reader, ['Author0', 'Author1', 'Author2'])
+        statements = [query['sql'] for query in context.captured_queries]
+        self.assertEqual(
+            len([sql for sql in statements
+                 if sql.startswith('DELETE FROM "Follow"')]), 1)
+        self.assertFalse(
+            [sql for sql in statements if 'FROM "Follow"' in sql
+             and sql.startswith('SELECT "Follow"."id"')])
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+
+    def test_muted_restores_outer_state(self):
+        """Вложенный muted() не включает обработчики внешнего"""
+        with signals.muted():
+            with signals.muted():
+                pass
+            Follow.objects.create(user=self.reader, author=self.authors[0])
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.reader).exists())
+
+    def test_follow_many_queries(self):
+        """Число запросов не растет с числом авторов"""
+        usernames = ['Author0', 'Author1', 'Author2']
+        with override_settings(FEED_INBOX_ENABLED=False):
+            with self.assertNumQueries(10):
+                self.post_json('api_follow_many', usernames)
+
+    def test_bad_requests(self):
+        """Пустой, слишком длинный и анонимный запросы отклоняются"""
+        response, _ = self.post_json('api_follow_many', [])
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response, _ = self.post_json(
+            'api_follow_many', [f'user{number}' for number in range(6)])
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.client.get(reverse('posts:api_follow_many'))
+        self.assertEqual(
+            response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+        self.client.logout()
+        response, _ = self.post_json('api_follow_many', ['Author0'])
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+
+    def test_import_follows_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as file:
+            file.write('Reader,Author0\nReader,Author1\nGhost,Author2\n')
+            file.flush()
+            out, err = StringIO(), StringIO()
+            call_command('import_follows', file.name, '--batch-size', '1',
+                         stdout=out, stderr=err)
+        self.assertIn('Читателей: 1, подписок: 2', out.getvalue())
+        self.assertIn('Ghost', err.getvalue())
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 2)
@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
@@ -7,10 +8,19 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
+from ..forms import PostForm
 from ..models import Group, Post, Comment
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -115,3 +125,68 @@ class PostCreateFormTests(TestCase):
                 id=Comment.objects.all().order_by('-id')[0].id
             ).exists()
         )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageLimitsTests(TestCase):
+    """Проверка лимитов на вес и размеры загружаемой картинки."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.uploaded = SimpleUploadedFile(
+            name='small.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def form_errors(self):
+        form = PostForm(
+            data={'text': 'Тестовый текст'},
+            files={'image': self.uploaded})
+        self.assertFalse(form.is_valid())
+        return form.errors['image']
+
+    @override_settings(POST_IMAGE_MAX_BYTES=10)
+    def test_form_rejects_heavy_image(self):
+        """Форма не принимает картинку тяжелее лимита"""
+        self.assertIn('Файл весит больше', self.form_errors()[0])
+
+    @override_settings(POST_IMAGE_MAX_DIMENSIONS=(1, 1))
+    def test_form_rejects_large_dimensions(self):
+        """Форма не принимает картинку больше лимита в пикселях"""
+        self.assertIn('Картинка больше 1×1', self.form_errors()[0])
+
+    def test_upload_rejected_while_streaming(self):
+        """Картинка сверх лимитов отклоняется при чтении запроса"""
+        limits = (
+            {'POST_IMAGE_MAX_BYTES': 10},
+            {'POST_IMAGE_MAX_DIMENSIONS': (1, 1)},
+        )
+        for limit in limits:
+            with self.subTest(limit=limit), override_settings(**limit):
+                self.uploaded.seek(0)
+                response = self.authorized_client.post(
+                    reverse('posts:post_create'),
+                    data={'text': 'Тестовый текст', 'image': self.uploaded})
+                self.assertEqual(
+                    response.status_code,
+                    HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_BYTES=1024)
+    def test_content_length_rejected_before_parsing(self):
+        """Запрос с огромным Content-Length отклоняется без чтения тела"""
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Тестовый текст'},
+            CONTENT_LENGTH=10 * 1024 * 1024)
+        self.assertEqual(
+            response.status_code, HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
@@ -0,0 +1,101 @@
+from datetime import timedelta
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .. import counters, groups
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class GroupCacheTest(TestCase):
+    """LRU групп по slug и список групп без подсчета при запросе."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='GroupUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        caches['fragments'].clear()
+        groups.clear()
+
+    def test_group_is_read_once(self):
+        """Повторное чтение группы не ходит в базу"""
+        self.assertEqual(groups.get_by_slug('test-slug'), self.group)
+        with self.assertNumQueries(0):
+            self.assertEqual(groups.get_by_slug('test-slug'), self.group)
+        self.assertIsNone(groups.get_by_slug('no-group'))
+
+    def test_save_invalidates_group(self):
+        """Правка группы сбрасывает ее из LRU, даже со сменой slug"""
+        groups.get_by_slug('test-slug')
+        group = Group.objects.get(id=self.group.id)
+        group.title = 'Новое название'
+        group.slug = 'new-slug'
+        group.save()
+        self.assertIsNone(groups.get_by_slug('test-slug'))
+        self.assertEqual(
+            groups.get_by_slug('new-slug').title, 'Новое название')
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(GROUP_CACHE_SIZE=1)
+    def test_least_recently_used_is_evicted(self):
+        """Сверх GROUP_CACHE_SIZE вытесняется давно читанная группа"""
+        groups.get_by_slug('test-slug')
+        groups.get_by_slug('other-slug')
+        with self.assertNumQueries(1):
+            groups.get_by_slug('test-slug')
+
+    def test_last_post_at_follows_posts(self):
+        """Дата последнего поста меняется при создании, переносе, удалении"""
+        first = Post.objects.create(
+            author=self.user, text='Первый', group=self.group)
+        second = Post.objects.create(
+            author=self.user, text='Второй', group=self.group)
+        Post.objects.filter(id=first.id).update(
+            pub_date=second.pub_date - timedelta(days=1))
+        first.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.last_post_at, second.pub_date)
+        second.group = self.other_group
+        second.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.last_post_at, first.pub_date)
+        self.assertEqual(self.other_group.last_post_at, second.pub_date)
+        first.delete()
+        self.group.refresh_from_db()
+        self.assertIsNone(self.group.last_post_at)
+
+    def test_group_index(self):
+        """Список групп: свежие сверху, без COUNT при запросе"""
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        counters.group_posts(self.group.id)
+        counters.group_posts(self.other_group.id)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('posts:group_index'))
+        self.assertEqual(
+            [group.slug for group in response.context['groups']],
+            ['test-slug', 'other-slug'])
+        self.assertEqual(
+            [group.post_count for group in response.context['groups']],
+            [1, 0])
+        self.assertContains(response, 'Записей: 1')
+        with self.assertNumQueries(0):
+            self.client.get(reverse('posts:group_index'))
@@ -0,0 +1,135 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core import metrics
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0)
+class RequestMetricsTest(TestCase):
+    """Проверка метрик запроса в Server-Timing и логе."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='VasyaVasyev')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.create(
+            author=cls.user, text='Тестовый пост', group=cls.group)
+
+    def setUp(self):
+        caches['fragments'].clear()
+
+    def get_logged(self, url):
+        with self.assertLogs('core.metrics', 'INFO') as logs:
+            response = self.client.get(url)
+        return response, json.loads(logs.records[-1].getMessage())
+
+    def test_server_timing_and_log(self):
+        """Запрос получает Server-Timing, а в лог пишется JSON"""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        response, data = self.get_logged(url)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertEqual(data['view'], 'posts:group_list')
+        self.assertEqual(data['status'], 200)
+        self.assertGreater(data['db_queries'], 0)
+        self.assertGreater(data['template_ms'], 0)
+        self.assertEqual(data['fragment_misses'], 1)
+
+    def test_fragment_hits(self):
+        """Повторный рендер берет фрагмент из кэша"""
+        self.client.force_login(self.user)
+        url = reverse('posts:home')
+        _, data = self.get_logged(url)
+        self.assertEqual(
+            (data['fragment_hits'], data['fragment_misses']), (0, 1))
+        _, data = self.get_logged(url)
+        self.assertEqual(
+            (data['fragment_hits'], data['fragment_misses']), (1, 0))
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_sampling(self):
+        """Запросы вне выборки обрабатываются без метрик"""
+        response = self.client.get(reverse('posts:home'))
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    def test_timed_outside_request(self):
+        """Вне запроса хуки метрик ничего не делают"""
+        self.assertIsNone(metrics.current())
+        with metrics.timed('thumb_lookup'):
+            pass
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1.0)
+class QueryInspectionTest(TestCase):
+    """Проверка поиска N+1 и лога медленных запросов."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for number in range(3):
+            Post.objects.create(
+                author=User.objects.create_user(username=f'Author{number}'),
+                text=f'Тестовый пост {number}')
+
+    def setUp(self):
+        caches['fragments'].clear()
+
+    @override_settings(N_PLUS_ONE_THRESHOLD=2)
+    def test_n_plus_one_call_site(self):
+        """Повтор одного вида запроса находится вместе с местом вызова"""
+        template = Template(
+            '{% for post in posts %}{{ post.author.username }}{% endfor %}')
+        with metrics.collect() as collected, connection.execute_wrapper(
+                collected.sql_wrapper):
+            template.render(Context({'posts': Post.objects.all()}))
+        [report] = collected.n_plus_one()
+        self.assertEqual(report['count'], 3)
+        self.assertIn('"auth_user"', report['sql'])
+        self.assertTrue(report['template'].endswith(':1'))
+        self.assertIn('test_metrics.py', report['code'])
+
+    def test_query_shape(self):
+        """Значения и длина списка IN не влияют на вид запроса"""
+        self.assertEqual(
+            metrics.query_shape('SELECT 1 WHERE id IN (%s, %s) LIMIT 21'),
+            metrics.query_shape('SELECT 2 WHERE id IN (%s) LIMIT 10'))
+
+    @override_settings(N_PLUS_ONE_THRESHOLD=0, N_PLUS_ONE_RAISE=True)
+    def test_raise_mode(self):
+        """В режиме разработки страница с N+1 падает"""
+        with self.assertLogs('core.metrics', 'WARNING'):
+            with self.assertRaises(metrics.NPlusOneError):
+                self.client.get(reverse('posts:home'))
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_query_log(self):
+        """Медленный запрос пишется в лог вместе с планом"""
+        with self.assertLogs('core.sql', 'WARNING') as logs:
+            self.client.get(reverse('posts:home'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertTrue(record['sql'].startswith('SELECT'))
+        self.assertTrue(record['plan'])
+        self.assertEqual(record['path'], '/')
+
+    @override_settings(
+        REQUEST_METRICS_SAMPLE_RATE=0, SLOW_QUERY_MS=0,
+        N_PLUS_ONE_THRESHOLD=0, N_PLUS_ONE_RAISE=False)
+    def test_unsampled_requests_are_inspected(self):
+        """Медленные запросы и N+1 ловятся и вне выборки метрик"""
+        with self.assertLogs('core.sql', 'WARNING'):
+            with self.assertLogs('core.metrics', 'WARNING') as logs:
+                response = self.client.get(reverse('posts:home'))
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertIn('n_plus_one', json.loads(logs.records[0].getMessage()))
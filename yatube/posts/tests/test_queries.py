@@ -0,0 +1,65 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import counters, groups
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов не зависит от числа постов и комментариев."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.authors = [
+            User.objects.create_user(username=f'Author{number}')
+            for number in range(5)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+            for number in range(3):
+                cls.post = Post.objects.create(
+                    author=author,
+                    text=f'Тестовый пост {number}',
+                    group=cls.group,
+                )
+        for author in cls.authors:
+            Comment.objects.create(
+                post=cls.post, author=author, text='Комментарий')
+        counters.rebuild()
+
+    def setUp(self):
+        caches['fragments'].clear()
+        caches['default'].clear()
+        groups.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_feed_views_num_queries(self):
+        """Ленты не делают отдельных запросов за автором и группой"""
+        author = self.post.author
+        pages = {
+            reverse('posts:home'): 2,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 3,
+            reverse('posts:profile', kwargs={'username': author}): 4,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}): 5,
+        }
+        for url, num_queries in pages.items():
+            with self.subTest(url=url):
+                with self.assertNumQueries(num_queries):
+                    self.client.get(url)
+
+    def test_follow_index_num_queries(self):
+        """Лента подписок не делает отдельных запросов за авторами"""
+        # Пятый запрос — рекомендации, дальше они берутся из кэша
+        with self.assertNumQueries(5):
+            self.reader_client.get(reverse('posts:follow_index'))
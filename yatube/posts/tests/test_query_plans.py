@@ -0,0 +1,64 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from ..management.commands.check_query_plans import (is_full_scan_with_sort,
+                                                     uses_temp_sort)
+from ..models import Follow, Post
+
+User = get_user_model()
+
+
+class QueryPlansTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Author')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Post.objects.create(author=cls.author, text='Пост')
+
+    @override_settings(FEED_INBOX_ENABLED=True)
+    def test_feed_queries_use_indexes(self):
+        """Страницы лент во всех режимах пагинации сортирует индекс"""
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn('index?after', out.getvalue())
+        self.assertIn('follow_index?before', out.getvalue())
+
+    @override_settings(FEED_INBOX_ENABLED=False)
+    def test_pulled_follow_feed_is_allowed(self):
+        """С настройками по умолчанию проверка проходит и отмечает ленту"""
+        out = StringIO()
+        call_command('check_query_plans', stdout=out)
+        self.assertIn(
+            'follow_index?page: известная сортировка', out.getvalue())
+        self.assertIn('Все запросы используют индексы', out.getvalue())
+
+    @override_settings(FEED_INBOX_ENABLED=True)
+    def test_temp_sort_outside_allow_list_fails(self):
+        """Временное дерево вне PULLED_FEED_VIEWS роняет проверку"""
+        plan = '55 0 0 USE TEMP B-TREE FOR RIGHT PART OF ORDER BY'
+        with mock.patch('django.db.models.query.QuerySet.explain',
+                        return_value=plan):
+            with self.assertRaisesMessage(CommandError, 'follow_index?page'):
+                call_command('check_query_plans', stdout=StringIO())
+
+    def test_full_scan_with_sort_detected(self):
+        """Полный проход с сортировкой распознается в плане"""
+        plan = ('2 0 0 SCAN posts_post\n'
+                '9 0 0 USE TEMP B-TREE FOR ORDER BY')
+        self.assertTrue(is_full_scan_with_sort(plan, 'sqlite'))
+        plan = '6 0 0 SCAN posts_post USING INDEX post_pub_date_idx'
+        self.assertFalse(is_full_scan_with_sort(plan, 'sqlite'))
+
+    def test_temp_sort_detected(self):
+        """Любое временное дерево SQLite считается сортировкой без индекса"""
+        plan = ('11 0 0 SEARCH posts_post USING INDEX post_author_pub_date_idx'
+                '\n55 0 0 USE TEMP B-TREE FOR RIGHT PART OF ORDER BY')
+        self.assertTrue(uses_temp_sort(plan, 'sqlite'))
+        self.assertFalse(uses_temp_sort(plan, 'postgresql'))
@@ -0,0 +1,172 @@
+import json
+import shutil
+import tempfile
+from http import HTTPStatus
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core import ratelimit
+
+from ..models import Comment, Follow, Post
+
+User = get_user_model()
+
+
+@override_settings(
+    RATE_LIMITS={'add_comment': (2, 60), 'profile_follow': (2, 60)},
+    RATE_LIMIT_IP_MULTIPLIER=2)
+class RateLimitTest(TestCase):
+    """Ограничение частоты записи корзиной токенов."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Flooder')
+        cls.other = User.objects.create_user(username='Neighbour')
+        cls.author = User.objects.create_user(username='Author')
+        cls.post = Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def comment(self, client=None, **extra):
+        return (client or self.client).post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Комментарий'}, **extra)
+
+    def test_flood_gets_429_with_retry_after(self):
+        """Сверх лимита запись отклоняется с Retry-After."""
+        for _ in range(2):
+            self.assertEqual(self.comment().status_code, HTTPStatus.FOUND)
+        response = self.comment()
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(Comment.objects.count(), 2)
+
+    def test_tokens_refill_over_time(self):
+        """Через period / limit секунд появляется новый токен."""
+        with mock.patch('core.ratelimit.time.time', return_value=1000.0):
+            self.comment()
+            self.comment()
+            self.assertEqual(
+                self.comment().status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        with mock.patch('core.ratelimit.time.time', return_value=1030.0):
+            self.assertEqual(self.comment().status_code, HTTPStatus.FOUND)
+            self.assertEqual(
+                self.comment().status_code, HTTPStatus.TOO_MANY_REQUESTS)
+
+    def test_user_bucket_follows_user_across_addresses(self):
+        """Смена IP не обходит корзину пользователя."""
+        self.comment(REMOTE_ADDR='10.0.0.1')
+        self.comment(REMOTE_ADDR='10.0.0.2')
+        response = self.comment(REMOTE_ADDR='10.0.0.3')
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+
+    def test_ip_bucket_is_shared_and_larger(self):
+        """Пользователи за одним IP делят его корзину, она в разы больше."""
+        neighbour = Client()
+        neighbour.force_login(self.other)
+        self.comment()
+        self.comment()
+        self.comment(neighbour)
+        self.assertEqual(
+            self.comment(neighbour).status_code, HTTPStatus.FOUND)
+        third = Client()
+        third.force_login(self.author)
+        self.assertEqual(
+            self.comment(third).status_code, HTTPStatus.TOO_MANY_REQUESTS)
+
+    @override_settings(RATE_LIMIT_TRUSTED_PROXIES=['10.0.0.9'])
+    def test_ip_behind_trusted_proxy(self):
+        """За прокси корзина IP — у клиента, а не у самого прокси."""
+        proxy = {'REMOTE_ADDR': '10.0.0.9'}
+        neighbour = Client()
+        neighbour.force_login(self.other)
+        third = Client()
+        third.force_login(self.author)
+        for client, address in ((self.client, '1.1.1.1'),
+                                (neighbour, '2.2.2.2'),
+                                (third, '3.3.3.3')):
+            for _ in range(2):
+                response = self.comment(
+                    client, HTTP_X_FORWARDED_FOR=f'{address}, 10.0.0.9',
+                    **proxy)
+                self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_forwarded_for_from_untrusted_address_is_ignored(self):
+        """Без доверенного прокси X-Forwarded-For не меняет корзину IP."""
+        neighbour = Client()
+        neighbour.force_login(self.other)
+        third = Client()
+        third.force_login(self.author)
+        for client, address in ((self.client, '1.1.1.1'),
+                                (neighbour, '2.2.2.2')):
+            for _ in range(2):
+                self.comment(client, HTTP_X_FORWARDED_FOR=address)
+        response = self.comment(third, HTTP_X_FORWARDED_FOR='3.3.3.3')
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+
+    def test_reads_and_form_pages_are_not_limited(self):
+        """GET страниц с формой и чтение токены не тратят."""
+        for _ in range(5):
+            self.assertEqual(self.client.get(
+                reverse('posts:post_create')).status_code, HTTPStatus.OK)
+            self.assertEqual(self.client.get(reverse(
+                'posts:post_detail', kwargs={'post_id': self.post.id})
+            ).status_code, HTTPStatus.OK)
+        self.assertEqual(self.comment().status_code, HTTPStatus.FOUND)
+
+    def test_follow_is_limited_on_get(self):
+        """Подписка по GET тоже ограничена: она пишет в базу."""
+        url = reverse(
+            'posts:profile_follow', kwargs={'username': self.author})
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).status_code,
+                             HTTPStatus.FOUND)
+        self.assertEqual(
+            self.client.get(url).status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+
+    @override_settings(RATE_LIMITS={'api_follow_many': (2, 60)})
+    def test_api_follow_many_is_limited(self):
+        """Пакетная подписка в API ограничена и отвечает JSON."""
+        url = reverse('posts:api_follow_many')
+        for _ in range(2):
+            self.assertEqual(
+                self.client.post(url, {'usernames': ['Author']}).status_code,
+                HTTPStatus.OK)
+        response = self.client.post(url, {'usernames': ['Author']})
+        self.assertEqual(response.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertIn('detail', json.loads(response.content))
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+    """Корзины в памяти процесса — предупреждение check --deploy."""
+
+    def test_local_memory_is_reported(self):
+        """check --deploy предупреждает о locmem, общий кэш проходит"""
+        errors = ratelimit.check_shared_cache()
+        self.assertEqual([error.id for error in errors], ['core.W001'])
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        file_caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': directory,
+        }}
+        with override_settings(CACHES=file_caches):
+            self.assertEqual(ratelimit.check_shared_cache(), [])
+        with override_settings(RATE_LIMITS={}):
+            self.assertEqual(ratelimit.check_shared_cache(), [])
+
+    def test_startup_does_not_fail_without_debug(self):
+        """Без DEBUG сайт с лимитами в locmem все равно запускается"""
+        with override_settings(DEBUG=False):
+            apps.get_app_config('core').ready()
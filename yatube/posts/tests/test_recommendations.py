@@ -0,0 +1,160 @@
+import re
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import recommendations
+from ..models import (Comment, Follow, Group, Post, Recommendation,
+                      StaleRecommendation)
+
+User = get_user_model()
+
+
+class SparseMathTest(SimpleTestCase):
+    def test_multiply(self):
+        """Произведение разреженных матриц совпадает с обычным"""
+        left = recommendations.sparse([(1, 'a'), (1, 'b'), (2, 'b', 2.0)])
+        right = recommendations.sparse([('a', 'x'), ('b', 'x'), ('b', 'y')])
+        product = recommendations.multiply(left, right)
+        self.assertEqual(dict(product[1]), {'x': 2.0, 'y': 1.0})
+        self.assertEqual(dict(product[2]), {'x': 2.0, 'y': 2.0})
+
+    def test_normalized(self):
+        matrix = {1: {'x': 2.0, 'y': 1.0}, 2: {}}
+        self.assertEqual(
+            recommendations.normalized(matrix), {1: {'x': 1.0, 'y': 0.5}})
+
+
+class RecommendationsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.friend = User.objects.create_user(username='Friend')
+        cls.friend_of_friend = User.objects.create_user(
+            username='FriendOfFriend')
+        cls.talker = User.objects.create_user(username='Talker')
+        cls.group_star = User.objects.create_user(username='GroupStar')
+        cls.silent = User.objects.create_user(username='Silent')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='')
+        for author in (cls.friend, cls.friend_of_friend, cls.talker,
+                       cls.group_star):
+            Post.objects.create(author=author, text='Пост', group=cls.group)
+        cls.post = Post.objects.filter(author=cls.friend).first()
+        Follow.objects.create(user=cls.reader, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.friend_of_friend)
+        Follow.objects.create(user=cls.friend, author=cls.silent)
+        Follow.objects.create(user=cls.silent, author=cls.group_star)
+        Comment.objects.create(post=cls.post, author=cls.reader, text='А')
+        Comment.objects.create(post=cls.post, author=cls.talker, text='Б')
+
+    def setUp(self):
+        caches['default'].clear()
+        recommendations.refresh(full=True)
+
+    def recommended(self, user):
+        return list(Recommendation.objects.filter(user=user).order_by(
+            '-score').values_list('author__username', flat=True))
+
+    def test_sources(self):
+        """Друзья друзей, собеседники и авторы групп; без своих и молчунов"""
+        self.assertEqual(
+            self.recommended(self.reader),
+            ['FriendOfFriend', 'Talker', 'GroupStar'])
+
+    def test_follow_marks_stale(self):
+        """Подписка помечает читателя и его подписчиков к пересчету"""
+        self.assertFalse(StaleRecommendation.objects.exists())
+        callbacks = []
+        with mock.patch('posts.recommendations.transaction.on_commit',
+                        callbacks.append):
+            Follow.objects.create(user=self.friend, author=self.talker)
+        # Подписчики помечаются после коммита, а не в запросе подписки
+        self.assertEqual(
+            list(StaleRecommendation.objects.values_list(
+                'user_id', flat=True)), [self.friend.id])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(
+            set(StaleRecommendation.objects.values_list(
+                'user_id', flat=True)),
+            {self.friend.id, self.reader.id})
+        self.assertEqual(recommendations.refresh(), 2)
+        self.assertFalse(StaleRecommendation.objects.exists())
+
+    @override_settings(RECOMMENDATIONS_STALE_FOLLOWERS=0)
+    @mock.patch('posts.recommendations.transaction.on_commit',
+                lambda callback: callback())
+    def test_follow_skips_many_followers(self):
+        """Подписчиков сверх лимита подписка не помечает"""
+        Follow.objects.create(user=self.friend, author=self.talker)
+        self.assertEqual(
+            list(StaleRecommendation.objects.values_list(
+                'user_id', flat=True)), [self.friend.id])
+
+    def test_compute_lists_are_bounded(self):
+        """Подписки и комментарии пачки не уходят в запрос списком id"""
+        User.objects.bulk_create(
+            User(username=f'Author{number}') for number in range(12))
+        authors = User.objects.filter(username__startswith='Author')
+        Follow.objects.bulk_create(
+            Follow(user=self.reader, author=author) for author in authors)
+        Post.objects.bulk_create(
+            Post(author=author, text='Пост') for author in authors)
+        for author in authors:
+            Follow.objects.create(user=author, author=self.talker)
+            Comment.objects.create(post=self.post, author=author, text='В')
+        popular = recommendations.popular_in_groups()
+        with mock.patch.object(recommendations, 'BATCH_SIZE', 5), \
+                CaptureQueriesContext(connection) as queries:
+            result = recommendations.compute([self.reader.id], popular)
+        self.assertIn(self.friend_of_friend.id, dict(result[self.reader.id]))
+        for query in queries.captured_queries:
+            for values in re.findall(r' IN \(([^()]*)\)', query['sql']):
+                with self.subTest(sql=query['sql']):
+                    self.assertLessEqual(len(values.split(',')), 5)
+
+    def test_comment_marks_commenter_and_post_author(self):
+        """Комментарий помечает только своего автора и автора поста"""
+        self.assertFalse(StaleRecommendation.objects.exists())
+        Comment.objects.create(post=self.post, author=self.silent, text='Г')
+        self.assertEqual(
+            set(StaleRecommendation.objects.values_list(
+                'user_id', flat=True)),
+            {self.silent.id, self.friend.id})
+
+    def test_served_from_cache(self):
+        """Рекомендации читаются одним запросом, дальше — из кэша"""
+        with self.assertNumQueries(1):
+            authors = recommendations.for_user(self.reader)
+        with self.assertNumQueries(0):
+            self.assertEqual(recommendations.for_user(self.reader), authors)
+        Follow.objects.create(user=self.reader, author=self.talker)
+        self.assertNotIn(
+            'Talker',
+            [author['username']
+             for author in recommendations.for_user(self.reader)])
+
+    def test_pages_show_recommendations(self):
+        client = Client()
+        client.force_login(self.reader)
+        for url in (reverse('posts:follow_index'),
+                    reverse('posts:profile', args=['Friend'])):
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertContains(response, 'Кого почитать')
+                self.assertContains(
+                    response, reverse('posts:profile', args=['Talker']))
+
+    def test_command(self):
+        out = StringIO()
+        call_command('refresh_recommendations', '--full', stdout=out)
+        self.assertIn(str(User.objects.count()), out.getvalue())
@@ -0,0 +1,111 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from yatube.databases import build_databases, replica_aliases
+from yatube.replicas import ReplicaRouter, reading_replicas
+
+from .. import cache_versions
+from ..models import Post
+
+User = get_user_model()
+
+
+class ReplicaSettingsTest(SimpleTestCase):
+    def test_replicas_from_environment(self):
+        """Реплики — отдельные файлы SQLite, в тестах зеркала основной"""
+        databases = build_databases('/srv', environ={
+            'DATABASE_REPLICAS':
+                '/srv/replica1.sqlite3, /srv/replica2.sqlite3',
+        })
+        self.assertEqual(databases['default']['NAME'], '/srv/db.sqlite3')
+        self.assertEqual(
+            replica_aliases(databases), ['replica1', 'replica2'])
+        self.assertEqual(
+            databases['replica2']['NAME'], '/srv/replica2.sqlite3')
+        self.assertEqual(databases['replica1']['TEST'], {'MIRROR': 'default'})
+
+    def test_no_replicas(self):
+        databases = build_databases('/srv', environ={})
+        self.assertEqual(replica_aliases(databases), [])
+
+    @override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+    def test_router(self):
+        """Из реплик читаются только модели posts и только в replica_read"""
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Post))
+        with reading_replicas():
+            self.assertIn(
+                router.db_for_read(Post), settings.DATABASE_REPLICAS)
+            self.assertIsNone(router.db_for_read(User))
+            self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertFalse(router.allow_migrate('replica1', 'posts'))
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+
+
+# Реплика в тестах — та же база, поэтому выбор реплики подсматриваем
+@override_settings(DATABASE_REPLICAS=['default'])
+class ReplicaViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='VasyaVasyev')
+        cls.post = Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        caches['fragments'].clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def replica_reads(self, client, url):
+        with mock.patch(
+                'yatube.replicas.random.choice',
+                side_effect=lambda aliases: aliases[0]) as choice:
+            client.get(url)
+        return choice.call_count
+
+    def test_read_views_use_replica(self):
+        """Ленты и страница поста читаются из реплики"""
+        urls = (
+            reverse('posts:home'),
+            reverse('posts:profile', kwargs={'username': 'VasyaVasyev'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:follow_index'),
+            reverse('posts:api_home'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertGreater(
+                    self.replica_reads(self.authorized_client, url), 0)
+
+    def test_fresh_version_reads_primary(self):
+        """После чужой правки лента читается из основной базы"""
+        cache_versions.bump(cache_versions.INDEX)
+        for client in (Client(), self.authorized_client):
+            with self.subTest(client=client):
+                self.assertEqual(
+                    self.replica_reads(client, reverse('posts:home')), 0)
+                self.assertEqual(self.replica_reads(
+                    client, reverse('posts:api_home')), 0)
+        caches['fragments'].delete('posts:bumped:index')
+        self.assertGreater(self.replica_reads(
+            self.authorized_client, reverse('posts:home')), 0)
+
+    def test_write_pins_primary(self):
+        """После записи пользователь читает из основной базы"""
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            {'text': 'Комментарий'})
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        self.assertEqual(
+            self.replica_reads(
+                self.authorized_client, reverse('posts:home')), 0)
+
+    def test_form_without_write_does_not_pin(self):
+        response = self.authorized_client.get(reverse('posts:post_create'))
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
@@ -0,0 +1,172 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import cache_versions, search
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    """Проверка поиска по индексу FTS5."""
+    index_class = search.Fts5Index
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='VasyaVasyev')
+        cls.python_post = Post.objects.create(
+            author=cls.user, text='Пишем на Python каждый день')
+        cls.django_post = Post.objects.create(
+            author=cls.user, text='Django и Python: шаблоны и модели')
+        cls.other_post = Post.objects.create(
+            author=cls.user, text='Рецепт борща')
+
+    def setUp(self):
+        search.rebuild()
+
+    def test_backend(self):
+        """Выбран индекс, заданный настройкой POSTS_SEARCH_BACKEND"""
+        self.assertIsInstance(search.get_index(), self.index_class)
+
+    def test_ranking(self):
+        """Посты с запросом находятся, лучшее совпадение первым"""
+        self.assertEqual(
+            search.search_ids('django python'), [self.django_post.id])
+        self.assertCountEqual(
+            search.search_ids('pyth'),
+            [self.python_post.id, self.django_post.id])
+        self.assertEqual(search.search_ids('борщ'), [self.other_post.id])
+        self.assertEqual(search.search_ids('"*'), [])
+
+    def test_signals_keep_index_in_sync(self):
+        """Правка, удаление поста и комментарии сразу видны в поиске"""
+        self.other_post.text = 'Рецепт окрошки'
+        self.other_post.save()
+        self.assertEqual(search.search_ids('борщ'), [])
+        comment = Comment.objects.create(
+            post=self.python_post, author=self.user, text='А где борщ?')
+        self.assertEqual(search.search_ids('борщ'), [self.python_post.id])
+        comment.delete()
+        self.assertEqual(search.search_ids('борщ'), [])
+        self.other_post.delete()
+        self.assertEqual(search.search_ids('окрошки'), [])
+
+    def test_terms_match_across_post_and_comments(self):
+        """Термины запроса могут найтись в разных комментариях поста"""
+        post = Post.objects.create(author=self.user, text='Рецепт щей')
+        Comment.objects.create(
+            post=post, author=self.user, text='Со сметаной')
+        Comment.objects.create(
+            post=post, author=self.user, text='И с чесноком')
+        self.assertEqual(
+            search.search_ids('сметаной чесноком щей'), [post.id])
+        self.assertEqual(search.search_ids('сметаной python'), [])
+
+    def test_post_delete_cost_does_not_grow_with_comments(self):
+        """Удаление поста не переиндексирует его по комментарию за раз"""
+        def delete_cost(comments):
+            post = Post.objects.create(author=self.user, text='Пост')
+            Comment.objects.bulk_create(
+                Comment(post=post, author=self.user, text=f'слово{number}')
+                for number in range(comments))
+            search.rebuild()
+            with CaptureQueriesContext(connection) as context:
+                post.delete()
+            return len(context.captured_queries)
+
+        self.assertEqual(delete_cost(20), delete_cost(1))
+        self.assertEqual(search.search_ids('слово1'), [])
+
+    def test_cursor_pages(self):
+        """Выдача листается курсором без повторов"""
+        paginator = search.SearchPaginator('python', 1)
+        first = paginator.cursor_page()
+        self.assertTrue(first.has_next())
+        second = paginator.cursor_page(
+            after=search.decode_cursor(first.next_cursor))
+        self.assertFalse(second.has_next())
+        self.assertCountEqual(
+            [first[0].id, second[0].id],
+            [self.python_post.id, self.django_post.id])
+
+    def test_search_view(self):
+        """Страница поиска показывает найденные посты"""
+        response = self.client.get(reverse('posts:search'), {'q': 'борщ'})
+        self.assertEqual(
+            list(response.context['page_obj']), [self.other_post])
+        self.assertContains(response, 'Рецепт борща')
+
+    def test_admin_search(self):
+        """Поиск в админке идет через индекс"""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'борщ'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.other_post])
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'python'})
+        self.assertEqual(
+            [post.id for post in response.context['cl'].result_list],
+            search.search_ids('python'))
+
+    def test_rebuild_command(self):
+        """Команда заново загружает все посты в индекс"""
+        search.get_index().clear()
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('3', out.getvalue())
+        self.assertEqual(search.search_ids('борщ'), [self.other_post.id])
+
+
+@override_settings(POSTS_SEARCH_BACKEND='python')
+class MemorySearchTest(SearchTest):
+    """Те же проверки для индекса в памяти."""
+    index_class = search.MemoryIndex
+
+    @mock.patch('posts.search.transaction.on_commit',
+                lambda callback: callback())
+    def test_other_workers_reload_after_write(self):
+        """Запись в одном процессе видна в поиске других после коммита"""
+        own = search.get_index()
+        other = search.MemoryIndex()
+        self.assertEqual(other.query(['окрошка']), [])
+        with mock.patch('posts.search.load', wraps=search.load) as load:
+            post = Post.objects.create(
+                author=self.user, text='Летняя окрошка')
+            self.assertEqual(
+                [pk for pk, _ in own.query(['окрошка'])], [post.id])
+            load.assert_not_called()
+            self.assertEqual(
+                [pk for pk, _ in other.query(['окрошка'])], [post.id])
+            load.assert_called_once_with(other)
+
+    def test_reset_versions_reload_index(self):
+        """Сброс версий лент заставляет перечитать индекс"""
+        index = search.get_index()
+        index.ensure_loaded()
+        Post.objects.filter(id=self.other_post.id).update(text='Окрошка')
+        cache_versions.reset()
+        self.assertEqual(search.search_ids('окрошка'), [self.other_post.id])
+
+    def test_vocabulary_stays_sorted(self):
+        """Словарь обновляется вставкой и остается отсортированным"""
+        index = search.get_index()
+        index.ensure_loaded()
+        comment = Comment.objects.create(
+            post=self.python_post, author=self.user, text='яблоко и арбуз')
+        self.assertIn('арбуз', index.vocabulary)
+        comment.delete()
+        self.assertNotIn('арбуз', index.vocabulary)
+        self.assertEqual(index.vocabulary, sorted(
+            set(index.posts.postings) | set(index.comments.postings)))
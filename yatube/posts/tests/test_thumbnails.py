@@ -0,0 +1,95 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from .. import thumbnails
+from ..models import Post
+from ..templatetags.post_images import post_thumbnail_url
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        image = BytesIO()
+        Image.new('RGB', (100, 50), color=(200, 0, 0)).save(image, 'png')
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тестовый пост',
+            image=SimpleUploadedFile(
+                name='small.png',
+                content=image.getvalue(),
+                content_type='image/png'),
+        )
+
+    def test_original_until_thumbnail_ready(self):
+        """Пока миниатюры нет, шаблон получает оригинал"""
+        self.assertIsNone(
+            thumbnails.cached_thumbnail(self.post.image, '960x339'))
+        self.assertEqual(
+            post_thumbnail_url(self.post.image, '960x339'),
+            self.post.image.url)
+
+    def test_thumbnail_after_generation(self):
+        """После нарезки шаблон получает адрес миниатюры"""
+        thumbnails.generate(self.post.image.name)
+        thumbnail = thumbnails.cached_thumbnail(self.post.image, '960x339')
+        self.assertIsNotNone(thumbnail)
+        self.assertEqual(tuple(thumbnail.size), (960, 339))
+        self.assertEqual(
+            post_thumbnail_url(self.post.image, '960x339'), thumbnail.url)
+
+    def test_prefetch(self):
+        """Миниатюры страницы проверяются одним запросом"""
+        posts = [self.post] + [
+            Post.objects.create(
+                author=self.user, text='Еще пост', image=self.post.image.name)
+            for _ in range(2)
+        ]
+        thumbnails.generate(self.post.image.name)
+        caches[settings.THUMBNAIL_CACHE].clear()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch([post.image for post in posts], '960x339')
+        with self.assertNumQueries(0):
+            for post in posts:
+                self.assertIsNotNone(
+                    thumbnails.cached_thumbnail(post.image, '960x339'))
+
+    @override_settings(POST_IMAGE_REENCODE='JPEG')
+    def test_reencode(self):
+        """Картинка пережимается в JPEG, старый файл удаляется"""
+        image = BytesIO()
+        Image.effect_noise((200, 100), 64).convert('RGB').save(image, 'png')
+        self.post.image = SimpleUploadedFile(
+            name='noise.png',
+            content=image.getvalue(),
+            content_type='image/png')
+        self.post.save()
+        old_name = self.post.image.name
+        thumbnails.reencode(self.post.id)
+        self.post.refresh_from_db()
+        self.assertTrue(self.post.image.name.endswith('.jpg'))
+        self.assertFalse(self.post.image.storage.exists(old_name))
+        with Image.open(self.post.image.path) as reencoded:
+            self.assertEqual(reencoded.format, 'JPEG')
+        self.assertIsNotNone(
+            thumbnails.cached_thumbnail(self.post.image, '960x339'))
@@ -0,0 +1,144 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from .. import counters, search, transfer
+from ..models import Comment, FeedEntry, Follow, Group, Post
+
+User = get_user_model()
+
+
+class TransferCommandsTest(TestCase):
+    """Проверка выгрузки и загрузки данных командами."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='VasyaVasyev', password='secret')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост в группе', group=cls.group)
+        Post.objects.create(author=cls.author, text='Пост без группы')
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий, "в кавычках"')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def round_trip(self, fmt):
+        out = StringIO()
+        call_command(
+            'export_data', self.directory, format=fmt, stdout=out)
+        self.assertIn('posts: 2', out.getvalue())
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        call_command(
+            'import_data', self.directory, format=fmt, batch_size=1,
+            stdout=out)
+
+    def test_round_trip(self):
+        """После выгрузки и загрузки данные и производные совпадают"""
+        for fmt in ('ndjson', 'csv'):
+            with self.subTest(fmt=fmt):
+                self.round_trip(fmt)
+                post = Post.objects.get(id=self.post.id)
+                self.assertEqual(post.pub_date, self.post.pub_date)
+                self.assertEqual(post.group, self.group)
+                self.assertIsNone(
+                    Post.objects.get(text='Пост без группы').group)
+                self.assertEqual(
+                    Comment.objects.get().text, 'Комментарий, "в кавычках"')
+                self.assertTrue(Follow.objects.filter(
+                    user=self.reader, author=self.author).exists())
+                self.assertTrue(
+                    User.objects.get(id=self.author.id).check_password(
+                        'secret'))
+                self.assertEqual(counters.author_posts(self.author.id), 2)
+                self.assertEqual(counters.post_comments(self.post.id), 1)
+                self.assertEqual(search.search_ids('кавычках'), [post.id])
+
+    def test_queued_comment_round_trip(self):
+        """Комментарий из отложенной очереди выгружается с queue_id"""
+        queue_id = uuid.uuid4()
+        Comment.objects.filter(post=self.post).update(queue_id=queue_id)
+        for fmt in ('ndjson', 'csv'):
+            with self.subTest(fmt=fmt):
+                self.round_trip(fmt)
+                self.assertEqual(Comment.objects.get().queue_id, queue_id)
+
+    @override_settings(FEED_INBOX_ENABLED=False)
+    def test_feed_is_not_built_when_disabled(self):
+        """Без FEED_INBOX_ENABLED загрузка не заполняет ленты"""
+        self.round_trip('ndjson')
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_import_resumes_after_failure(self):
+        """Упавшая загрузка продолжается с последней закоммиченной пачки"""
+        call_command('export_data', self.directory, stdout=StringIO())
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        bulk_create = Post.objects.bulk_create
+        calls = []
+
+        def fail_second_batch(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise RuntimeError('Сбой')
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(Post.objects, 'bulk_create',
+                               fail_second_batch):
+            with self.assertRaises(RuntimeError):
+                transfer.import_data(self.directory, batch_size=1)
+        self.assertEqual(Post.objects.count(), 1)
+        path = os.path.join(self.directory, transfer.PROGRESS_FILE)
+        with open(path, encoding='utf-8') as stream:
+            progress = json.load(stream)
+        self.assertEqual(progress['posts'], 1)
+        # Сбой между коммитом пачки и записью прогресса
+        progress['posts'] = 0
+        with open(path, 'w', encoding='utf-8') as stream:
+            json.dump(progress, stream)
+        totals = transfer.import_data(self.directory, batch_size=1)
+        self.assertEqual(totals['posts'], 2)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_ids_continue_after_import(self):
+        """Новые строки получают id после загруженных"""
+        self.round_trip('ndjson')
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertGreater(post.id, self.post.id)
+
+    def test_skip_passwords(self):
+        """Флаг --skip-passwords не выгружает хэши паролей"""
+        call_command(
+            'export_data', self.directory, skip_passwords=True,
+            stdout=StringIO())
+        with open(f'{self.directory}/users.ndjson', encoding='utf-8') as f:
+            self.assertNotIn('pbkdf2', f.read())
+
+    def test_empty_directory(self):
+        """Загрузка из пустого каталога — ошибка команды"""
+        with self.assertRaises(CommandError):
+            call_command('import_data', self.directory, stdout=StringIO())
@@ -6,7 +6,7 @@ from django import forms
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from ..models import Group, Post, Follow
@@ -165,6 +165,57 @@ class PostPagesTest(TestCase):
              ' оставлять комментарий'))
 
 
+@override_settings(POSTS_CURSOR_PAGINATION=True)
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='CursorUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='cursor-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user,
+                text=f'Тестовый пост {number}',
+                group=cls.group)
+            for number in range(13)
+        ]
+        cls.url = reverse('posts:group_list', kwargs={'slug': cls.group.slug})
+
+    def test_cursor_pages(self):
+        """Курсоры ведут вперед и назад по ленте без номеров страниц"""
+        first_page = self.client.get(self.url).context['page_obj']
+        self.assertTrue(first_page.is_cursor)
+        self.assertEqual(len(first_page), NUMBER_Of_POSTS)
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_next())
+        second_page = self.client.get(
+            self.url, {'after': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(second_page.has_next())
+        self.assertEqual(second_page[-1], self.posts[0])
+        back_page = self.client.get(
+            self.url,
+            {'before': second_page.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back_page), list(first_page))
+        self.assertFalse(back_page.has_previous())
+
+    def test_page_number_still_works(self):
+        """Ссылки с номером страницы продолжают работать"""
+        response = self.client.get(self.url, {'page': 2})
+        self.assertEqual(response.context['page_obj'].number, 2)
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_broken_cursor_gives_first_page(self):
+        """Битый курсор отдает первую страницу"""
+        response = self.client.get(self.url, {'after': 'broken'})
+        self.assertEqual(len(response.context['page_obj']), NUMBER_Of_POSTS)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+
 class FollowViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
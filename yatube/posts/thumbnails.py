@@ -0,0 +1,181 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from core import metrics
+
+from . import images
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+class CachedThumbnailBackend(ThumbnailBackend):
+    """Ищет готовую миниатюру, но никогда не создает ее сама."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def cached_thumbnail(self, file_, geometry_string, **options):
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options))
+
+
+backend = CachedThumbnailBackend()
+
+
+def geometry_options(geometry):
+    return dict(settings.POST_THUMBNAILS).get(geometry, {})
+
+
+def cached_thumbnail(image, geometry):
+    """Готовая миниатюра картинки поста или None."""
+    try:
+        with metrics.timed('thumb_lookup'):
+            return backend.cached_thumbnail(
+                image, geometry, **geometry_options(geometry))
+    except Exception:
+        logger.exception('Не удалось найти миниатюру %s', image)
+        return None
+
+
+def prefetch(images, geometry):
+    """Загружает записи kvstore для миниатюр страницы одним запросом.
+
+    Иначе на холодном кэше каждая картинка ленты — отдельный SELECT.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, cached_db_kvstore.KVStore):
+        return
+    options = geometry_options(geometry)
+    keys = [
+        add_prefix(backend.thumbnail_file(image, geometry, **options).key)
+        for image in images if image
+    ]
+    cache = kvstore.cache
+    missing = set(keys) - set(cache.get_many(keys))
+    if not missing:
+        return
+    found = dict(KVStoreModel.objects.filter(
+        key__in=missing).values_list('key', 'value'))
+    empty = cached_db_kvstore.EMPTY_VALUE
+    cache.set_many(
+        {key: found.get(key, empty) for key in missing},
+        thumbnail_settings.THUMBNAIL_CACHE_TIMEOUT)
+
+
+def generate(name):
+    """Создает все миниатюры картинки из settings.POST_THUMBNAILS."""
+    with metrics.timed('thumb_generate'):
+        for geometry, options in settings.POST_THUMBNAILS:
+            get_thumbnail(name, geometry, **options)
+
+
+def reencode(post_id):
+    """Пережимает картинку поста в settings.POST_IMAGE_REENCODE."""
+    from .models import Post
+
+    post = Post.objects.filter(id=post_id).first()
+    if post is None or not post.image:
+        return
+    old_name = post.image.name
+    new_name = images.reencode(post.image)
+    if new_name is not None:
+        post.image.name = new_name
+        post.save(update_fields=['image'])
+        post.image.storage.delete(old_name)
+    generate(post.image.name)
+
+
+def _run(key, task, *args):
+    try:
+        task(*args)
+    except Exception:
+        logger.exception('Не удалось обработать картинку %s', key)
+    finally:
+        with _lock:
+            _pending.discard(key)
+
+
+def _run_in_worker(key, task, *args):
+    try:
+        _run(key, task, *args)
+    finally:
+        close_old_connections()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+        return _executor
+
+
+def _in_background():
+    # Общую базу SQLite в памяти (тестовую) другой поток застает
+    # заблокированной, поэтому с ней работаем в текущем потоке
+    return bool(settings.THUMBNAIL_WORKERS) and not (
+        connection.vendor == 'sqlite' and connection.is_in_memory_db())
+
+
+def _submit(key, task, *args):
+    with _lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+    if not _in_background():
+        _run(key, task, *args)
+        return
+    _get_executor().submit(_run_in_worker, key, task, *args)
+
+
+def schedule_image(name):
+    """Ставит картинку в очередь на нарезку миниатюр после коммита.
+
+    При THUMBNAIL_WORKERS = 0 миниатюры создаются сразу, в текущем потоке.
+    """
+    if name:
+        transaction.on_commit(lambda: _submit(name, generate, name))
+
+
+def schedule(post):
+    """Обрабатывает новую картинку поста вне запроса.
+
+    Если задан POST_IMAGE_REENCODE, картинка сначала пережимается,
+    а миниатюры нарезаются уже из нового файла.
+    """
+    if not post.image:
+        return
+    if settings.POST_IMAGE_REENCODE:
+        post_id = post.id
+        transaction.on_commit(
+            lambda: _submit(f'post:{post_id}', reencode, post_id))
+    else:
+        schedule_image(post.image.name)
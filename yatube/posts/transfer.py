@@ -0,0 +1,228 @@
+"""Потоковая выгрузка и загрузка данных в NDJSON или CSV.
+
+Каждая модель пишется в свой файл <name>.<format> в каталоге выгрузки,
+строки читаются и пишутся по одной, поэтому память не зависит от объема.
+Загрузка идет пачками через bulk_create с отключенными сигналами, а
+счетчики, ленты, поисковый индекс и кэш пересобираются один раз в конце.
+
+Каждая пачка коммитится отдельно, а число загруженных строк пишется в
+import-progress.json в каталоге выгрузки. Повторный запуск после сбоя
+продолжает с места остановки; после успешной загрузки файл удаляется.
+"""
+import csv
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from . import cache_versions, counters, feed, groups, search, signals
+from .models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE = 5000
+FORMATS = ('ndjson', 'csv')
+PROGRESS_FILE = 'import-progress.json'
+# Порядок важен: при загрузке связанные строки уже должны быть в базе
+MODELS = (
+    ('users', User),
+    ('groups', Group),
+    ('posts', Post),
+    ('comments', Comment),
+    ('follows', Follow),
+)
+
+
+def model_fields(model):
+    return model._meta.concrete_fields
+
+
+def data_path(directory, name, fmt):
+    return os.path.join(directory, f'{name}.{fmt}')
+
+
+def export_rows(model, batch_size=BATCH_SIZE):
+    """Строки модели словарями по attname, курсором на стороне базы."""
+    names = [field.attname for field in model_fields(model)]
+    rows = model.objects.order_by('pk').values_list(*names)
+    for row in rows.iterator(chunk_size=batch_size):
+        yield dict(zip(names, row))
+
+
+def json_default(value):
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    # Даты с микросекундами: DjangoJSONEncoder обрезает их до миллисекунд
+    return value.isoformat()
+
+
+def write_rows(rows, path, fmt, fields):
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as stream:
+        if fmt == 'csv':
+            writer = csv.DictWriter(stream, fieldnames=fields)
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            def write(row):
+                stream.write(json.dumps(
+                    row, default=json_default, ensure_ascii=False,
+                    separators=(',', ':')))
+                stream.write('\n')
+        for row in rows:
+            write(row)
+            count += 1
+    return count
+
+
+def read_rows(path, fmt):
+    with open(path, encoding='utf-8', newline='') as stream:
+        if fmt == 'csv':
+            yield from csv.DictReader(stream)
+        else:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def build_instance(model, fields, row, csv_values):
+    values = {}
+    for field in fields:
+        if field.attname not in row:
+            continue
+        value = row[field.attname]
+        # В CSV нет NULL: пустая строка в nullable-поле означает None
+        if csv_values and value == '' and field.null:
+            value = None
+        values[field.attname] = (
+            None if value is None else field.to_python(value))
+    return model(**values)
+
+
+@contextmanager
+def keep_timestamps(model):
+    """Не дает auto_now_add затереть даты из выгрузки при bulk_create."""
+    fields = [
+        field for field in model_fields(model)
+        if getattr(field, 'auto_now_add', False)
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def export_data(directory, fmt='ndjson', batch_size=BATCH_SIZE,
+                skip_passwords=False):
+    """Выгружает все модели в каталог, возвращает {имя: число строк}."""
+    os.makedirs(directory, exist_ok=True)
+    # Прогресс прошлой загрузки относится к старым файлам
+    if os.path.exists(os.path.join(directory, PROGRESS_FILE)):
+        os.remove(os.path.join(directory, PROGRESS_FILE))
+    totals = {}
+    for name, model in MODELS:
+        fields = [field.attname for field in model_fields(model)]
+        rows = export_rows(model, batch_size)
+        if skip_passwords and model is User:
+            rows = (dict(row, password='!') for row in rows)
+        totals[name] = write_rows(
+            rows, data_path(directory, name, fmt), fmt, fields)
+    return totals
+
+
+def read_progress(directory):
+    path = os.path.join(directory, PROGRESS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)
+
+
+def write_progress(directory, progress):
+    path = os.path.join(directory, PROGRESS_FILE)
+    with open(f'{path}.tmp', 'w', encoding='utf-8') as stream:
+        json.dump(progress, stream)
+    os.replace(f'{path}.tmp', path)
+
+
+def load_model(model, rows, batch_size, ignore_conflicts, csv_values,
+               skip=0, resumed=False):
+    """Грузит строки пачками, каждую в своей транзакции.
+
+    После каждой пачки отдает число загруженных строк. Первые skip строк
+    загрузил прошлый запуск. Он мог упасть между коммитом пачки и записью
+    прогресса, поэтому при resumed первая пачка пишется с ignore_conflicts.
+    """
+    fields = model_fields(model)
+    instances = (
+        build_instance(model, fields, row, csv_values)
+        for row in islice(rows, skip, None))
+    total = skip
+    with keep_timestamps(model):
+        while True:
+            batch = list(islice(instances, batch_size))
+            if not batch:
+                return
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    batch, ignore_conflicts=ignore_conflicts or resumed)
+            resumed = False
+            total += len(batch)
+            yield total
+
+
+def reset_sequences(models):
+    # Строки пришли со своими id: сдвигаем автоинкремент за максимум
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+
+def rebuild_derived():
+    """Пересобирает все, что обычно поддерживают сигналы."""
+    counters.rebuild()
+    groups.rebuild()
+    if settings.FEED_INBOX_ENABLED:
+        feed.rebuild()
+    search.rebuild()
+    cache_versions.reset()
+
+
+def import_data(directory, fmt='ndjson', batch_size=BATCH_SIZE,
+                ignore_conflicts=False):
+    """Загружает выгрузку из каталога, возвращает {имя: число строк}."""
+    progress = read_progress(directory)
+    resumed = bool(progress)
+    totals = {}
+    loaded = []
+    with signals.muted():
+        for name, model in MODELS:
+            path = data_path(directory, name, fmt)
+            if not os.path.exists(path):
+                continue
+            totals[name] = progress.get(name, 0)
+            loaded.append(model)
+            if name in progress.get('finished', ()):
+                continue
+            for total in load_model(
+                    model, read_rows(path, fmt), batch_size,
+                    ignore_conflicts, csv_values=fmt == 'csv',
+                    skip=totals[name], resumed=resumed):
+                totals[name] = progress[name] = total
+                write_progress(directory, progress)
+            resumed = False
+            progress.setdefault('finished', []).append(name)
+            write_progress(directory, progress)
+        reset_sequences(loaded)
+    if totals:
+        rebuild_derived()
+        os.remove(os.path.join(directory, PROGRESS_FILE))
+    return totals
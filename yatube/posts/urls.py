@@ -1,13 +1,18 @@
 from django.urls import path
 
-from . import views
+from . import api, views
 
 app_name = 'posts'
 urlpatterns = [
     path('', views.index, name='home'),
+    path('group/', views.group_index, name='group_index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments, name='post_comments'),
+    path('search/', views.search_posts, name='search'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path(
@@ -24,4 +29,14 @@ urlpatterns = [
         views.profile_unfollow,
         name='profile_unfollow'
     ),
+    path('api/posts/', api.index, name='api_home'),
+    path('api/group/<slug:slug>/', api.group_posts, name='api_group_list'),
+    path('api/profile/<str:username>/', api.profile, name='api_profile'),
+    path('api/posts/<int:post_id>/', api.post_detail, name='api_post_detail'),
+    path(
+        'api/posts/<int:post_id>/comments/',
+        api.post_comments, name='api_post_comments'),
+    path('api/follow/', api.follow_index, name='api_follow_index'),
+    path('api/follow/batch/', api.follow_many, name='api_follow_many'),
+    path('api/unfollow/batch/', api.unfollow_many, name='api_unfollow_many'),
 ]
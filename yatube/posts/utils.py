@@ -1,14 +1,212 @@
-from django.core.paginator import Paginator
+import base64
+
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
 from yatube.settings import NUMBER_Of_POSTS
 
 
-def get_page_context(queryset, request):
-    paginator = Paginator(queryset, NUMBER_Of_POSTS)
+def encode_cursor(moment, pk):
+    """Непрозрачный токен курсора из пары (дата, id)."""
+    raw = f'{moment.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Разбирает токен курсора, для битого токена возвращает None."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        moment, pk = raw.decode().rsplit('|', 1)
+        moment, pk = parse_datetime(moment), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if moment is None:
+        return None
+    return moment, pk
+
+
+class CountedPaginatorMixin:
+    """Берет общее число объектов из счетчика вместо COUNT(*)."""
+
+    def __init__(self, *args, count=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_func = count
+
+    @cached_property
+    def count(self):
+        if self.count_func is None:
+            return super().count
+        return self.count_func()
+
+
+class CountedPaginator(CountedPaginatorMixin, Paginator):
+    pass
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации: знает только соседей, но не номер."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<CursorPage %s..%s>' % (
+            self.previous_cursor, self.next_cursor)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[0])
+
+
+class LazyCursorPage(CursorPage):
+    """Курсорная страница, которая читает строки при первом обращении.
+
+    Ее можно отдать в шаблон, не выполняя запрос ленты: при попадании
+    в кэш фрагмента до строк дело не доходит.
+    """
+
+    def __init__(self, paginator, after=None, before=None):
+        self.number = None
+        self.paginator = paginator
+        self.after = after
+        self.before = before
+
+    @cached_property
+    def _rows(self):
+        return self.paginator.page_rows(self.after, self.before)
+
+    @property
+    def object_list(self):
+        return self._rows[0]
+
+    @property
+    def _has_next(self):
+        return self._rows[1]
+
+    @property
+    def _has_previous(self):
+        return self._rows[2]
+
+
+class CursorPaginator(CountedPaginatorMixin, Paginator):
+    """Пагинация по ключу (дата, id) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы одинакова: фильтр по ключу и LIMIT. Ключ —
+    поля явной сортировки queryset (дата, id), а без нее date_field и id.
+    """
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 count=None):
+        super().__init__(object_list, per_page, count=count)
+        self.date_field = date_field
+        ordering = [
+            field.lstrip('-') for field in object_list.query.order_by]
+        self.key = ordering if len(ordering) == 2 else [date_field, 'id']
+
+    def cursor_for(self, item):
+        if isinstance(item, dict):
+            return encode_cursor(item[self.date_field], item['id'])
+        return encode_cursor(getattr(item, self.date_field), item.id)
+
+    def page_queryset(self, after=None, before=None):
+        """Запрос страницы с лишней строкой: по ней видно, есть ли еще."""
+        field, id_field = self.key
+        queryset = self.object_list
+        if before is not None:
+            moment, pk = before
+            queryset = queryset.filter(
+                Q(**{f'{field}__gte': moment}),
+                Q(**{f'{field}__gt': moment}) | Q(**{f'{id_field}__gt': pk}),
+            ).order_by(field, id_field)
+        else:
+            if after is not None:
+                moment, pk = after
+                queryset = queryset.filter(
+                    Q(**{f'{field}__lte': moment}),
+                    Q(**{f'{field}__lt': moment})
+                    | Q(**{f'{id_field}__lt': pk}),
+                )
+            queryset = queryset.order_by(f'-{field}', f'-{id_field}')
+        return queryset[:self.per_page + 1]
+
+    def page_rows(self, after=None, before=None):
+        """Строки страницы и флаги (есть следующая, есть предыдущая)."""
+        items = list(self.page_queryset(after, before))
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if before is not None:
+            items.reverse()
+            return items, True, has_more
+        return items, has_more, after is not None
+
+    def cursor_page(self, after=None, before=None):
+        """Страница после курсора `after` или перед курсором `before`."""
+        items, has_next, has_previous = self.page_rows(after, before)
+        return CursorPage(items, self, has_next, has_previous)
+
+
+def get_page_context(queryset, request, count=None):
+    """Страница ленты и ее ключ для {% cache %}.
+
+    Строки страницы читаются лениво: при попадании в кэш фрагмента запрос
+    ленты не выполняется. Поэтому ключ собирается из сырых параметров
+    запроса, а не из страницы; битый курсор, как и в пагинаторе, означает
+    первую страницу.
+    """
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    use_cursor = page_number is None and (
+        after or before or settings.POSTS_CURSOR_PAGINATION)
+    if use_cursor:
+        paginator = CursorPaginator(queryset, NUMBER_Of_POSTS, count=count)
+        after_cursor = decode_cursor(after)
+        before_cursor = decode_cursor(before)
+        page_obj = LazyCursorPage(paginator, after_cursor, before_cursor)
+        if before_cursor:
+            page_key = f'before:{before}'
+        elif after_cursor:
+            page_key = f'after:{after}'
+        else:
+            page_key = 'first'
+    else:
+        paginator = CountedPaginator(queryset, NUMBER_Of_POSTS, count=count)
+        # Страница держит срез queryset, строки читаются при обходе
+        page_obj = paginator.get_page(page_number)
+        page_key = f'page:{page_number or 1}'
     return {
         'paginator': paginator,
         'page_number': page_number,
         'page_obj': page_obj,
+        'page_key': page_key,
     }
+
+
+def get_comments_page(comments, after=None, count=None):
+    """Курсорная страница комментариев, от новых к старым, по ?after=."""
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_PER_PAGE, date_field='created',
+        count=count)
+    return paginator.cursor_page(after=decode_cursor(after))
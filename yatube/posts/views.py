@@ -1,26 +1,63 @@
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.functional import SimpleLazyObject
+
+from core.ratelimit import rate_limit
+from yatube.replicas import primary_write, replica_read
+from yatube.settings import NUMBER_Of_POSTS
 
+from . import (cache_versions, comment_queue, conditional, counters, feed,
+               follows, groups, images, recommendations, search,
+               thumbnails)
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
-from .utils import get_page_context
+from .models import Comment, Post, User, Follow
+from .utils import get_comments_page, get_page_context
 
 
+@replica_read
+@conditional.conditional_feed(conditional.index_scopes)
 def index(request):
-    posts = Post.objects.select_related('group').all()
-    context = get_page_context(posts, request)
+    posts = Post.objects.feed()
+    context = get_page_context(posts, request, count=counters.total_posts)
+    context['cache_version'] = cache_versions.get_version(
+        cache_versions.INDEX)
     return render(request, 'posts/index.html', context)
 
 
+@replica_read
+@conditional.conditional_feed(conditional.group_scopes)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = groups.get_by_slug(slug)
+    if group is None:
+        raise Http404('Группа не найдена')
     context = {
         'group': group,
+        'cache_version': cache_versions.get_version(
+            cache_versions.group_scope(group.id)),
     }
-    context.update(get_page_context(group.posts.all(), request))
+    context.update(get_page_context(
+        group.posts.feed(), request,
+        count=partial(counters.group_posts, group.id)))
     return render(request, 'posts/group_list.html', context)
 
 
+@replica_read
+def group_index(request):
+    context = {
+        'cache_version': cache_versions.get_version(cache_versions.INDEX),
+        # Группы и счетчики читаются только при промахе кэша фрагмента
+        'groups': SimpleLazyObject(groups.listing),
+    }
+    return render(request, 'posts/groups.html', context)
+
+
+@replica_read
+@conditional.conditional_feed(conditional.profile_scopes)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
     following = request.user.is_authenticated and (
@@ -30,31 +67,85 @@ def profile(request, username):
         ).exists())
     context = {
         'author': author,
-        'following': following
+        'following': following,
+        'recommendations': recommendations.for_user(request.user),
+        'cache_version': cache_versions.get_version(
+            cache_versions.author_scope(author.id)),
     }
-    context.update(get_page_context(author.posts.all(), request))
+    context.update(get_page_context(
+        author.posts.feed(), request,
+        count=partial(counters.author_posts, author.id)))
     return render(request, 'posts/profile.html', context)
 
 
+@replica_read
+@conditional.conditional_feed(conditional.post_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), id=post_id)
     form = CommentForm()
-    comments = post.comments.all()
-    count_of_posts = post.author.posts.count()
+    after = request.GET.get('after')
+    # Комментарии и счетчики читаются только при промахе кэша фрагментов
+    comments = SimpleLazyObject(partial(
+        get_comments_page, post.comments.select_related('author'), after))
+    count_of_posts = partial(counters.author_posts, post.author_id)
+    count_of_comments = partial(counters.post_comments, post.id)
     if request.user != post.author:
         author_is_user = False
     else:
         author_is_user = True
+    scopes = [
+        cache_versions.post_scope(post.id),
+        cache_versions.author_scope(post.author_id),
+    ]
+    if post.group_id:
+        scopes.append(cache_versions.group_scope(post.group_id))
     context = {
         'post': post,
+        'post_version': cache_versions.get_version(*scopes),
         'count_of_posts': count_of_posts,
+        'count_of_comments': count_of_comments,
         'author_is_user': author_is_user,
         'comments': comments,
+        'comments_after': after,
+        'queued_comments': comment_queue.overlay(request, post.id),
+        'comments_version': cache_versions.get_version(
+            cache_versions.comments_scope(post.id)),
         'form': form}
     return render(request, 'posts/post_detail.html', context)
 
 
+@replica_read
+@conditional.conditional_feed(conditional.post_scopes)
+def post_comments(request, post_id):
+    """Следующая пачка комментариев для догрузки на странице поста."""
+    if not Post.objects.filter(id=post_id).exists():
+        raise Http404('Пост не найден')
+    context = {
+        'post_id': post_id,
+        'comments': get_comments_page(
+            Comment.objects.filter(post=post_id).select_related('author'),
+            request.GET.get('after')),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    paginator = search.SearchPaginator(query, NUMBER_Of_POSTS)
+    page_obj = paginator.cursor_page(
+        after=search.decode_cursor(request.GET.get('after')))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@primary_write
 @login_required
+@rate_limit('post_create')
+@images.limit_image_upload
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -63,6 +154,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.schedule(post)
         return redirect('posts:profile', username=request.user)
     else:
         form = PostForm()
@@ -72,7 +164,10 @@ def post_create(request):
     return render(request, 'posts/create_post.html', context)
 
 
+@primary_write
 @login_required
+@rate_limit('post_edit')
+@images.limit_image_upload
 def post_edit(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     if request.user != post.author:
@@ -89,31 +184,46 @@ def post_edit(request, post_id):
                }
     if not form.is_valid():
         return render(request, template, context)
-    form.save()
+    post = form.save()
+    if 'image' in form.changed_data:
+        thumbnails.schedule(post)
     return redirect('posts:post_detail', post_id=post.id)
 
 
+@primary_write
 @login_required
+@rate_limit('add_comment')
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        if settings.COMMENT_QUEUE_ENABLED:
+            comment_queue.add(request, post.id, form.cleaned_data['text'])
+        else:
+            comment = form.save(commit=False)
+            comment.author = request.user
+            comment.post = post
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@replica_read
 @login_required
 def follow_index(request):
-    posts = Post.objects.select_related(
-        'group').filter(author__following__user=request.user)
-    context = get_page_context(posts, request)
+    # Версия берется до чтения ленты, см. yatube/replicas.py
+    cache_version = cache_versions.get_version(
+        cache_versions.INDEX, cache_versions.follows_scope(request.user.id))
+    posts = feed.followed_posts(request.user).feed()
+    context = get_page_context(
+        posts, request, count=partial(counters.followed_posts, request.user))
+    context['cache_version'] = cache_version
+    context['recommendations'] = recommendations.for_user(request.user)
     return render(request, 'posts/follow.html', context)
 
 
+@primary_write
 @login_required
+@rate_limit('profile_follow', methods=('GET', 'POST'))
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author == request.user:
@@ -121,14 +231,18 @@ def profile_follow(request, username):
             'posts:profile',
             username=username
         )
-    Follow.objects.get_or_create(user=request.user, author=author)
+    with transaction.atomic():
+        follows.lock_reader(request.user)
+        Follow.objects.get_or_create(user=request.user, author=author)
     return redirect(
         'posts:profile',
         username=username
     )
 
 
+@primary_write
 @login_required
+@rate_limit('profile_unfollow', methods=('GET', 'POST'))
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
 
@@ -137,8 +251,11 @@ def profile_unfollow(request, username):
             'posts:profile',
             username=username
         )
-    following = get_object_or_404(Follow, user=request.user, author=author)
-    following.delete()
+    with transaction.atomic():
+        follows.lock_reader(request.user)
+        following = get_object_or_404(
+            Follow, user=request.user, author=author)
+        following.delete()
     return redirect(
         'posts:profile',
         username=username
@@ -0,0 +1,71 @@
+"""Сборка настроек CACHES из переменных окружения.
+
+CACHE_BACKEND выбирает хранилище для всех псевдонимов сразу:
+locmem (по умолчанию, свой кэш у каждого процесса), file (общий
+файловый кэш для процессов одной машины), memcached или redis.
+CACHE_LOCATION задает адрес сервера или каталог, а CACHE_LOCATION_<ALIAS>
+позволяет вынести отдельный псевдоним на свой сервер.
+
+Ключи псевдонимов не пересекаются: у каждого свой KEY_PREFIX. В Redis
+каждый псевдоним к тому же получает свою базу на сервере CACHE_LOCATION:
+номер базы из адреса (0, если он не указан) достается default, следующие
+номера — остальным по порядку CACHE_ALIASES. У memcached баз нет, все
+псевдонимы живут на одном сервере, и clear() любого из них стирает весь
+сервер; чтобы фрагменты не вытесняли сессии, псевдониму задают свой
+сервер через CACHE_LOCATION_<ALIAS>.
+"""
+import os
+from urllib.parse import urlsplit, urlunsplit
+
+CACHE_ALIASES = ('default', 'fragments', 'sessions', 'thumbnails')
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'memcached': 'django.core.cache.backends.memcached.MemcachedCache',
+    'redis': 'django_redis.cache.RedisCache',
+}
+DEFAULT_LOCATIONS = {
+    'memcached': '127.0.0.1:11211',
+    'redis': 'redis://127.0.0.1:6379',
+}
+
+
+def redis_location(location, alias):
+    parts = urlsplit(location)
+    first = int(parts.path.strip('/') or 0)
+    return urlunsplit(
+        parts._replace(path=f'/{first + CACHE_ALIASES.index(alias)}'))
+
+
+def cache_config(backend, alias, location, base_dir):
+    if backend not in BACKENDS:
+        raise ValueError(f'Неизвестный CACHE_BACKEND: {backend}')
+    config = {'BACKEND': BACKENDS[backend], 'KEY_PREFIX': alias}
+    if backend == 'locmem':
+        # У каждого псевдонима свое хранилище и свой лимит вытеснения
+        config['LOCATION'] = f'yatube-{alias}'
+    elif backend == 'file':
+        config['LOCATION'] = os.path.join(
+            location or os.path.join(base_dir, 'cache'), alias)
+    elif backend == 'memcached':
+        config['LOCATION'] = location or DEFAULT_LOCATIONS[backend]
+    else:
+        config['LOCATION'] = redis_location(
+            location or DEFAULT_LOCATIONS[backend], alias)
+    return config
+
+
+def build_caches(base_dir, environ=os.environ):
+    backend = environ.get('CACHE_BACKEND', 'locmem')
+    location = environ.get('CACHE_LOCATION', '')
+    caches = {
+        alias: cache_config(backend, alias, location, base_dir)
+        for alias in CACHE_ALIASES
+    }
+    for alias in CACHE_ALIASES:
+        # Свой адрес псевдонима берется как есть
+        own = environ.get(f'CACHE_LOCATION_{alias.upper()}')
+        if own:
+            caches[alias]['LOCATION'] = own
+    return caches
@@ -0,0 +1,43 @@
+"""Сборка настроек DATABASES из переменных окружения.
+
+DATABASE_NAME задает файл основной базы SQLite, DATABASE_REPLICAS —
+файлы реплик через запятую. Реплики получают псевдонимы replica1,
+replica2 и т. д.; в тестах они смотрят в тестовую основную базу.
+Какие запросы уходят в реплики, решает yatube/replicas.py.
+
+DATABASE_CONN_MAX_AGE — сколько секунд держать соединение открытым
+между запросами (0 — закрывать после каждого запроса).
+"""
+import os
+
+ENGINE = 'django.db.backends.sqlite3'
+REPLICA_PREFIX = 'replica'
+CONN_MAX_AGE = 60
+
+
+def database_config(name, conn_max_age):
+    return {'ENGINE': ENGINE, 'NAME': name, 'CONN_MAX_AGE': conn_max_age}
+
+
+def build_databases(base_dir, environ=os.environ):
+    conn_max_age = int(environ.get('DATABASE_CONN_MAX_AGE', CONN_MAX_AGE))
+    databases = {
+        'default': database_config(
+            environ.get(
+                'DATABASE_NAME', os.path.join(base_dir, 'db.sqlite3')),
+            conn_max_age),
+    }
+    paths = [
+        path.strip()
+        for path in environ.get('DATABASE_REPLICAS', '').split(',')
+        if path.strip()
+    ]
+    for number, path in enumerate(paths, 1):
+        config = database_config(path, conn_max_age)
+        config['TEST'] = {'MIRROR': 'default'}
+        databases[f'{REPLICA_PREFIX}{number}'] = config
+    return databases
+
+
+def replica_aliases(databases):
+    return [alias for alias in databases if alias.startswith(REPLICA_PREFIX)]
@@ -0,0 +1,97 @@
+"""Чтение из реплик, запись в основную базу.
+
+Внутри представлений, обернутых replica_read, модели из REPLICA_APPS
+читаются из случайной реплики DATABASE_REPLICAS. Все остальное, в том
+числе любая запись, идет в основную базу. Если представление с
+primary_write что-то записало, пользователь получает cookie на
+REPLICA_PIN_SECONDS секунд и до ее истечения читает из основной базы:
+свои изменения он видит сразу, даже если реплика отстает.
+
+Остальные читатели после чужой правки тоже не должны читать реплику:
+отставшие строки легли бы в кэш фрагментов под новой версией на
+FEED_CACHE_TTL. Поэтому posts.cache_versions.get_version вызывает
+read_primary(), если версия менялась меньше REPLICA_PIN_SECONDS назад.
+Версии берутся до чтения данных ленты.
+"""
+import random
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+# Сессии, пользователи и хранилище миниатюр читаются из основной базы:
+# отставание реплики здесь ломает вход и плодит лишние миниатюры
+REPLICA_APPS = {'posts'}
+SAFE_METHODS = ('GET', 'HEAD')
+
+_state = threading.local()
+
+
+@contextmanager
+def reading_replicas():
+    previous = getattr(_state, 'replica', False)
+    _state.replica = True
+    try:
+        yield
+    finally:
+        _state.replica = previous
+
+
+def read_primary():
+    """До конца текущего reading_replicas() читать из основной базы."""
+    _state.replica = False
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if (getattr(_state, 'replica', False) and settings.DATABASE_REPLICAS
+                and model._meta.app_label in REPLICA_APPS):
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        _state.wrote = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, связи между ними допустимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+def is_pinned(request):
+    return settings.REPLICA_PIN_COOKIE in request.COOKIES
+
+
+def replica_read(view):
+    """Читает из реплик, если пользователь недавно ничего не записывал."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or is_pinned(request):
+            return view(request, *args, **kwargs)
+        with reading_replicas():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def primary_write(view):
+    """После записи закрепляет чтение пользователя за основной базой."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        outer = getattr(_state, 'wrote', False)
+        _state.wrote = False
+        try:
+            response = view(request, *args, **kwargs)
+            wrote = _state.wrote
+        finally:
+            _state.wrote = outer or _state.wrote
+        if wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
+    return wrapper
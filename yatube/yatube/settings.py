@@ -12,6 +12,9 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 
 import os
 
+from .caches import build_caches
+from .databases import build_databases, replica_aliases
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -50,6 +53,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +65,46 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'yatube.urls'
 
+# Доля запросов, для которых пишутся метрики (0 — выключено); медленные
+# запросы и N+1 ловятся во всех запросах
+REQUEST_METRICS_SAMPLE_RATE: float = 0.1
+# Отдавать метрики клиенту в заголовке Server-Timing
+REQUEST_METRICS_SERVER_TIMING: bool = True
+# Сколько раз за запрос можно выполнить один и тот же вид SQL, не считая
+# это N+1; при N_PLUS_ONE_RAISE такой запрос падает (для разработки)
+N_PLUS_ONE_THRESHOLD: int = 5
+N_PLUS_ONE_RAISE: bool = False
+# Запросы дольше этого пишутся в лог core.sql вместе с планом
+SLOW_QUERY_MS: float = 100
+
+# Метрики запросов пишутся в лог core.metrics строками JSON; в консоль
+# только при DEBUG, в бою обработчик настраивается под сборщик логов
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'require_debug_true': {'()': 'django.utils.log.RequireDebugTrue'},
+    },
+    'handlers': {
+        'metrics_console': {
+            'class': 'logging.StreamHandler',
+            'filters': ['require_debug_true'],
+        },
+    },
+    'loggers': {
+        'core.metrics': {
+            'handlers': ['metrics_console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core.sql': {
+            'handlers': ['metrics_console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -72,6 +116,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.feed_cache.feed_cache',
 
             ],
         },
@@ -84,11 +129,27 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+# Файлы основной базы и реплик задаются переменными окружения,
+# см. yatube/databases.py
+DATABASES = build_databases(BASE_DIR)
+# Реплики только для чтения и маршрутизация запросов, см. yatube/replicas.py
+DATABASE_REPLICAS = replica_aliases(DATABASES)
+DATABASE_ROUTERS = ['yatube.replicas.ReplicaRouter']
+# Сколько секунд после записи читается основная база: автором по cookie,
+# остальными — пока версия ленты свежее этого срока. Не меньше отставания
+# реплик
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'primary_pin'
+# Проверять постоянные соединения в начале каждого запроса, см. core/db.py
+DATABASE_HEALTH_CHECKS = True
+# Прагмы SQLite для каждого нового соединения
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    # Отрицательное значение — размер в КиБ: 20 МиБ кэша страниц
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
 }
 
 
@@ -133,6 +194,61 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
 NUMBER_Of_POSTS: int = 10  # Число выводимых постов
+# Комментариев на странице поста и в каждой догружаемой пачке
+COMMENTS_PER_PAGE: int = 20
+# Курсорная пагинация лент (?after=/?before=) вместо номеров страниц
+POSTS_CURSOR_PAGINATION: bool = False
+# Материализованная лента подписок (после включения: manage.py rebuild_feed)
+FEED_INBOX_ENABLED: bool = False
+# Посты авторов с большим числом подписчиков не раскладываются по лентам,
+# а подтягиваются при чтении
+FEED_CELEBRITY_THRESHOLD: int = 1000
+# Потоков для раскладки постов автора, ставшего непопулярным; 0 — сразу
+# после коммита в текущем потоке
+FEED_BACKFILL_WORKERS: int = 1
+# Поиск по постам: 'auto' — FTS5 на SQLite, иначе индекс в памяти;
+# 'fts5' или 'python' — выбрать явно
+POSTS_SEARCH_BACKEND = 'auto'
+# Сколько авторов можно подписать или отписать одним запросом к API
+FOLLOW_BATCH_LIMIT: int = 100
+# Сколько хранить в кэше рекомендации «кого почитать» (пересчитывает
+# manage.py refresh_recommendations)
+RECOMMENDATIONS_CACHE_TTL: int = 60 * 60
+# Сколько подписчиков читателя помечать к пересчету рекомендаций при смене
+# его подписок; у кого больше, тех обновит refresh_recommendations --full
+RECOMMENDATIONS_STALE_FOLLOWERS: int = 100
+# Лимиты записи, см. core/ratelimit.py: имя представления ->
+# (число запросов, за сколько секунд). Корзина IP больше в
+# RATE_LIMIT_IP_MULTIPLIER раз: за одним адресом бывает много людей
+RATE_LIMITS = {
+    'post_create': (10, 10 * 60),
+    'post_edit': (30, 10 * 60),
+    'add_comment': (20, 60),
+    'profile_follow': (60, 60),
+    'profile_unfollow': (60, 60),
+    # Пакет — до FOLLOW_BATCH_LIMIT авторов за запрос
+    'api_follow_many': (10, 60),
+    'api_unfollow_many': (10, 60),
+}
+RATE_LIMIT_IP_MULTIPLIER: int = 5
+# Адреса обратных прокси: от них IP клиента берется из X-Forwarded-For
+RATE_LIMIT_TRUSTED_PROXIES: list = []
+# Корзины должны быть общими для всех воркеров: о locmem предупреждает
+# manage.py check --deploy
+RATE_LIMIT_CACHE_ALIAS = 'default'
+# LRU групп по slug в памяти процесса, см. posts/groups.py: сколько групп
+# держать и через сколько секунд перечитывать правки из других процессов
+GROUP_CACHE_SIZE: int = 256
+GROUP_CACHE_TTL: int = 60
+# Отложенная запись комментариев пачками, см. posts/comment_queue.py
+COMMENT_QUEUE_ENABLED: bool = False
+COMMENT_QUEUE_BATCH_SIZE: int = 100
+# Через сколько миллисекунд после первого комментария в очереди писать
+# пачку; 0 — только когда наберется COMMENT_QUEUE_BATCH_SIZE
+COMMENT_QUEUE_FLUSH_MS: int = 200
+COMMENT_QUEUE_SPOOL_DIR = os.path.join(BASE_DIR, 'comment_spool')
+# Время жизни фрагментов лент: они сбрасываются сменой версии при правках
+FEED_CACHE_TTL: int = 60 * 60 * 24
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:home'
@@ -145,8 +261,23 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
-}
+# Кэши: default, fragments (фрагменты и версии лент), sessions, thumbnails.
+# Хранилище выбирается переменной окружения CACHE_BACKEND, см. yatube/caches.py
+CACHES = build_caches(BASE_DIR)
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+THUMBNAIL_CACHE = 'thumbnails'
+# Миниатюры картинок постов, которые нарезаются заранее при загрузке
+POST_THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# Лимиты загружаемых картинок: вес в байтах и размеры в пикселях
+POST_IMAGE_MAX_BYTES: int = 5 * 1024 * 1024
+POST_IMAGE_MAX_DIMENSIONS = (6000, 6000)
+# Формат, в который картинки пережимаются после загрузки
+# ('JPEG' или 'WEBP'); None — хранить как загрузили
+POST_IMAGE_REENCODE = None
+# Потоков для нарезки миниатюр; 0 — нарезать сразу в запросе
+THUMBNAIL_WORKERS: int = 2
+FEED_CACHE_ALIAS = 'fragments'